@@ -0,0 +1,91 @@
+"""Analítica de cobertura: cuántas personas faltan por día y por grupo (planta/turno/área).
+
+La BD agrega las vacaciones por ``(día inicial, día final, grupo)`` como enteros
+relativos a ``start``; NumPy expande esos intervalos en una matriz día×grupo con
+arreglos de diferencias (+n en el inicio, -n al día siguiente del fin y suma
+acumulada), así el costo no depende del largo de cada vacación.
+"""
+import os
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import select, and_, func, cast, literal, Date, Integer
+
+from models import Empleado, Vacacion
+
+COBERTURA_MAX_DIAS = int(os.getenv("COBERTURA_MAX_DIAS", "731"))
+COBERTURA_UMBRAL = int(os.getenv("COBERTURA_UMBRAL", "0"))   # 0 = sin umbral
+GRUPOS = {"planta": Empleado.planta, "turno": Empleado.turno, "area": Empleado.area}
+
+
+def parse_group_by(s: str) -> list:
+    """``"planta,turno"`` -> ``["planta", "turno"]``; lanza ValueError con campos desconocidos."""
+    campos = [c.strip().lower() for c in (s or "").split(",") if c.strip()]
+    malos = [c for c in campos if c not in GRUPOS]
+    if malos:
+        raise ValueError(f"group_by inválido: {', '.join(malos)} (usa {', '.join(GRUPOS)})")
+    return list(dict.fromkeys(campos))
+
+def dias_desde(col, start: date, dialecto: str):
+    """Expresión SQL con los días enteros entre ``start`` y la fecha ``col``."""
+    if dialecto == "sqlite":
+        return cast(func.julianday(col) - func.julianday(start.isoformat()), Integer)
+    return col - literal(start, Date)
+
+
+def cobertura(db, start: date, end: date, group_by: list, planta: str = None, umbral: int = 0,
+              laborables: np.ndarray = None) -> dict:
+    """``laborables`` (bool por día, de ``dias_habiles``) limita ``sobre_umbral`` a días hábiles."""
+    n = (end - start).days + 1
+    dialecto = db.get_bind().dialect.name
+    ini = dias_desde(Vacacion.fecha_inicial, start, dialecto)
+    fin = dias_desde(Vacacion.fecha_final, start, dialecto)
+    cols = [GRUPOS[g] for g in group_by]
+
+    stmt = (select(ini, fin, *cols, func.count())
+            .join(Empleado, Vacacion.empleado_id == Empleado.id)
+            .where(and_(Vacacion.fecha_inicial <= end,
+                        Vacacion.fecha_final >= start,
+                        Empleado.activo == True))
+            .group_by(ini, fin, *cols))
+    if planta:
+        stmt = stmt.where(Empleado.planta == planta)
+    rows = db.execute(stmt).all()
+
+    # Índice de grupo por fila (las filas ya vienen agregadas: pocas comparadas con vacaciones)
+    claves, g = {}, np.empty(len(rows), dtype=np.int64)
+    for i, r in enumerate(rows):
+        g[i] = claves.setdefault(tuple(r[2:2 + len(cols)]), len(claves))
+    a = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)).clip(0, n - 1)
+    b = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows)).clip(0, n - 1)
+    w = np.fromiter((r[-1] for r in rows), dtype=np.int64, count=len(rows))
+
+    ancho = n + 1
+    G = max(len(claves), 1)
+    diff = np.bincount(g * ancho + a, weights=w, minlength=G * ancho) \
+        - np.bincount(g * ancho + b + 1, weights=w, minlength=G * ancho)
+    matriz = diff.reshape(G, ancho)[:, :n].cumsum(axis=1).astype(np.int64)
+
+    dias = [(start + timedelta(days=i)).isoformat() for i in range(n)]
+
+    def resumen(conteos):
+        pico = int(conteos.max()) if n else 0
+        out = {"conteos": conteos.tolist(), "pico": pico,
+               "dia_pico": dias[int(conteos.argmax())] if pico else None}
+        if umbral:
+            sobre = conteos > umbral if laborables is None else (conteos > umbral) & laborables
+            out["sobre_umbral"] = [dias[i] for i in np.flatnonzero(sobre)]
+        return out
+
+    grupos = []
+    for clave, idx in sorted(claves.items(), key=lambda kv: tuple("" if v is None else str(v) for v in kv[0])):
+        item = {"clave": dict(zip(group_by, clave))}
+        item.update(resumen(matriz[idx]))
+        grupos.append(item)
+
+    out = {"start": start.isoformat(), "end": end.isoformat(), "group_by": group_by,
+           "umbral": umbral or None, "dias": dias,
+           "total": resumen(matriz.sum(axis=0)), "grupos": grupos}
+    if laborables is not None:
+        out["laborable"] = laborables.astype(np.int8).tolist()
+    return out
@@ -1,31 +1,67 @@
-import os, datetime, io, traceback
+import os, datetime, io, traceback, hmac, hashlib, threading
 from datetime import date, timedelta
-from flask import Flask, jsonify, request, send_from_directory, abort
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, send_from_directory, abort
 from flask_cors import CORS
 from dotenv import load_dotenv
-from sqlalchemy import select, and_, or_, desc, func
-import pandas as pd
-import random
-import re
+from sqlalchemy import select, and_, or_, desc, func, tuple_
 from werkzeug.exceptions import HTTPException
 
-from models import SessionLocal, init_db, Empleado, Vacacion
+# Antes de importar los módulos locales: casi todos leen su configuración al importarse
+load_dotenv()
+
+from models import SessionLocal, init_db, engine, pool_stats, Empleado, Vacacion, DiaFestivo, ReglaCapacidad
+from lotes import procesar_lote, LoteInvalido, BATCH_MAX_ASYNC
+from normalizacion import normalize_planta, canonicalize_nombre, derive_nombre_corto, _clean_spaces
+from cache_calendario import CalendarCache, data_version, bump_version
+from eventos import rango
+from conteo_sql import instalar as instalar_conteo_sql, presupuesto_sql
+from paginacion import encode_cursor, decode_cursor, entero, fecha_iso, CursorInvalido, TotalesCache
+import busqueda
+import intervalos
+import analitica
+import metricas
+import exportar
+import codificacion
+import tablero
+import estaticos
+import trabajos
+import saldos
+import dias_habiles
+import bitacora
+import capacidad
+import avatares
+from perfilador import Muestreador
 
 # -------- Config --------
 MAX_CAL_DAYS = int(os.getenv("MAX_CAL_DAYS", "90"))
-MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "5000"))
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "50000"))
 ALLOWED_IMPORT_EXT = {".xlsx", ".xls", ".csv"}
 APP_VERSION = os.getenv("APP_VERSION", "1.2.1-ordering+ui")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")       # habilita ?__profile=1 con X-Admin-Token
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")   # si se define, /api/metrics lo exige
+SSE_URL = os.getenv("SSE_URL", "").rstrip("/")  # proceso del feed SSE (python eventos.py)
 
 # Directorio del frontend (carpeta hermana a /api)
 WEB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "web"))
 
-load_dotenv()
-init_db()
+instalar_conteo_sql(engine)
+metricas.instalar_sql(engine)
 
-app = Flask(__name__)
-# Si sirves todo con Flask (mismo origen), CORS ya no es necesario para /api/*
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Rutas y hooks se registran en la app que arma create_app() (al final del archivo)
+api = Blueprint("api", __name__)
+
+# ---------- Sesión por request ----------
+def get_db():
+    """Sesión del request actual; se abre al primer uso y se cierra siempre en el teardown."""
+    if "db" not in g:
+        g.db = SessionLocal()
+    return g.db
+
+def _cerrar_db(exc):
+    db = g.pop("db", None)
+    if db is not None:
+        # close() descarta lo no confirmado y devuelve la conexión al pool
+        db.close()
 
 # ---------- Utils ----------
 def parse_date(s: str):
@@ -44,67 +80,106 @@ def json_ok(**data):
 def json_error(msg, code=400):
     return jsonify({"ok": False, "error": msg}), code
 
-def normalize_planta(val: str) -> str:
-    if not val: return "Planta 1"
-    s = str(val).strip().lower()
-    for tok in ["planta", "plant", "pl", "p", "#", " "]:
-        s = s.replace(tok, "")
-    s = s.strip().strip(".")
-    if s in ("1","01","uno"): return "Planta 1"
-    if s in ("3","03","tres"): return "Planta 3"
-    return "Planta 1"
-
 def clamp_cal_range(start: date, end: date):
     return (end - start).days <= MAX_CAL_DAYS
 
-# --------- Nombres canónicos ---------
-def _clean_spaces(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip())
-
-def canonicalize_nombre(raw: str, apellidos: str = None, nombres: str = None) -> str:
-    if apellidos is not None or nombres is not None:
-        ap = _clean_spaces(apellidos or "")
-        no = _clean_spaces(nombres or "")
-        if ap and no: return f"{ap}, {no}"
-        return _clean_spaces(no or ap)
-
-    raw = _clean_spaces(raw or "")
-    if not raw:
-        return ""
-    if "," in raw:
-        parts = [p.strip() for p in raw.split(",", 1)]
-        ap = _clean_spaces(parts[0])
-        no = _clean_spaces(parts[1] if len(parts) > 1 else "")
-        if ap and no: return f"{ap}, {no}"
-        return _clean_spaces(no or ap)
-
-    toks = raw.split(" ")
-    if len(toks) >= 3:
-        ap = " ".join(toks[-2:])
-        no = " ".join(toks[:-2])
-        return f"{_clean_spaces(ap)}, {_clean_spaces(no)}"
-    if len(toks) == 2:
-        no = toks[0]; ap = toks[1]
-        return f"{_clean_spaces(ap)}, {_clean_spaces(no)}"
-    return raw
-
-def derive_nombre_corto(nombre_canonico: str) -> str:
-    s = _clean_spaces(nombre_canonico)
-    if not s:
-        return ""
-    if "," in s:
-        ap, no = [p.strip() for p in s.split(",", 1)]
-        primer_ap = ap.split(" ")[0] if ap else ""
-        primer_no = no.split(" ")[0] if no else ""
-        out = f"{primer_no} {primer_ap}".strip()
-        return _clean_spaces(out)
-    toks = s.split(" ")
-    if len(toks) >= 2:
-        return _clean_spaces(f"{toks[0]} {toks[1]}")
-    return s
+def json_cached(body: bytes, etag: str):
+    """Respuesta JSON ya serializada con ETag fuerte; responde 304 si el cliente la tiene.
+
+    Si el cliente acepta br/gzip se envía comprimida (cada codificación con su ETag).
+    """
+    enc = codificacion.negociar(request.headers.get("Accept-Encoding"))
+    if enc and len(body) >= codificacion.COMPRESS_MIN_BYTES:
+        body = codificacion.comprimir(body, etag, enc)
+        etag = f"{etag}-{enc}"
+    else:
+        enc = None
+    resp = current_app.response_class(body, mimetype="application/json")
+    if enc:
+        resp.headers["Content-Encoding"] = enc
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+cal_cache = CalendarCache()
+cob_cache = CalendarCache(64)
+tab_cache = CalendarCache(64)   # tableros ya agrupados por día (la estructura, no el JSON)
+totales_cache = TotalesCache()
+
+def _total_cacheado(db, key, base):
+    """COUNT(*) del listado, recalculado solo cuando cambia la versión de datos."""
+    if request.args.get("total") == "0":
+        return None
+    return totales_cache.get_or_count(
+        key, data_version(db),
+        lambda: db.execute(select(func.count()).select_from(base.subquery())).scalar() or 0)
+
+# Saldos por empleado/año/tipo: se mantienen en el flush de cada escritura ORM
+saldos.registrar_sesion(SessionLocal)
+# Bitácora de cambios para /api/cambios (se escribe en commit_cambios)
+bitacora.registrar_sesion(SessionLocal)
+
+# Días hábiles por planta/turno (gozo automático, cobertura, /api/dias-habiles)
+habiles = dias_habiles.Calendarios(*dias_habiles.cargador(engine))
+
+def _gozo(d, planta, turno, fi, ff):
+    """``gozo`` capturado (admite medios días) o, si viene vacío, los días hábiles del periodo."""
+    valor = d.get("gozo")
+    if valor is None or valor == "":
+        return float(habiles.contar_uno(planta, turno, fi, ff))
+    return valor
+
+# Índice de intervalos en memoria (opcional, INTERVAL_INDEX=1)
+indice = None
+if intervalos.INTERVAL_INDEX:
+    intervalos.registrar_sesion(SessionLocal)
+    indice = intervalos.IndiceIntervalos(data_version, SessionLocal)
+
+def commit_cambios(db, rangos=None):
+    """Cierra una escritura: sube la versión de datos, escribe la bitácora y hace commit.
+
+    ``rangos`` es la lista de ``rango(ini, fin, planta)`` afectados; ``None`` = cualquiera
+    (escrituras masivas sin objetos ORM: el índice de intervalos se recarga). El feed
+    SSE (``eventos.py``) se entera por la versión y la bitácora.
+    """
+    version = bump_version(db)
+    bitacora.escribir(db, version)
+    db.commit()
+    cambios = db.info.pop("cambios_orm", [])
+    if indice is not None:
+        indice.aplicar(version, cambios if rangos is not None else None)
+    if bitacora.CAMBIOS_COMPACTAR_CADA and version % bitacora.CAMBIOS_COMPACTAR_CADA == 0:
+        ejecutor.enviar("compactar_bitacora")
+
+metricas.registrar_gauge("db_pool", "Estado del pool de conexiones de este proceso", lambda: {
+    k: v for k, v in pool_stats().items() if isinstance(v, (int, float))})
+metricas.registrar_gauge("cache_calendario", "Caché de ventanas del calendario", cal_cache.stats)
+metricas.registrar_gauge("cache_tablero", "Caché de tableros agrupados por día", tab_cache.stats)
+if indice is not None:
+    metricas.registrar_gauge("indice_intervalos", "Índice de intervalos en memoria", lambda: {
+        k: v for k, v in indice.stats().items() if v is not None})
+
+# ---------- Perfilador por request (admins) ----------
+def _es_admin() -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def _perfil_inicio():
+    if request.args.get("__profile") == "1" and _es_admin():
+        g.perfil = Muestreador(threading.get_ident()).iniciar()
+
+def _perfil_fin(resp):
+    perfil = g.pop("perfil", None)
+    if perfil is None:
+        return resp
+    # Las respuestas en streaming (exportaciones) no se consumen: solo se perfila hasta los encabezados
+    cuerpo = resp.get_data() if not resp.is_streamed else b""
+    return jsonify({"ok": True, "perfil": perfil.detener(),
+                    "respuesta": {"codigo": resp.status_code, "bytes": len(cuerpo),
+                                  "tipo": resp.mimetype}})
 
 # ---------- Error handler global ----------
-@app.errorhandler(Exception)
 def on_exception(e):
     # Deja pasar errores HTTP (404, 405, etc.) como están
     if isinstance(e, HTTPException):
@@ -113,21 +188,32 @@ def on_exception(e):
     return json_error(f"Server error: {type(e).__name__}: {e}", 500)
 
 # ---------- Meta ----------
-@app.get("/api/health")
+@api.get("/api/health")
 def health():
-    return json_ok(engine=os.getenv("DATABASE_URL", "sqlite"), version=APP_VERSION)
-
-@app.get("/api/version")
+    return json_ok(engine=os.getenv("DATABASE_URL", "sqlite"), version=APP_VERSION, pool=pool_stats())
+
+@api.get("/api/metrics")
+def metrics():
+    """Métricas de este proceso en formato de texto de Prometheus."""
+    if METRICS_TOKEN:
+        auth = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(auth, f"Bearer {METRICS_TOKEN}"):
+            return json_error("No autorizado", 401)
+    return Response(metricas.exponer(), mimetype="text/plain; version=0.0.4")
+
+@api.get("/api/version")
 def version():
     return json_ok(version=APP_VERSION)
 
 # ---------- Calendario (para tablero) ----------
-@app.get("/api/calendario")
+@api.get("/api/calendario")
+@presupuesto_sql(2)
 def calendario():
     qstart = request.args.get("start")
     qend = request.args.get("end")
     planta = request.args.get("planta")
     q = (request.args.get("q") or "").strip()
+    compacto = request.args.get("format") == "compact"
 
     start = parse_date(qstart) if qstart else date.today()
     end = parse_date(qend) if qend else (start + timedelta(days=13))
@@ -139,86 +225,251 @@ def calendario():
     if not clamp_cal_range(start, end):
         return json_error(f"Rango de calendario demasiado grande (máx {MAX_CAL_DAYS} días)", 400)
 
-    db = SessionLocal()
-    stmt = select(Vacacion).join(Empleado).where(
-        and_(Vacacion.fecha_inicial <= end,
-             Vacacion.fecha_final >= start,
-             Empleado.activo == True)
-    )
-    if planta:
-        stmt = stmt.where(Empleado.planta == normalize_planta(planta))
-    if q:
-        like = f"%{q}%"
-        stmt = stmt.where(or_(Empleado.nombre.ilike(like), Empleado.numero_emp.ilike(like)))
-
+    key = (start.isoformat(), end.isoformat(), normalize_planta(planta) if planta else "", q, compacto)
+    db = get_db()
+    version = data_version(db)
+    body, etag = cal_cache.get_or_build(
+        key, version, lambda: _calendario_body(db, version, start, end, planta, q, compacto))
+    return json_cached(body, etag)
+
+# Proyección plana vacación+empleado: una sola consulta, sin objetos ORM por fila
+VAC_EMP_COLS = (
+    Vacacion.id, Vacacion.fecha_inicial, Vacacion.fecha_final, Vacacion.tipo, Vacacion.gozo,
+    Vacacion.fuente, Empleado.id, Empleado.numero_emp, Empleado.nombre, Empleado.nombre_corto,
+    Empleado.planta, Empleado.turno, Empleado.area, Empleado.foto_url,
+)
+
+def _filas_ventana(db, version: int, start: date, end: date, planta, q):
+    """Filas ``VAC_EMP_COLS`` que tocan la ventana: del índice en memoria si está vigente."""
+    stmt = _filtrar_vacaciones(select(*VAC_EMP_COLS), start, end, planta, q)
+    if indice is not None and not q and indice.vigente(version):
+        rows = indice.ventana(start, end, normalize_planta(planta) if planta else None)
+        if intervalos.INTERVAL_INDEX_CHECK:
+            intervalos.comparar("calendario", sorted(r[0] for r in rows),
+                                sorted(r[0] for r in db.execute(stmt)))
+        return rows
+    return db.execute(stmt)
+
+def _calendario_body(db, version: int, start: date, end: date, planta, q, compacto=False) -> bytes:
+    rows = _filas_ventana(db, version, start, end, planta, q)
+    if compacto:
+        return codificacion.dumps(_calendario_compacto(rows, start, end))
     items = []
-    for v in db.execute(stmt).scalars():
-        e = v.empleado
+    for (vid, fi, ff, tipo, gozo, _fuente,
+         eid, numero, nombre, corto, e_planta, turno, area, foto) in rows:
         items.append({
-            "id": v.id,
-            "rango": {"ini": v.fecha_inicial.isoformat(), "fin": v.fecha_final.isoformat()},
-            "tipo": v.tipo,
-            "gozo": float(v.gozo) if v.gozo is not None else None,
+            "id": vid,
+            "rango": {"ini": fi.isoformat(), "fin": ff.isoformat()},
+            "tipo": tipo,
+            "gozo": float(gozo) if gozo is not None else None,
             "empleado": {
-                "id": e.id,
-                "numero": e.numero_emp,
-                "nombre": e.nombre,
-                "nombre_corto": e.nombre_corto or derive_nombre_corto(e.nombre),
-                "planta": e.planta,
-                "turno": e.turno,
-                "area": e.area,
-                "foto_url": e.foto_url or "/avatar.png",
+                "id": eid,
+                "numero": numero,
+                "nombre": nombre,
+                "nombre_corto": corto or derive_nombre_corto(nombre),
+                "planta": e_planta,
+                "turno": turno,
+                "area": area,
+                "foto_url": foto or "/avatar.png",
             },
         })
-    db.close()
-    return json_ok(start=start.isoformat(), end=end.isoformat(), items=items)
+    out = {"ok": True, "start": start.isoformat(), "end": end.isoformat(), "items": items}
+    return codificacion.dumps(out)
+
+CAL_CAMPOS = ("id", "empleado", "ini", "fin", "tipo", "gozo")
+CAL_CAMPOS_EMPLEADO = ("numero", "nombre", "nombre_corto", "planta", "turno", "area", "foto_url")
+
+def _calendario_compacto(rows, start: date, end: date) -> dict:
+    """``?format=compact``: cada empleado una vez y las vacaciones como arreglos.
+
+    ``ini``/``fin`` son días relativos a ``start`` (``ini`` puede ser negativo) y
+    ``tipo`` es un índice en ``tipos``.
+    """
+    empleados, tipos, items = {}, {}, []
+    base = start.toordinal()
+    for (vid, fi, ff, tipo, gozo, _fuente,
+         eid, numero, nombre, corto, e_planta, turno, area, foto) in rows:
+        if eid not in empleados:
+            empleados[eid] = (numero, nombre, corto or derive_nombre_corto(nombre),
+                              e_planta, turno, area, foto or "/avatar.png")
+        t = tipos.setdefault(tipo, len(tipos))
+        items.append((vid, eid, fi.toordinal() - base, ff.toordinal() - base, t,
+                      float(gozo) if gozo is not None else None))
+    return {"ok": True, "start": start.isoformat(), "end": end.isoformat(), "format": "compact",
+            "campos": CAL_CAMPOS, "campos_empleado": CAL_CAMPOS_EMPLEADO,
+            "tipos": list(tipos), "empleados": empleados, "items": items}
+
+# ---------- Tablero (varias semanas, agrupado por día) ----------
+@api.get("/api/tablero")
+@presupuesto_sql(2)
+def tablero_semanas():
+    """``anchor`` (cualquier día; se usa su lunes), ``weeks``, ``planta``, ``q`` y
+    opcionalmente ``pagina``/``page_size`` para bajar solo la rebanada a mostrar."""
+    try:
+        anchor = parse_date(request.args.get("anchor")) or date.today()
+    except ValueError:
+        return json_error("anchor inválido", 400)
+    try:
+        semanas = int(request.args.get("weeks", 2))
+        pagina = int(request.args["pagina"]) if request.args.get("pagina") else None
+        page_size = int(request.args.get("page_size", tablero.TABLERO_PAGE_SIZE))
+    except ValueError:
+        return json_error("weeks, pagina y page_size deben ser enteros", 400)
+    if not 1 <= semanas <= tablero.TABLERO_MAX_SEMANAS:
+        return json_error(f"weeks debe estar entre 1 y {tablero.TABLERO_MAX_SEMANAS}", 400)
+    if page_size < 1 or (pagina is not None and pagina < 0):
+        return json_error("pagina y page_size inválidos", 400)
+    planta = request.args.get("planta")
+    q = (request.args.get("q") or "").strip()
+
+    start = tablero.lunes(anchor)
+    end = start + timedelta(days=7 * semanas - 1)
+    key = (start.isoformat(), semanas, normalize_planta(planta) if planta else "", q)
+    db = get_db()
+    version = data_version(db)
+    agrupado = tab_cache.get_or_build_valor(key, version, lambda: tablero.agrupar(
+        _filas_ventana(db, version, start, end, planta, q), start, 7 * semanas))
+    if pagina is None:
+        body, etag = cal_cache.get_or_build(
+            ("tablero",) + key + (page_size,), version,
+            lambda: codificacion.dumps(tablero.cuerpo(agrupado, start, semanas, None, page_size)))
+    else:
+        body = codificacion.dumps(tablero.cuerpo(agrupado, start, semanas, pagina, page_size))
+        etag = hashlib.sha1(body).hexdigest()[:24]
+    return json_cached(body, etag)
+
+# ---------- Calendario: feed de cambios (SSE) ----------
+@api.get("/api/stream/calendario")
+def calendario_stream():
+    """Redirige al proceso del feed (``eventos.py``), que sostiene las conexiones sin ocupar hilos."""
+    if not SSE_URL:
+        # El tablero sigue revalidando con ETag en cada rotación, sin feed
+        return json_error("Feed de cambios no configurado (SSE_URL)", 503)
+    destino = SSE_URL + request.full_path.rstrip("?")
+    return current_app.redirect(destino, 307)
+
+# ---------- Analítica ----------
+@api.get("/api/analitica/cobertura")
+@presupuesto_sql(4)
+def analitica_cobertura():
+    """Ausentes por día y grupo (``group_by=planta,turno,area``), picos y días sobre ``umbral``.
+
+    ``laborable`` marca los días hábiles de ``planta`` (o del calendario general);
+    ``sobre_umbral`` solo considera esos días.
+    """
+    qstart = request.args.get("start")
+    qend = request.args.get("end")
+    planta = request.args.get("planta")
+
+    start = parse_date(qstart) if qstart else date.today()
+    end = parse_date(qend) if qend else (start + timedelta(days=364))
+    if end < start:
+        return json_error("end no puede ser menor que start", 400)
+    if (end - start).days >= analitica.COBERTURA_MAX_DIAS:
+        return json_error(f"Rango demasiado grande (máx {analitica.COBERTURA_MAX_DIAS} días)", 400)
+    try:
+        group_by = analitica.parse_group_by(request.args.get("group_by", "planta"))
+    except ValueError as e:
+        return json_error(str(e), 400)
+    try:
+        umbral = int(request.args.get("umbral", analitica.COBERTURA_UMBRAL))
+    except ValueError:
+        return json_error("umbral inválido", 400)
+
+    planta = normalize_planta(planta) if planta else None
+    key = (start.isoformat(), end.isoformat(), tuple(group_by), planta or "", umbral)
+    db = get_db()
+    version = data_version(db)
+    body, etag = cob_cache.get_or_build(key, version, lambda: codificacion.dumps(
+        {"ok": True, **analitica.cobertura(db, start, end, group_by, planta, umbral,
+                                           habiles.laborables(planta, None, start, end))}))
+    return json_cached(body, etag)
 
 # ---------- Empleados (CRUD) ----------
-@app.get("/api/empleados")
+EMP_COLS = (
+    Empleado.id, Empleado.numero_emp, Empleado.nombre, Empleado.nombre_corto,
+    Empleado.planta, Empleado.turno, Empleado.area, Empleado.foto_url, Empleado.activo,
+)
+
+def _filtrar_empleados(stmt, planta, turno, q):
+    """Filtros compartidos por el listado y la exportación de empleados."""
+    stmt = stmt.where(Empleado.activo == True)
+    if planta:
+        stmt = stmt.where(Empleado.planta == normalize_planta(planta))
+    if turno:
+        stmt = stmt.where(Empleado.turno == turno)
+    if q:
+        stmt = stmt.where(busqueda.filtro(q))
+    return stmt
+
+@api.get("/api/empleados")
+@presupuesto_sql(3)
 def empleados_list():
-    """Listado con filtros y paginación simple. Orden: nuevos primero (id DESC)."""
+    """Listado con filtros. Orden: nuevos primero (id DESC).
+
+    Paginación por ``cursor`` (keyset, recomendado) o ``page`` (OFFSET, compatibilidad).
+    ``total`` se cachea por versión de datos; ``total=0`` lo omite.
+    """
     q = (request.args.get("q") or "").strip()
     planta = request.args.get("planta")
     turno = request.args.get("turno")
+    cursor = request.args.get("cursor")
     page = int(request.args.get("page", "1"))
     size = int(request.args.get("size", "20"))
     page = max(1, page); size = max(1, min(size, 100))
 
-    db = SessionLocal()
-    base = select(Empleado).where(Empleado.activo == True)
-    if planta:
-        base = base.where(Empleado.planta == normalize_planta(planta))
-    if turno:
-        base = base.where(Empleado.turno == turno)
-    if q:
-        like = f"%{q}%"
-        base = base.where(or_(Empleado.nombre.ilike(like),
-                              Empleado.numero_emp.ilike(like)))
-
-    # total (COUNT(*))
-    total = db.execute(select(func.count()).select_from(base.subquery())).scalar() or 0
+    base = _filtrar_empleados(select(*EMP_COLS), planta, turno, q)
 
     # ORDEN NUEVOS PRIMERO
-    stmt = base.order_by(desc(Empleado.id)).offset((page-1)*size).limit(size)
-
+    stmt = base.order_by(desc(Empleado.id))
+    if cursor:
+        try:
+            (ult_id,) = decode_cursor(cursor, entero)
+        except CursorInvalido as e:
+            return json_error(str(e), 400)
+        stmt = stmt.where(Empleado.id < ult_id)
+    elif cursor is None:
+        stmt = stmt.offset((page-1)*size)
+    stmt = stmt.limit(size + 1)
+
+    db = get_db()
+    total = _total_cacheado(db, ("empleados", planta and normalize_planta(planta), turno, q), base)
     rows = []
-    for e in db.execute(stmt).scalars():
+    for eid, numero, nombre, corto, e_planta, e_turno, area, foto, activo in db.execute(stmt):
         rows.append({
-            "id": e.id, "numero_emp": e.numero_emp, "nombre": e.nombre,
-            "nombre_corto": e.nombre_corto or derive_nombre_corto(e.nombre),
-            "planta": e.planta, "turno": e.turno, "area": e.area,
-            "foto_url": e.foto_url, "activo": e.activo
+            "id": eid, "numero_emp": numero, "nombre": nombre,
+            "nombre_corto": corto or derive_nombre_corto(nombre),
+            "planta": e_planta, "turno": e_turno, "area": area,
+            "foto_url": foto, "activo": activo
         })
-    db.close()
-    return json_ok(items=rows, page=page, size=size, total=total)
+    next_cursor = encode_cursor(rows[size - 1]["id"]) if len(rows) > size else None
+    return json_ok(items=rows[:size], page=page, size=size, total=total, next_cursor=next_cursor)
 
-@app.put("/api/empleados/<int:emp_id>")
+@api.get("/api/empleados/buscar")
+@presupuesto_sql(3)
+def empleados_buscar():
+    """Typeahead por nombre (sin acentos, cualquier orden de palabras) o prefijo de número."""
+    q = (request.args.get("q") or "").strip()
+    planta = request.args.get("planta")
+    limit = max(1, min(int(request.args.get("limit", "10")), 50))
+    if not q:
+        return json_ok(items=[])
+
+    rows = busqueda.sugerencias(get_db(), q, limit, normalize_planta(planta) if planta else None)
+    items = [{"id": r.id, "numero_emp": r.numero_emp, "nombre": r.nombre,
+              "nombre_corto": r.nombre_corto or derive_nombre_corto(r.nombre),
+              "planta": r.planta, "turno": r.turno, "rank": rank}
+             for rank, r in rows]
+    return json_ok(items=items)
+
+@api.put("/api/empleados/<int:emp_id>")
 def empleados_update(emp_id):
     data = request.get_json() or {}
-    db = SessionLocal()
+    db = get_db()
     e = db.get(Empleado, emp_id)
     if not e:
-        db.close(); return json_error("Empleado no encontrado", 404)
+        return json_error("Empleado no encontrado", 404)
+    planta_antes = e.planta
 
     if "numero_emp" in data and data["numero_emp"]:
         e.numero_emp = str(data["numero_emp"]).strip()
@@ -239,38 +490,111 @@ def empleados_update(emp_id):
     if "activo" in data:
         e.activo = bool(data["activo"])
 
-    db.commit(); db.close()
+    commit_cambios(db, [rango(None, None, planta_antes), rango(None, None, e.planta)])
     return json_ok(updated=True)
 
-@app.delete("/api/empleados/<int:emp_id>")
+@api.delete("/api/empleados/<int:emp_id>")
 def empleados_delete(emp_id):
-    db = SessionLocal()
+    db = get_db()
     e = db.get(Empleado, emp_id)
     if not e:
-        db.close(); return json_error("Empleado no encontrado", 404)
+        return json_error("Empleado no encontrado", 404)
     e.activo = False
-    db.commit(); db.close()
+    commit_cambios(db, [rango(None, None, e.planta)])
     return json_ok(deleted=True)
 
+# ---------- Avatares (miniaturas con huella en disco) ----------
+@api.post("/api/empleados/<int:emp_id>/avatar")
+def empleados_avatar(emp_id):
+    """Sube la foto (campo ``file``); ``foto_url`` pasa a la miniatura con huella."""
+    if not avatares.disponible():
+        return json_error("Pillow no está instalado: no se pueden procesar fotos", 501)
+    f = request.files.get("file")
+    if not f or not f.filename:
+        return json_error("Archivo requerido (campo 'file')", 400)
+    db = get_db()
+    e = db.get(Empleado, emp_id)
+    if not e:
+        return json_error("Empleado no encontrado", 404)
+    try:
+        foto = avatares.guardar(f.stream.read(avatares.AVATAR_MAX_BYTES + 1))
+    except avatares.AvatarInvalido as err:
+        return json_error(str(err), 400)
+    if foto != e.foto_url:
+        e.foto_url = foto
+        commit_cambios(db, [rango(None, None, e.planta)])
+    return json_ok(foto_url=foto)
+
+@api.delete("/api/empleados/<int:emp_id>/avatar")
+def empleados_avatar_delete(emp_id):
+    db = get_db()
+    e = db.get(Empleado, emp_id)
+    if not e:
+        return json_error("Empleado no encontrado", 404)
+    if e.foto_url is not None:
+        e.foto_url = None
+        commit_cambios(db, [rango(None, None, e.planta)])
+    return json_ok(deleted=True)
+
+@api.get("/api/avatares/<nombre>")
+def avatar_get(nombre):
+    a = avatares.leer(nombre)
+    if a is None:
+        abort(404)
+    datos, mime, etag = a
+    resp = current_app.response_class(datos, mimetype=mime)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = estaticos.CACHE_INMUTABLE
+    return resp.make_conditional(request)
+
 # ---------- Helper: traslapes ----------
 def _hay_traslape(db, empleado_id: int, fi: date, ff: date, ignore_id: int=None) -> bool:
-    stmt = select(Vacacion).where(
+    if indice is not None and indice.vigente(data_version(db)):
+        r = indice.traslapa(empleado_id, fi, ff, ignore_id)
+        if intervalos.INTERVAL_INDEX_CHECK:
+            intervalos.comparar("traslape", r, _hay_traslape_sql(db, empleado_id, fi, ff, ignore_id))
+        return r
+    return _hay_traslape_sql(db, empleado_id, fi, ff, ignore_id)
+
+def _hay_traslape_sql(db, empleado_id: int, fi: date, ff: date, ignore_id: int=None) -> bool:
+    stmt = select(Vacacion.id).where(
         Vacacion.empleado_id==empleado_id,
         Vacacion.fecha_inicial <= ff,
         Vacacion.fecha_final >= fi,
     )
     if ignore_id:
         stmt = stmt.where(Vacacion.id != ignore_id)
-    return db.execute(stmt).first() is not None
+    return db.execute(stmt.limit(1)).first() is not None
+
+def _capacidad_error(e: capacidad.CapacidadExcedida):
+    return jsonify({"ok": False, "error": str(e), "violaciones": e.violaciones}), 409
 
 # ---------- Vacaciones (CRUD) ----------
-@app.get("/api/vacaciones")
+def _filtrar_vacaciones(stmt, start: date, end: date, planta, q):
+    """Filtros compartidos por el listado y la exportación de vacaciones."""
+    stmt = stmt.join(Empleado, Vacacion.empleado_id == Empleado.id).where(
+        and_(Vacacion.fecha_inicial <= end,
+             Vacacion.fecha_final >= start,
+             Empleado.activo == True)
+    )
+    if planta:
+        stmt = stmt.where(Empleado.planta == normalize_planta(planta))
+    if q:
+        stmt = stmt.where(busqueda.filtro(q))
+    return stmt
+
+@api.get("/api/vacaciones")
+@presupuesto_sql(3)
 def vacaciones_list():
-    """Lista vacaciones por rango (requerido) con filtros y paginación."""
+    """Lista vacaciones por rango (requerido) con filtros.
+
+    Orden ``fecha_inicial DESC, id DESC``; paginación por ``cursor`` o ``page`` como en empleados.
+    """
     qstart = request.args.get("start")
     qend = request.args.get("end")
     planta = request.args.get("planta")
     q = (request.args.get("q") or "").strip()
+    cursor = request.args.get("cursor")
     page = int(request.args.get("page", "1"))
     size = int(request.args.get("size", "20"))
     page = max(1, page); size = max(1, min(size, 100))
@@ -280,42 +604,44 @@ def vacaciones_list():
     if not start or not end:
         return json_error("start y end son requeridos", 400)
 
-    db = SessionLocal()
-    base = select(Vacacion).join(Empleado).where(
-        and_(Vacacion.fecha_inicial <= end,
-             Vacacion.fecha_final >= start,
-             Empleado.activo == True)
-    )
-    if planta:
-        base = base.where(Empleado.planta == normalize_planta(planta))
-    if q:
-        like = f"%{q}%"
-        base = base.where(or_(Empleado.nombre.ilike(like), Empleado.numero_emp.ilike(like)))
-
-    total = db.execute(select(func.count()).select_from(base.subquery())).scalar() or 0
-    stmt = base.order_by(desc(Vacacion.fecha_inicial), desc(Vacacion.id))\
-               .offset((page-1)*size).limit(size)
-
+    base = _filtrar_vacaciones(select(*VAC_EMP_COLS), start, end, planta, q)
+    stmt = base.order_by(desc(Vacacion.fecha_inicial), desc(Vacacion.id))
+    if cursor:
+        try:
+            ult_fi, ult_id = decode_cursor(cursor, fecha_iso, entero)
+        except CursorInvalido as e:
+            return json_error(str(e), 400)
+        stmt = stmt.where(tuple_(Vacacion.fecha_inicial, Vacacion.id) < tuple_(ult_fi, ult_id))
+    elif cursor is None:
+        stmt = stmt.offset((page-1)*size)
+    stmt = stmt.limit(size + 1)
+
+    db = get_db()
+    key = ("vacaciones", start, end, planta and normalize_planta(planta), q)
+    total = _total_cacheado(db, key, base)
     rows = []
-    for v in db.execute(stmt).scalars():
-        e = v.empleado
+    for (vid, fi, ff, tipo, gozo, fuente,
+         eid, numero, nombre, _corto, e_planta, turno, _area, _foto) in db.execute(stmt):
         rows.append({
-            "id": v.id,
-            "empleado_id": e.id,
-            "numero_emp": e.numero_emp,
-            "nombre": e.nombre,
-            "planta": e.planta,
-            "turno": e.turno,
-            "fecha_inicial": v.fecha_inicial.isoformat(),
-            "fecha_final": v.fecha_final.isoformat(),
-            "tipo": v.tipo,
-            "gozo": float(v.gozo) if v.gozo is not None else None,
-            "fuente": v.fuente
+            "id": vid,
+            "empleado_id": eid,
+            "numero_emp": numero,
+            "nombre": nombre,
+            "planta": e_planta,
+            "turno": turno,
+            "fecha_inicial": fi.isoformat(),
+            "fecha_final": ff.isoformat(),
+            "tipo": tipo,
+            "gozo": float(gozo) if gozo is not None else None,
+            "fuente": fuente
         })
-    db.close()
-    return json_ok(items=rows, page=page, size=size, total=total)
+    next_cursor = None
+    if len(rows) > size:
+        ult = rows[size - 1]
+        next_cursor = encode_cursor(ult["fecha_inicial"], ult["id"])
+    return json_ok(items=rows[:size], page=page, size=size, total=total, next_cursor=next_cursor)
 
-@app.post("/api/vacaciones")
+@api.post("/api/vacaciones")
 def vacaciones_create():
     d = request.get_json() or {}
     reqs = ("empleado_id","fecha_inicial","fecha_final")
@@ -326,81 +652,126 @@ def vacaciones_create():
     if not fi or not ff: return json_error("Fechas inválidas", 400)
     if ff < fi: return json_error("fecha_final no puede ser menor que fecha_inicial", 400)
 
-    db = SessionLocal()
+    db = get_db()
+    emp = db.get(Empleado, int(d["empleado_id"]))
+    if not emp or not emp.activo:
+        return json_error("Empleado no encontrado o inactivo", 404)
+
+    # chequeo traslape
+    if _hay_traslape(db, emp.id, fi, ff):
+        return json_error("Rango traslapa con otra vacación del empleado", 400)
     try:
-        emp = db.get(Empleado, int(d["empleado_id"]))
-        if not emp or not emp.activo:
-            return json_error("Empleado no encontrado o inactivo", 404)
-
-        # chequeo traslape
-        if _hay_traslape(db, emp.id, fi, ff):
-            return json_error("Rango traslapa con otra vacación del empleado", 400)
-
-        v = Vacacion(
-            empleado_id=emp.id,
-            fecha_inicial=fi,
-            fecha_final=ff,
-            tipo=d.get("tipo","Gozo de Vacaciones"),
-            gozo=d.get("gozo"),
-            fuente=d.get("fuente","manual"),
-        )
-        db.add(v); db.commit()
-        return json_ok(id=v.id)
-    except Exception:
-        db.rollback(); raise
-    finally:
-        db.close()
+        capacidad.verificar(db, [(emp.planta, emp.area, emp.turno, fi, ff)])
+    except capacidad.CapacidadExcedida as e:
+        return _capacidad_error(e)
+
+    v = Vacacion(
+        empleado_id=emp.id,
+        fecha_inicial=fi,
+        fecha_final=ff,
+        tipo=d.get("tipo","Gozo de Vacaciones"),
+        gozo=_gozo(d, emp.planta, emp.turno, fi, ff),
+        fuente=d.get("fuente","manual"),
+    )
+    db.add(v); commit_cambios(db, [rango(fi, ff, emp.planta)])
+    return json_ok(id=v.id)
 
-@app.put("/api/vacaciones/<int:vac_id>")
+@api.put("/api/vacaciones/<int:vac_id>")
 def vacaciones_update(vac_id):
     d = request.get_json() or {}
-    db = SessionLocal()
+    db = get_db()
     v = db.get(Vacacion, vac_id)
     if not v:
-        db.close(); return json_error("Vacación no encontrada", 404)
+        return json_error("Vacación no encontrada", 404)
+    antes = rango(v.fecha_inicial, v.fecha_final, v.empleado.planta)
+    periodo = (v.empleado_id, v.fecha_inicial, v.fecha_final)
 
     if "empleado_id" in d and d["empleado_id"]:
         emp = db.get(Empleado, int(d["empleado_id"]))
         if not emp or not emp.activo:
-            db.close(); return json_error("Empleado destino no encontrado o inactivo", 400)
+            return json_error("Empleado destino no encontrado o inactivo", 400)
         v.empleado_id = int(d["empleado_id"])
     if "fecha_inicial" in d and d["fecha_inicial"]:
         fi = parse_date(d["fecha_inicial"])
-        if not fi: db.close(); return json_error("fecha_inicial inválida", 400)
+        if not fi: return json_error("fecha_inicial inválida", 400)
         v.fecha_inicial = fi
     if "fecha_final" in d and d["fecha_final"]:
         ff = parse_date(d["fecha_final"])
-        if not ff: db.close(); return json_error("fecha_final inválida", 400)
+        if not ff: return json_error("fecha_final inválida", 400)
         v.fecha_final = ff
     if v.fecha_final < v.fecha_inicial:
-        db.close(); return json_error("fecha_final no puede ser menor que fecha_inicial", 400)
+        return json_error("fecha_final no puede ser menor que fecha_inicial", 400)
 
     # chequeo traslape ignorando la propia vacación
     if _hay_traslape(db, v.empleado_id, v.fecha_inicial, v.fecha_final, ignore_id=v.id):
-        db.close(); return json_error("Rango traslapa con otra vacación del empleado", 400)
+        return json_error("Rango traslapa con otra vacación del empleado", 400)
+
+    emp = db.get(Empleado, v.empleado_id)
+    if periodo != (v.empleado_id, v.fecha_inicial, v.fecha_final):
+        try:
+            capacidad.verificar(db, [(emp.planta, emp.area, emp.turno, v.fecha_inicial, v.fecha_final)],
+                                excluir=[v.id])
+        except capacidad.CapacidadExcedida as e:
+            db.rollback()
+            return _capacidad_error(e)
 
     if "tipo" in d and d["tipo"]:
         v.tipo = d["tipo"]
-    if "gozo" in d:
-        v.gozo = d["gozo"]
+    if "gozo" in d or periodo != (v.empleado_id, v.fecha_inicial, v.fecha_final):
+        # Sin gozo explícito, un cambio de periodo o de empleado lo recalcula
+        v.gozo = _gozo(d, emp.planta, emp.turno, v.fecha_inicial, v.fecha_final)
     if "fuente" in d:
         v.fuente = d["fuente"]
 
-    db.commit(); db.close()
+    despues = rango(v.fecha_inicial, v.fecha_final, emp.planta)
+    commit_cambios(db, [antes, despues])
     return json_ok(updated=True)
 
-@app.delete("/api/vacaciones/<int:vac_id>")
+@api.delete("/api/vacaciones/<int:vac_id>")
 def vacaciones_delete(vac_id):
-    db = SessionLocal()
+    db = get_db()
     v = db.get(Vacacion, vac_id)
     if not v:
-        db.close(); return json_error("Vacación no encontrada", 404)
+        return json_error("Vacación no encontrada", 404)
+    antes = rango(v.fecha_inicial, v.fecha_final, v.empleado.planta)
     db.delete(v)
-    db.commit(); db.close()
+    commit_cambios(db, [antes])
     return json_ok(deleted=True)
 
+@api.post("/api/vacaciones/batch")
+@presupuesto_sql(14)
+def vacaciones_batch():
+    """Crea/actualiza/borra vacaciones en una sola transacción (todo o nada).
+
+    Cuerpo: ``{"operaciones": [...], "dry_run": false}`` (también ``?dry_run=1``).
+    Con ``?async=1`` se encola como trabajo (hasta ``BATCH_MAX_ASYNC`` operaciones)
+    y responde 202 con el id para consultar ``/api/jobs/<id>``.
+    """
+    d = request.get_json(silent=True) or {}
+    dry_run = bool(d.get("dry_run")) or request.args.get("dry_run") in ("1", "true")
+    if request.args.get("async") in ("1", "true") and not dry_run:
+        ops = d.get("operaciones")
+        if not isinstance(ops, list) or not ops:
+            return json_error("operaciones debe ser una lista no vacía", 400)
+        if len(ops) > BATCH_MAX_ASYNC:
+            return json_error(f"El lote excede el máximo de {BATCH_MAX_ASYNC} operaciones", 400)
+        return _trabajo_encolado(ejecutor.enviar("lote", {"operaciones": ops}))
+
+    db = get_db()
+    try:
+        res = procesar_lote(db, d.get("operaciones"), dry_run=dry_run, habiles=habiles)
+        if dry_run:
+            db.rollback()
+        else:
+            db.info.setdefault("cambios_orm", []).extend(res["cambios"])
+            commit_cambios(db, res["rangos"])
+        return json_ok(aplicado=not dry_run, dry_run=dry_run, resultados=res["resultados"])
+    except LoteInvalido as e:
+        db.rollback()
+        return jsonify({"ok": False, "error": str(e), "resultados": e.resultados}), 400
+
 # ---------- Empleados: upsert ----------
-@app.post("/api/empleados")
+@api.post("/api/empleados")
 def alta_empleado():
     data = request.get_json() or {}
     if not data.get("numero_emp") or not (data.get("nombre") or (data.get("apellidos") or data.get("nombres"))):
@@ -414,42 +785,41 @@ def alta_empleado():
     if data.get("planta") is not None:
         data["planta"] = normalize_planta(data["planta"])
 
-    db = SessionLocal()
-    try:
-        e = db.execute(select(Empleado).where(Empleado.numero_emp == str(data["numero_emp"]).strip())).scalar_one_or_none()
-        if e:
-            e.nombre = nombre_canon or e.nombre
-            if not data.get("nombre_corto"):
-                e.nombre_corto = derive_nombre_corto(e.nombre)
-            else:
-                e.nombre_corto = _clean_spaces(data["nombre_corto"])
-            e.area = data.get("area", e.area)
-            e.turno = data.get("turno", e.turno)
-            e.planta = data.get("planta", e.planta)
-            e.foto_url = data.get("foto_url", e.foto_url)
-            e.activo = True if data.get("activo", True) else False
-            db.commit()
-            emp_id = e.id
+    db = get_db()
+    e = db.execute(select(Empleado).where(Empleado.numero_emp == str(data["numero_emp"]).strip())).scalar_one_or_none()
+    if e:
+        planta_antes = e.planta
+        e.nombre = nombre_canon or e.nombre
+        if not data.get("nombre_corto"):
+            e.nombre_corto = derive_nombre_corto(e.nombre)
         else:
-            e = Empleado(
-                numero_emp=str(data["numero_emp"]).strip(),
-                nombre=nombre_canon,
-                nombre_corto=_clean_spaces(data.get("nombre_corto") or derive_nombre_corto(nombre_canon)),
-                area=data.get("area"),
-                turno=data.get("turno"),
-                planta=data.get("planta"),
-                foto_url=data.get("foto_url"),
-                activo=True,
-            )
-            db.add(e)
-            db.commit()
-            emp_id = e.id
-        return json_ok(id=emp_id)
-    finally:
-        db.close()
+            e.nombre_corto = _clean_spaces(data["nombre_corto"])
+        e.area = data.get("area", e.area)
+        e.turno = data.get("turno", e.turno)
+        e.planta = data.get("planta", e.planta)
+        e.foto_url = data.get("foto_url", e.foto_url)
+        e.activo = True if data.get("activo", True) else False
+        commit_cambios(db, [rango(None, None, planta_antes), rango(None, None, e.planta)])
+        emp_id = e.id
+    else:
+        e = Empleado(
+            numero_emp=str(data["numero_emp"]).strip(),
+            nombre=nombre_canon,
+            nombre_corto=_clean_spaces(data.get("nombre_corto") or derive_nombre_corto(nombre_canon)),
+            area=data.get("area"),
+            turno=data.get("turno"),
+            planta=data.get("planta"),
+            foto_url=data.get("foto_url"),
+            activo=True,
+        )
+        db.add(e)
+        # Empleado nuevo: aún no tiene vacaciones en ningún tablero
+        commit_cambios(db, [])
+        emp_id = e.id
+    return json_ok(id=emp_id)
 
 # ---------- Alta atómica empleado+vacación ----------
-@app.post("/api/alta/empleado-vacacion")
+@api.post("/api/alta/empleado-vacacion")
 def alta_empleado_vacacion():
     d = request.get_json() or {}
 
@@ -478,72 +848,577 @@ def alta_empleado_vacacion():
     if d.get("planta") is not None:
         d["planta"] = normalize_planta(d["planta"])
 
-    db = SessionLocal()
-    try:
-        numero_emp = str(d["numero_emp"]).strip()
-        e = db.execute(select(Empleado).where(Empleado.numero_emp == numero_emp)).scalar_one_or_none()
-        if e:
-            e.nombre = nombre_canon or e.nombre
-            e.nombre_corto = _clean_spaces(d.get("nombre_corto") or derive_nombre_corto(e.nombre))
-            e.area = d.get("area", e.area)
-            e.turno = d.get("turno", e.turno)
-            e.planta = d.get("planta", e.planta)
-            e.foto_url = d.get("foto_url", e.foto_url)
-            e.activo = True
-        else:
-            e = Empleado(
-                numero_emp=numero_emp,
-                nombre=nombre_canon,
-                nombre_corto=_clean_spaces(d.get("nombre_corto") or derive_nombre_corto(nombre_canon)),
-                area=d.get("area"),
-                turno=d.get("turno"),
-                planta=d.get("planta"),
-                foto_url=d.get("foto_url"),
-                activo=True,
-            )
-            db.add(e)
-            db.flush()
-
-        # chequeo traslape antes de insertar
-        if _hay_traslape(db, e.id, fi, ff):
-            db.rollback()
-            return json_error("Rango traslapa con otra vacación del empleado", 400)
-
-        v = Vacacion(
-            empleado_id=e.id,
-            fecha_inicial=fi,
-            fecha_final=ff,
-            tipo=d.get("tipo", "Gozo de Vacaciones"),
-            gozo=d.get("gozo"),
-            fuente=d.get("fuente", "manual"),
+    db = get_db()
+    numero_emp = str(d["numero_emp"]).strip()
+    e = db.execute(select(Empleado).where(Empleado.numero_emp == numero_emp)).scalar_one_or_none()
+    rangos = []
+    if e:
+        rangos.append(rango(None, None, e.planta))
+        e.nombre = nombre_canon or e.nombre
+        e.nombre_corto = _clean_spaces(d.get("nombre_corto") or derive_nombre_corto(e.nombre))
+        e.area = d.get("area", e.area)
+        e.turno = d.get("turno", e.turno)
+        e.planta = d.get("planta", e.planta)
+        e.foto_url = d.get("foto_url", e.foto_url)
+        e.activo = True
+    else:
+        e = Empleado(
+            numero_emp=numero_emp,
+            nombre=nombre_canon,
+            nombre_corto=_clean_spaces(d.get("nombre_corto") or derive_nombre_corto(nombre_canon)),
+            area=d.get("area"),
+            turno=d.get("turno"),
+            planta=d.get("planta"),
+            foto_url=d.get("foto_url"),
+            activo=True,
         )
-        db.add(v)
+        db.add(e)
+        db.flush()
 
-        db.commit()
-        return json_ok(empleado_id=e.id, vacacion_id=v.id)
-    except Exception:
+    # chequeo traslape antes de insertar
+    if _hay_traslape(db, e.id, fi, ff):
         db.rollback()
-        raise
-    finally:
-        db.close()
+        return json_error("Rango traslapa con otra vacación del empleado", 400)
+    try:
+        capacidad.verificar(db, [(e.planta, e.area, e.turno, fi, ff)])
+    except capacidad.CapacidadExcedida as ex:
+        db.rollback()
+        return _capacidad_error(ex)
+
+    v = Vacacion(
+        empleado_id=e.id,
+        fecha_inicial=fi,
+        fecha_final=ff,
+        tipo=d.get("tipo", "Gozo de Vacaciones"),
+        gozo=_gozo(d, e.planta, e.turno, fi, ff),
+        fuente=d.get("fuente", "manual"),
+    )
+    db.add(v)
+
+    rangos.append(rango(fi, ff, e.planta))
+    commit_cambios(db, rangos)
+    return json_ok(empleado_id=e.id, vacacion_id=v.id)
+
+# ---------- Exportación (CSV/XLSX en streaming) ----------
+VAC_EXPORT = (
+    ("id", Vacacion.id), ("numero_emp", Empleado.numero_emp), ("nombre", Empleado.nombre),
+    ("planta", Empleado.planta), ("turno", Empleado.turno), ("area", Empleado.area),
+    ("fecha_inicial", Vacacion.fecha_inicial), ("fecha_final", Vacacion.fecha_final),
+    ("tipo", Vacacion.tipo), ("gozo", Vacacion.gozo), ("fuente", Vacacion.fuente),
+)
+EMP_EXPORT = (
+    ("id", Empleado.id), ("numero_emp", Empleado.numero_emp), ("nombre", Empleado.nombre),
+    ("nombre_corto", Empleado.nombre_corto), ("planta", Empleado.planta), ("turno", Empleado.turno),
+    ("area", Empleado.area), ("activo", Empleado.activo),
+)
+
+def _exportar(nombre: str, columnas, stmt):
+    formato = (request.args.get("formato") or "csv").lower()
+    encabezados = [c[0] for c in columnas]
+    partes = exportar.bloques(engine, stmt)
+    if formato == "csv":
+        cuerpo, mime = exportar.csv_stream(encabezados, partes), "text/csv; charset=utf-8"
+    elif formato == "xlsx":
+        cuerpo = exportar.xlsx_stream(encabezados, partes, nombre.capitalize())
+        mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        return json_error("formato debe ser csv o xlsx", 400)
+    archivo = f"{nombre}_{date.today().isoformat()}.{formato}"
+    return Response(cuerpo, mimetype=mime, headers={
+        "Content-Disposition": f'attachment; filename="{archivo}"',
+        "Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+@api.get("/api/exportar/vacaciones")
+def exportar_vacaciones():
+    """Mismos filtros que ``/api/vacaciones`` (start/end requeridos), sin límite de filas."""
+    start = parse_date(request.args.get("start")) if request.args.get("start") else None
+    end = parse_date(request.args.get("end")) if request.args.get("end") else None
+    if not start or not end:
+        return json_error("start y end son requeridos", 400)
+    if end < start:
+        return json_error("end no puede ser menor que start", 400)
+    stmt = _filtrar_vacaciones(select(*[c for _, c in VAC_EXPORT]), start, end,
+                               request.args.get("planta"), (request.args.get("q") or "").strip())
+    return _exportar("vacaciones", VAC_EXPORT,
+                     stmt.order_by(desc(Vacacion.fecha_inicial), desc(Vacacion.id)))
+
+@api.get("/api/exportar/empleados")
+def exportar_empleados():
+    """Mismos filtros que ``/api/empleados`` (planta, turno, q), sin límite de filas."""
+    stmt = _filtrar_empleados(select(*[c for _, c in EMP_EXPORT]), request.args.get("planta"),
+                              request.args.get("turno"), (request.args.get("q") or "").strip())
+    return _exportar("empleados", EMP_EXPORT, stmt.order_by(desc(Empleado.id)))
+
+# ---------- Importación masiva (CSV/XLSX) ----------
+@api.post("/api/importar/excel")
+def importar_excel():
+    """Importa vacaciones en lote; las filas inválidas o con traslape se reportan y se omiten.
+
+    Con ``?async=1`` el archivo se guarda como trabajo y se responde 202 de inmediato.
+    """
+    f = request.files.get("file")
+    if not f or not f.filename:
+        return json_error("Archivo requerido (campo 'file')", 400)
+    ext = os.path.splitext(f.filename)[1].lower()
+    if ext not in ALLOWED_IMPORT_EXT:
+        return json_error(f"Extensión no permitida ({', '.join(sorted(ALLOWED_IMPORT_EXT))})", 400)
+    if request.args.get("async") in ("1", "true"):
+        return _trabajo_encolado(ejecutor.enviar(
+            "importar", {"ext": ext, "archivo": f.filename, "fuente": request.form.get("fuente") or "import"},
+            entrada=f.stream.read()))
+
+    from importador import importar_archivo, ImportacionError   # pandas: solo al importar
+    db = get_db()
+    try:
+        rep = importar_archivo(db, f.stream, ext, max_rows=MAX_IMPORT_ROWS,
+                               fuente=request.form.get("fuente") or "import", habiles=habiles)
+        commit_cambios(db)
+        return json_ok(**rep)
+    except ImportacionError as e:
+        db.rollback()
+        return json_error(str(e), 400)
+
+# ---------- Saldos (días usados por empleado/año/tipo) ----------
+def _anio_param():
+    a = request.args.get("anio")
+    return int(a) if a else None
+
+@api.get("/api/saldos/empleado/<int:emp_id>")
+@presupuesto_sql(2)
+def saldos_empleado(emp_id):
+    try:
+        anio = _anio_param()
+    except ValueError:
+        return json_error("anio inválido", 400)
+    db = get_db()
+    e = db.get(Empleado, emp_id)
+    if not e:
+        return json_error("Empleado no encontrado", 404)
+    return json_ok(empleado_id=e.id, numero_emp=e.numero_emp, nombre=e.nombre,
+                   anios=saldos.saldo_empleado(db, emp_id, anio))
+
+@api.get("/api/saldos")
+@presupuesto_sql(1)
+def saldos_planta():
+    """Reporte por planta: un renglón por empleado activo con sus días del año por tipo."""
+    try:
+        anio = _anio_param() or date.today().year
+    except ValueError:
+        return json_error("anio inválido", 400)
+    planta = request.args.get("planta")
+    planta = normalize_planta(planta) if planta else None
+    items = saldos.reporte_planta(get_db(), anio, planta, request.args.get("tipo") or None)
+    return json_ok(anio=anio, planta=planta, items=items)
+
+# ---------- Capacidad (máximo de ausentes simultáneos) ----------
+REGLA_CAMPOS = ("nombre", "planta", "area", "turno", "maximo", "desde", "hasta", "activa")
+
+def _regla_dict(r):
+    return {"id": r.id, "nombre": capacidad.nombre_regla(r), "planta": r.planta, "area": r.area,
+            "turno": r.turno, "maximo": r.maximo, "desde": r.desde.isoformat() if r.desde else None,
+            "hasta": r.hasta.isoformat() if r.hasta else None, "activa": r.activa}
+
+def _aplicar_regla(r, d):
+    """Copia los campos presentes en ``d``; devuelve un mensaje de error o ``None``."""
+    for k in REGLA_CAMPOS:
+        if k not in d:
+            continue
+        v = d[k]
+        if k == "maximo":
+            try:
+                v = int(v)
+            except (TypeError, ValueError):
+                return "maximo inválido"
+            if v < 0:
+                return "maximo inválido"
+        elif k in ("desde", "hasta"):
+            try:
+                v = parse_date(v)
+            except ValueError:
+                return f"{k} inválida"
+        elif k == "activa":
+            v = bool(v)
+        elif k == "planta":
+            v = normalize_planta(v) if v else None
+        else:
+            v = _clean_spaces(v) if v else None
+        setattr(r, k, v)
+    if r.maximo is None:
+        return "maximo es requerido"
+    if r.desde and r.hasta and r.hasta < r.desde:
+        return "hasta no puede ser menor que desde"
+    return None
+
+@api.get("/api/capacidad/reglas")
+def capacidad_reglas():
+    reglas = get_db().execute(select(ReglaCapacidad).order_by(ReglaCapacidad.id)).scalars()
+    return json_ok(items=[_regla_dict(r) for r in reglas])
+
+@api.post("/api/capacidad/reglas")
+def capacidad_regla_create():
+    r = ReglaCapacidad(activa=True)
+    err = _aplicar_regla(r, request.get_json() or {})
+    if err:
+        return json_error(err, 400)
+    db = get_db()
+    db.add(r)
+    db.commit()
+    return json_ok(id=r.id)
+
+@api.put("/api/capacidad/reglas/<int:rid>")
+def capacidad_regla_update(rid):
+    db = get_db()
+    r = db.get(ReglaCapacidad, rid)
+    if not r:
+        return json_error("Regla no encontrada", 404)
+    err = _aplicar_regla(r, request.get_json() or {})
+    if err:
+        db.rollback()
+        return json_error(err, 400)
+    db.commit()
+    return json_ok(updated=True)
+
+@api.delete("/api/capacidad/reglas/<int:rid>")
+def capacidad_regla_delete(rid):
+    db = get_db()
+    r = db.get(ReglaCapacidad, rid)
+    if not r:
+        return json_error("Regla no encontrada", 404)
+    db.delete(r)
+    db.commit()
+    return json_ok(deleted=True)
+
+@api.post("/api/capacidad/simular")
+@presupuesto_sql(3)
+def capacidad_simular():
+    """¿Qué pasaría si...? Evalúa rangos propuestos contra la ocupación actual sin escribir.
+
+    Cuerpo: ``{"rangos": [{"empleado_id" | "planta"/"area"/"turno", "fecha_inicial",
+    "fecha_final"}], "excluir": [ids de vacaciones que se reemplazarían]}``.
+    """
+    d = request.get_json(silent=True) or {}
+    rangos = d.get("rangos")
+    if not isinstance(rangos, list) or not rangos:
+        return json_error("rangos debe ser una lista no vacía", 400)
+    if len(rangos) > BATCH_MAX_ASYNC:
+        return json_error(f"Máximo {BATCH_MAX_ASYNC} rangos", 400)
+    try:
+        excluir = [int(x) for x in d.get("excluir") or []]
+    except (TypeError, ValueError):
+        return json_error("excluir inválido", 400)
+
+    leidos = []
+    for i, r in enumerate(rangos):
+        if not isinstance(r, dict):
+            return json_error(f"Rango {i}: debe ser un objeto", 400)
+        try:
+            fi, ff = parse_date(r.get("fecha_inicial")), parse_date(r.get("fecha_final"))
+        except ValueError:
+            fi = ff = None
+        if not fi or not ff or ff < fi:
+            return json_error(f"Rango {i}: fechas inválidas", 400)
+        eid = None
+        if r.get("empleado_id"):
+            try:
+                eid = int(r["empleado_id"])
+            except (TypeError, ValueError):
+                return json_error(f"Rango {i}: empleado_id inválido", 400)
+        leidos.append((eid, r, fi, ff))
+
+    db = get_db()
+    emp_ids = {eid for eid, _, _, _ in leidos if eid is not None}
+    emps = {}
+    if emp_ids:
+        emps = {e[0]: tuple(e[1:]) for e in db.execute(
+            select(Empleado.id, Empleado.planta, Empleado.area, Empleado.turno).where(Empleado.id.in_(emp_ids)))}
+    propuestas = []
+    for i, (eid, r, fi, ff) in enumerate(leidos):
+        if eid is not None:
+            if eid not in emps:
+                return json_error(f"Rango {i}: empleado no encontrado", 400)
+            attrs = emps[eid]
+        else:
+            attrs = (normalize_planta(r["planta"]) if r.get("planta") else None, r.get("area"), r.get("turno"))
+        propuestas.append(attrs + (fi, ff))
+    violaciones = capacidad.evaluar(db, propuestas, excluir)
+    return json_ok(cabe=not violaciones, violaciones=violaciones)
+
+# ---------- Sincronización por deltas ----------
+@api.get("/api/cambios")
+@presupuesto_sql(4)
+def cambios_desde():
+    """Altas/cambios/bajas de empleados y vacaciones desde ``since`` (cursor opaco).
+
+    Sin ``since`` devuelve solo el cursor actual: el cliente lo guarda, carga sus
+    datos completos y desde ahí pide deltas (reaplicar un cambio ya visto es
+    inofensivo). Con ``mas: true`` hay que volver a pedir con el nuevo cursor.
+    410 = el cursor ya se compactó; hay que recargar completo.
+    """
+    planta = request.args.get("planta")
+    planta = normalize_planta(planta) if planta else None
+    since = request.args.get("since")
+    db = get_db()
+    if not since:
+        return json_ok(cursor=encode_cursor(*bitacora.cursor_actual(db)), planta=planta)
+    try:
+        desde = tuple(decode_cursor(since, entero, entero))
+        limite = min(max(int(request.args.get("limit", bitacora.CAMBIOS_LIMITE)), 1), bitacora.CAMBIOS_LIMITE)
+    except (CursorInvalido, TypeError, ValueError):
+        return json_error("cursor inválido", 400)
+    try:
+        res = bitacora.leer(db, desde, planta, limite)
+    except bitacora.CursorExpirado as e:
+        return jsonify({"ok": False, "error": str(e), "reset": True}), 410
+    res["cursor"] = encode_cursor(*res["cursor"])
+    return json_ok(planta=planta, **res)
+
+# ---------- Días hábiles y festivos ----------
+@api.get("/api/dias-habiles")
+@presupuesto_sql(2)
+def dias_habiles_rango():
+    """Días hábiles de ``start`` a ``end`` (incluidos) para ``planta``/``turno``.
+
+    ``detalle=1`` agrega el arreglo día a día (``laborable``).
+    """
+    try:
+        start = parse_date(request.args.get("start"))
+        end = parse_date(request.args.get("end"))
+    except ValueError:
+        return json_error("Fechas inválidas", 400)
+    if not start or not end:
+        return json_error("start y end son requeridos", 400)
+    if end < start:
+        return json_error("end no puede ser menor que start", 400)
+    if (end - start).days >= analitica.COBERTURA_MAX_DIAS:
+        return json_error(f"Rango demasiado grande (máx {analitica.COBERTURA_MAX_DIAS} días)", 400)
+    planta = request.args.get("planta")
+    planta = normalize_planta(planta) if planta else None
+    turno = request.args.get("turno") or None
+
+    laborables = habiles.laborables(planta, turno, start, end)
+    festivos = []
+    for anio in range(start.year, end.year + 1):
+        festivos.extend((f, n) for f, n in habiles.festivos(planta, anio).items() if start <= f <= end)
+    out = {"start": start.isoformat(), "end": end.isoformat(), "planta": planta, "turno": turno,
+           "semana": habiles.mascara(planta, turno), "naturales": len(laborables),
+           "habiles": int(laborables.sum()),
+           "festivos": [{"fecha": f.isoformat(), "nombre": n} for f, n in sorted(festivos)]}
+    if request.args.get("detalle") in ("1", "true"):
+        out["laborable"] = laborables.astype(int).tolist()
+    return json_ok(**out)
+
+@api.get("/api/festivos")
+def festivos_list():
+    """Festivos del año: los de ley (``fuente: "ley"``) y los capturados (``fuente: "tabla"``, con id)."""
+    try:
+        anio = _anio_param() or date.today().year
+    except ValueError:
+        return json_error("anio inválido", 400)
+    planta = request.args.get("planta")
+    planta = normalize_planta(planta) if planta else None
+    items = [{"fecha": f.isoformat(), "nombre": n, "planta": None, "fuente": "ley"}
+             for f, n in sorted(dias_habiles.festivos_oficiales(anio).items())] \
+        if dias_habiles.FESTIVOS_OFICIALES else []
+    stmt = (select(DiaFestivo).where(DiaFestivo.fecha >= date(anio, 1, 1), DiaFestivo.fecha <= date(anio, 12, 31))
+            .order_by(DiaFestivo.fecha, DiaFestivo.planta))
+    if planta:
+        stmt = stmt.where(or_(DiaFestivo.planta.is_(None), DiaFestivo.planta == planta))
+    items += [{"id": x.id, "fecha": x.fecha.isoformat(), "nombre": x.nombre, "planta": x.planta, "fuente": "tabla"}
+              for x in get_db().execute(stmt).scalars()]
+    items.sort(key=lambda it: it["fecha"])
+    return json_ok(anio=anio, planta=planta, items=items)
+
+def _festivos_cambiados(db, fecha, planta):
+    bump_version(db, dias_habiles.FESTIVOS_KEY)
+    commit_cambios(db, [rango(fecha, fecha, planta)])
+    habiles.invalidar()
+
+@api.post("/api/festivos")
+def festivos_create():
+    d = request.get_json() or {}
+    try:
+        fecha = parse_date(d.get("fecha"))
+    except ValueError:
+        fecha = None
+    nombre = _clean_spaces(d.get("nombre") or "")
+    if not fecha or not nombre:
+        return json_error("fecha y nombre son requeridos", 400)
+    planta = normalize_planta(d["planta"]) if d.get("planta") else None
+
+    db = get_db()
+    existe = db.execute(select(DiaFestivo.id).where(
+        DiaFestivo.fecha == fecha,
+        DiaFestivo.planta.is_(None) if planta is None else DiaFestivo.planta == planta)).first()
+    if existe:
+        return json_error("Ese festivo ya existe", 409)
+    x = DiaFestivo(fecha=fecha, planta=planta, nombre=nombre)
+    db.add(x)
+    _festivos_cambiados(db, fecha, planta)
+    return json_ok(id=x.id)
+
+@api.delete("/api/festivos/<int:fid>")
+def festivos_delete(fid):
+    db = get_db()
+    x = db.get(DiaFestivo, fid)
+    if not x:
+        return json_error("Festivo no encontrado", 404)
+    fecha, planta = x.fecha, x.planta
+    db.delete(x)
+    _festivos_cambiados(db, fecha, planta)
+    return json_ok(deleted=True)
+
+# ---------- Trabajos en segundo plano ----------
+def _trabajo_importar(db, avance):
+    from importador import importar_archivo, ImportacionError
+    p = avance.parametros
+    try:
+        rep = importar_archivo(db, io.BytesIO(avance.entrada()), p["ext"], max_rows=MAX_IMPORT_ROWS,
+                               fuente=p.get("fuente") or "import", avance=avance, habiles=habiles)
+    except ImportacionError as e:
+        raise trabajos.TrabajoFallido(str(e))
+    commit_cambios(db)
+    return rep
+
+def _trabajo_lote(db, avance):
+    ops = avance.parametros["operaciones"]
+    avance(0, len(ops))
+    try:
+        res = procesar_lote(db, ops, maximo=BATCH_MAX_ASYNC, habiles=habiles)
+    except LoteInvalido as e:
+        raise trabajos.TrabajoFallido(str(e), {"resultados": e.resultados})
+    db.info.setdefault("cambios_orm", []).extend(res["cambios"])
+    commit_cambios(db, res["rangos"])
+    avance(len(ops))
+    return {"resultados": res["resultados"]}
+
+def _trabajo_compactar(db, avance):
+    res = bitacora.compactar(db.connection())
+    db.commit()
+    return res
+
+ejecutor = trabajos.Ejecutor(SessionLocal, engine)
+ejecutor.registrar("importar", _trabajo_importar, limite=1)
+ejecutor.registrar("lote", _trabajo_lote, limite=2)
+ejecutor.registrar("compactar_bitacora", _trabajo_compactar, limite=1)
+metricas.registrar_gauge("trabajos", "Trabajos en segundo plano de este proceso", ejecutor.stats)
+
+def _trabajo_encolado(tid: str):
+    resp = json_ok(job=ejecutor.estado(tid, con_resultado=False))
+    resp.status_code = 202
+    resp.headers["Location"] = f"/api/jobs/{tid}"
+    return resp
+
+@api.get("/api/jobs")
+def jobs_list():
+    try:
+        limite = min(max(int(request.args.get("limit", 50)), 1), 200)
+    except ValueError:
+        return json_error("limit inválido", 400)
+    return json_ok(items=ejecutor.listar(request.args.get("tipo"), request.args.get("estado"), limite))
+
+@api.get("/api/jobs/<tid>")
+def jobs_get(tid):
+    t = ejecutor.estado(tid)
+    if t is None:
+        return json_error("Trabajo no encontrado", 404)
+    return json_ok(job=t)
+
+@api.post("/api/jobs/<tid>/cancelar")
+def jobs_cancelar(tid):
+    t = ejecutor.estado(tid, con_resultado=False)
+    if t is None:
+        return json_error("Trabajo no encontrado", 404)
+    if t["estado"] in trabajos.FINALES:
+        return json_error(f"El trabajo ya está {t['estado']}", 409)
+    try:
+        return json_ok(job=ejecutor.cancelar(tid))
+    except trabajos.CancelacionOcupada:
+        return (jsonify({"ok": False, "error": "El trabajo está escribiendo en la base desde otro proceso; "
+                                               "reintenta la cancelación en unos segundos", "reintentar": True}),
+                409, {"Retry-After": "5"})
 
 # ---------- Frontend (sirve /, /admin y archivos estáticos) ----------
-@app.route("/")
+activos = estaticos.Activos(WEB_DIR)
+metricas.registrar_gauge("estaticos", "Archivos de web/ en memoria", activos.stats)
+
+def _servir_activo(path: str):
+    if path.split("/", 1)[0] in estaticos.EXCLUIR:
+        abort(404)
+    a, inmutable = activos.buscar(path)
+    if a is None:
+        # Archivos fuera del índice (muy grandes o agregados después de arrancar)
+        return send_from_directory(WEB_DIR, path)
+    cuerpo, enc = a.variante(request.headers.get("Accept-Encoding"))
+    resp = current_app.response_class(cuerpo, mimetype=a.mime)
+    if enc:
+        resp.headers["Content-Encoding"] = enc
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(f"{a.etag}-{enc}" if enc else a.etag)
+    resp.headers["Cache-Control"] = estaticos.CACHE_INMUTABLE if inmutable else estaticos.CACHE_REVALIDAR
+    return resp.make_conditional(request)
+
+@api.route("/")
 def serve_index():
-    return send_from_directory(WEB_DIR, "index.html")
+    return _servir_activo("index.html")
 
-@app.route("/admin")
+@api.route("/admin")
 def serve_admin():
-    return send_from_directory(WEB_DIR, "admin.html")
+    return _servir_activo("admin.html")
 
-@app.route("/<path:path>")
+@api.route("/<path:path>")
 def serve_static_files(path):
     # No interceptar /api/*
     if path.startswith("api/"):
         abort(404)
-    return send_from_directory(WEB_DIR, path)
+    return _servir_activo(path)
+
+# ---------- Arranque ----------
+_bd_lista = False
+_servicios_pid = None
+
+def preparar_bd():
+    """Esquema (``init_db``) y capacidades de la BD; una vez por proceso.
+
+    Con ``preload_app`` de gunicorn corre en el maestro y los workers lo heredan.
+    """
+    global _bd_lista
+    if not _bd_lista:
+        init_db()
+        busqueda.detectar(engine)
+        _bd_lista = True
+
+def iniciar_servicios():
+    """Hilos de fondo de este proceso (trabajos, índice de intervalos).
+
+    Los hilos no sobreviven a un fork: con ``preload_app`` se llama en cada worker
+    desde ``post_fork`` (gunicorn.conf.py), nunca en el maestro.
+    """
+    global _servicios_pid
+    if _servicios_pid == os.getpid():
+        return
+    _servicios_pid = os.getpid()
+    preparar_bd()   # los hilos leen tablas: el esquema debe existir antes
+    ejecutor.iniciar()
+    if indice is not None:
+        indice.calentar()
+
+def create_app(servicios: bool = True) -> Flask:
+    """Arma la app Flask; ``servicios=False`` deja los hilos para después del fork."""
+    preparar_bd()
+    app = Flask(__name__)
+    # Si sirves todo con Flask (mismo origen), CORS ya no es necesario para /api/*
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    metricas.instalar_flask(app)
+    app.teardown_appcontext(_cerrar_db)
+    app.before_request(_perfil_inicio)
+    app.after_request(_perfil_fin)
+    app.register_error_handler(Exception, on_exception)
+    app.register_blueprint(api)
+    if servicios:
+        iniciar_servicios()
+    return app
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "5000"))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    create_app().run(host="0.0.0.0", port=port, debug=True)
     
@@ -0,0 +1,123 @@
+"""Benchmark de arranque: tiempo de import, de ``create_app()`` y hasta el primer request.
+
+Cada repetición corre en un proceso nuevo (arranque en frío del intérprete y de
+los imports; el caché de bytecode y el del sistema de archivos sí quedan
+calientes). Con ``--gunicorn`` además levanta ``gunicorn -c gunicorn.conf.py``
+en un puerto local y mide hasta que el primer ``/api/health`` responde 200::
+
+    DATABASE_URL=sqlite:////tmp/bench.db python arranque.py
+    DATABASE_URL=sqlite:////tmp/bench.db python arranque.py --gunicorn --repeticiones 3
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+
+# Corre en el proceso hijo; imprime una línea JSON
+_MEDIR = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+a = app.create_app(servicios=False)
+t2 = time.perf_counter()
+r = a.test_client().get(sys.argv[1])
+t3 = time.perf_counter()
+print(json.dumps({"importar_ms": 1000 * (t1 - t0), "create_app_ms": 1000 * (t2 - t1),
+                  "primer_request_ms": 1000 * (t3 - t2), "codigo": r.status_code,
+                  "pandas_cargado": "pandas" in sys.modules, "openpyxl_cargado": "openpyxl" in sys.modules,
+                  "modulos": len(sys.modules)}))
+"""
+
+
+def medir_proceso(ruta: str) -> dict:
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-c", _MEDIR, ruta], cwd=AQUI, capture_output=True, text=True)
+    total = 1000 * (time.perf_counter() - t0)
+    if p.returncode != 0:
+        raise RuntimeError(p.stderr.strip().splitlines()[-1] if p.stderr.strip() else "falló el proceso hijo")
+    out = json.loads(p.stdout.strip().splitlines()[-1])
+    out["proceso_ms"] = total
+    return out
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def medir_gunicorn(ruta: str, workers: int, espera_max: float = 60.0) -> dict:
+    puerto = _puerto_libre()
+    env = dict(os.environ, PORT=str(puerto), WEB_CONCURRENCY=str(workers))
+    t0 = time.perf_counter()
+    p = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{puerto}"],
+                         cwd=AQUI, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < espera_max:
+            if p.poll() is not None:
+                raise RuntimeError(f"gunicorn terminó con código {p.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{puerto}{ruta}", timeout=5) as r:
+                    if r.status == 200:
+                        return {"primer_200_ms": 1000 * (time.perf_counter() - t0)}
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"gunicorn no respondió en {espera_max:.0f} s")
+    finally:
+        p.terminate()
+        try:
+            p.wait(30)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+
+
+def _resumen(muestras: list) -> dict:
+    out = {}
+    for k, v in muestras[0].items():
+        if not k.endswith("_ms"):
+            out[k] = v
+        else:
+            vals = [m[k] for m in muestras]
+            out[k] = {"mediana": round(statistics.median(vals), 1), "min": round(min(vals), 1),
+                      "max": round(max(vals), 1)}
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--ruta", default="/api/health", help="request que cuenta como el primero")
+    ap.add_argument("--gunicorn", action="store_true", help="mide también un gunicorn real hasta el primer 200")
+    ap.add_argument("--workers", type=int, default=2, help="workers de gunicorn (con --gunicorn)")
+    ap.add_argument("--json", help="escribe el resultado en este archivo")
+    args = ap.parse_args(argv)
+
+    res = {"proceso": _resumen([medir_proceso(args.ruta) for _ in range(args.repeticiones)])}
+    if args.gunicorn:
+        res["gunicorn"] = _resumen([medir_gunicorn(args.ruta, args.workers) for _ in range(args.repeticiones)])
+
+    for grupo, valores in res.items():
+        print(f"[{grupo}]")
+        for k, v in valores.items():
+            if isinstance(v, dict):
+                print(f"  {k:<18} {v['mediana']:>9.1f} ms  (min {v['min']:.1f}, max {v['max']:.1f})")
+            else:
+                print(f"  {k:<18} {v}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(res, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Avatares de empleados: almacenamiento por contenido y miniaturas pregeneradas.
+
+Al subir una foto se calcula la huella del archivo original (sha256) y se
+generan, una sola vez, miniaturas cuadradas en los tamaños que usa el tablero
+(``AVATAR_TAMANOS``: 1x y 2x de la tarjeta). Todo queda en disco bajo
+``AVATAR_DIR/<2 primeros>/<huella>``; ``foto_url`` del empleado pasa a ser la URL de
+la miniatura base, ``/api/avatares/<huella>-<tamaño>.<ext>``. Como la URL cambia
+si cambia el contenido, se sirve con ``Cache-Control: immutable`` y ETag: un
+tablero con 200 caras descarga unos cuantos KB por cara la primera vez y nada
+después.
+
+Los archivos no se borran al cambiar la foto (otra persona puede tener la misma);
+``python avatares.py --limpiar`` borra los que ya nadie referencia. Con
+``--importar-urls`` se descargan las ``foto_url`` externas (http/https) y se
+reescriben a la miniatura local.
+
+Pillow es opcional: sin él no se aceptan subidas (``disponible()`` es False) y
+las miniaturas ya generadas se siguen sirviendo. En Render ``AVATAR_DIR`` debe
+apuntar a un disco persistente.
+"""
+import argparse
+import hashlib
+import importlib.util
+import io
+import os
+import re
+import sys
+import tempfile
+
+AVATAR_DIR = os.path.abspath(os.getenv("AVATAR_DIR") or
+                             os.path.join(os.path.dirname(__file__), "..", "data", "avatares"))
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(8 * 1024 * 1024)))
+AVATAR_TAMANOS = tuple(sorted(int(t) for t in os.getenv("AVATAR_TAMANOS", "40,80").split(",") if t.strip()))
+AVATAR_CALIDAD = int(os.getenv("AVATAR_CALIDAD", "80"))
+AVATAR_MAX_PIXELES = 40_000_000       # tope contra imágenes "bomba"
+PREFIJO_URL = "/api/avatares/"
+_ARCHIVO = re.compile(r"^([0-9a-f]{24})-(\d+)\.(webp|jpg)$")
+_MIME = {"webp": "image/webp", "jpg": "image/jpeg"}
+
+
+class AvatarInvalido(ValueError):
+    """El archivo no es una imagen utilizable."""
+
+
+def disponible() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+def _formato():
+    from PIL import features
+    return ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+def nombre_archivo(huella: str, tam: int, ext: str) -> str:
+    return f"{huella}-{tam}.{ext}"
+
+def url(huella: str, tam: int, ext: str) -> str:
+    return PREFIJO_URL + nombre_archivo(huella, tam, ext)
+
+def _ruta(nombre: str) -> str:
+    return os.path.join(AVATAR_DIR, nombre[:2], nombre)
+
+def _escribir(ruta: str, datos: bytes) -> None:
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.replace(tmp, ruta)   # atómico: otro worker nunca ve un archivo a medias
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# ---------- Miniaturas ----------
+def _abrir(contenido: bytes):
+    from PIL import Image, ImageOps
+    errores = (Image.DecompressionBombError, OSError, SyntaxError, ValueError)
+    try:
+        img = Image.open(io.BytesIO(contenido))
+    except errores as e:
+        raise AvatarInvalido(f"No es una imagen válida ({type(e).__name__})")
+    if img.width * img.height > AVATAR_MAX_PIXELES:
+        raise AvatarInvalido(f"Imagen demasiado grande ({img.width}x{img.height})")
+    lado = 2 * AVATAR_TAMANOS[-1]
+    img.draft("RGB", (lado, lado))            # JPEG: decodifica ya reducida (mucho más rápido)
+    try:
+        img.load()
+    except errores as e:
+        raise AvatarInvalido(f"No es una imagen válida ({type(e).__name__})")
+    img = ImageOps.exif_transpose(img)        # fotos de celular giradas
+    if img.mode not in ("RGB", "L"):
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        rgba = img.convert("RGBA")
+        fondo.paste(rgba, mask=rgba.getchannel("A"))
+        img = fondo
+    return img.convert("RGB")
+
+def miniaturas(contenido: bytes) -> dict:
+    """``{tamaño: bytes}`` recortadas al centro en cuadrado."""
+    from PIL import Image, ImageOps
+    img = _abrir(contenido)
+    formato, _ = _formato()
+    out = {}
+    for tam in AVATAR_TAMANOS:
+        mini = ImageOps.fit(img, (tam, tam), Image.LANCZOS, centering=(0.5, 0.4))   # caras: un poco arriba
+        buf = io.BytesIO()
+        if formato == "WEBP":
+            mini.save(buf, formato, quality=AVATAR_CALIDAD, method=6)
+        else:
+            mini.save(buf, formato, quality=AVATAR_CALIDAD, optimize=True, progressive=True)
+        out[tam] = buf.getvalue()
+    return out
+
+def guardar(contenido: bytes) -> str:
+    """Guarda las miniaturas de ``contenido`` (si no existían) y devuelve la URL de la base."""
+    if len(contenido) > AVATAR_MAX_BYTES:
+        raise AvatarInvalido(f"La imagen excede {AVATAR_MAX_BYTES // (1024 * 1024)} MB")
+    if not contenido:
+        raise AvatarInvalido("Archivo vacío")
+    huella = hashlib.sha256(contenido).hexdigest()[:24]
+    _, ext = _formato()
+    faltan = [t for t in AVATAR_TAMANOS if not os.path.exists(_ruta(nombre_archivo(huella, t, ext)))]
+    if faltan:
+        for tam, datos in miniaturas(contenido).items():
+            if tam in faltan:
+                _escribir(_ruta(nombre_archivo(huella, tam, ext)), datos)
+    return url(huella, AVATAR_TAMANOS[0], ext)
+
+
+# ---------- Servir ----------
+def leer(nombre: str):
+    """``(bytes, mime, etag)`` de una miniatura, o ``None`` si el nombre no es válido o no existe."""
+    m = _ARCHIVO.match(nombre)
+    if not m:
+        return None
+    try:
+        with open(_ruta(nombre), "rb") as f:
+            datos = f.read()
+    except FileNotFoundError:
+        return None
+    return datos, _MIME[m.group(3)], f"{m.group(1)}-{m.group(2)}"
+
+def huella_de_url(foto_url):
+    """Huella si ``foto_url`` es una miniatura local; ``None`` si es externa o vacía."""
+    if not foto_url or not foto_url.startswith(PREFIJO_URL):
+        return None
+    m = _ARCHIVO.match(foto_url[len(PREFIJO_URL):])
+    return m.group(1) if m else None
+
+
+# ---------- Mantenimiento ----------
+def limpiar(engine) -> int:
+    """Borra las miniaturas que ya no referencia ningún empleado."""
+    from sqlalchemy import select
+    from models import Empleado
+    with engine.connect() as conn:
+        vivas = {huella_de_url(u) for (u,) in conn.execute(select(Empleado.foto_url).distinct())}
+    n = 0
+    for dirpath, _, archivos in os.walk(AVATAR_DIR):
+        for a in archivos:
+            m = _ARCHIVO.match(a)
+            if m and m.group(1) not in vivas:
+                os.unlink(os.path.join(dirpath, a))
+                n += 1
+    return n
+
+def importar_urls(SessionLocal, timeout: float = 15.0) -> tuple:
+    """Descarga las ``foto_url`` externas y las reescribe a la miniatura local (con bitácora)."""
+    import urllib.request
+    from sqlalchemy import select
+    from models import Empleado
+    from cache_calendario import bump_version
+    import bitacora
+    db = SessionLocal()
+    try:
+        emps = db.execute(select(Empleado).where(Empleado.foto_url.like("http%"))).scalars().all()
+        hechas, fallidas, cache = 0, [], {}
+        for e in emps:
+            try:
+                if e.foto_url not in cache:
+                    with urllib.request.urlopen(e.foto_url, timeout=timeout) as r:
+                        cache[e.foto_url] = guardar(r.read(AVATAR_MAX_BYTES + 1))
+            except (OSError, AvatarInvalido) as err:
+                fallidas.append((e.id, e.foto_url, str(err)))
+                continue
+            e.foto_url = cache[e.foto_url]
+            bitacora.anotar(db, [("emp", e.id, "u", e.id, None)])
+            hechas += 1
+        if hechas:
+            db.flush()
+            bitacora.escribir(db, bump_version(db))
+            db.commit()
+        return hechas, fallidas
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Avatares de empleados")
+    ap.add_argument("--limpiar", action="store_true", help="borra miniaturas sin empleado que las use")
+    ap.add_argument("--importar-urls", action="store_true",
+                    help="descarga las foto_url externas y las reescribe a miniaturas locales")
+    args = ap.parse_args(argv)
+    if not (args.limpiar or args.importar_urls):
+        ap.print_help()
+        return 1
+    from models import SessionLocal, engine, init_db
+    init_db()
+    if args.importar_urls:
+        if not disponible():
+            print("Pillow no está instalado", file=sys.stderr)
+            return 1
+        hechas, fallidas = importar_urls(SessionLocal)
+        for eid, origen, err in fallidas:
+            print(f"empleado {eid}: {origen}: {err}", file=sys.stderr)
+        print(f"{hechas} fotos importadas, {len(fallidas)} con error")
+    if args.limpiar:
+        print(f"{limpiar(engine)} miniaturas borradas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
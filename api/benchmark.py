@@ -0,0 +1,305 @@
+"""Benchmark de endpoints: throughput y latencias p50/p95/p99 contra una línea base.
+
+Corre cada escenario por separado con ``--concurrencia`` hilos hasta completar
+``--peticiones``. Por defecto usa el cliente de pruebas de Flask en el mismo
+proceso (mide la app y la BD, sin red); con ``--url`` apunta a un servidor real
+(p.ej. gunicorn local). Los escenarios de escritura crean datos en un año lejano
+(``hoy + 50``) y al terminar borran las vacaciones que crearon; aun así, úsalo
+sobre una base de pruebas generada con ``generador.py``::
+
+    DATABASE_URL=sqlite:////tmp/bench.db python generador.py --empleados 50000 --vacaciones 1000000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py --guardar-baseline
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py          # compara y sale 1 si empeoró
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+BASELINE = os.getenv("BENCH_BASELINE", "bench_baseline.json")
+RUIDO_MS = 2.0   # diferencias de p95 menores a esto no cuentan como regresión
+
+
+# ---------- Clientes ----------
+class ClienteLocal:
+    """Cliente de pruebas de Flask, uno por hilo."""
+
+    def __init__(self):
+        import app as app_mod
+        self._app = app_mod.create_app()
+        self._tl = threading.local()
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        c = getattr(self._tl, "c", None)
+        if c is None:
+            c = self._tl.c = self._app.test_client()
+        r = c.open(ruta, method=metodo, json=cuerpo)
+        return r.status_code, r.get_json(silent=True)
+
+
+class ClienteHTTP:
+    def __init__(self, base: str):
+        self.base = base.rstrip("/")
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        data = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        req = urllib.request.Request(self.base + urllib.request.quote(ruta, safe="/?&=:,"),
+                                     data=data, method=metodo,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as r:
+                status, raw = r.status, r.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        try:
+            return status, json.loads(raw or b"null")
+        except ValueError:
+            return status, None
+
+
+# ---------- Contexto y escenarios ----------
+class Contexto:
+    """Muestra de datos reales para armar peticiones variadas."""
+
+    def __init__(self, cliente, hoy: date, rnd):
+        self.cliente, self.hoy, self.rnd = cliente, hoy, rnd
+        self.empleados, self.tokens = [], []
+        self.cursores_emp, self.cursores_vac = [], []
+        self.creadas, self._lock = [], threading.Lock()
+        self.anio_escritura = hoy.year + 50
+        self._n = 0
+
+        cursor = ""
+        for pagina in range(60):
+            st, body = cliente.pedir("GET", f"/api/empleados?size=100&total=0&cursor={cursor}")
+            if st != 200 or not body["items"]:
+                break
+            if pagina < 5:
+                for it in body["items"]:
+                    self.empleados.append(it["id"])
+                    self.tokens.extend(t for t in it["nombre"].replace(",", " ").split() if len(t) > 3)
+            elif pagina >= 20:
+                self.cursores_emp.append(cursor)
+            cursor = body.get("next_cursor")
+            if not cursor:
+                break
+        s, e = (hoy - timedelta(days=365)).isoformat(), hoy.isoformat()
+        cursor = ""
+        for pagina in range(60):
+            st, body = cliente.pedir("GET", f"/api/vacaciones?start={s}&end={e}&size=100&total=0&cursor={cursor}")
+            if st != 200 or not body.get("next_cursor"):
+                break
+            cursor = body["next_cursor"]
+            if pagina >= 20:
+                self.cursores_vac.append(cursor)
+        if not self.empleados:
+            raise SystemExit("La base no tiene empleados; genera datos con generador.py")
+
+    def ventana(self, dias=14):
+        ini = self.hoy + timedelta(days=self.rnd.randint(-180, 180))
+        return ini.isoformat(), (ini + timedelta(days=dias - 1)).isoformat()
+
+    def siguiente(self) -> int:
+        with self._lock:
+            self._n += 1
+            return self._n
+
+
+def _esc_calendario(ctx):
+    s, e = ctx.ventana()
+    return "GET", f"/api/calendario?start={s}&end={e}", None
+
+def _esc_calendario_planta(ctx):
+    s, e = ctx.ventana()
+    return "GET", f"/api/calendario?start={s}&end={e}&planta={ctx.rnd.choice(('Planta 1', 'Planta 3'))}", None
+
+def _esc_calendario_q(ctx):
+    s, e = ctx.ventana(28)
+    return "GET", f"/api/calendario?start={s}&end={e}&q={ctx.rnd.choice(ctx.tokens)}", None
+
+def _esc_empleados_offset(ctx):
+    return "GET", f"/api/empleados?page={ctx.rnd.randint(50, 150)}&size=20", None
+
+def _esc_empleados_cursor(ctx):
+    return "GET", f"/api/empleados?size=20&cursor={ctx.rnd.choice(ctx.cursores_emp or [''])}", None
+
+def _esc_vacaciones_cursor(ctx):
+    s, e = (ctx.hoy - timedelta(days=365)).isoformat(), ctx.hoy.isoformat()
+    return "GET", f"/api/vacaciones?start={s}&end={e}&size=20&cursor={ctx.rnd.choice(ctx.cursores_vac or [''])}", None
+
+def _esc_buscar(ctx):
+    t = ctx.rnd.choice(ctx.tokens)
+    return "GET", f"/api/empleados/buscar?q={t[:ctx.rnd.randint(3, len(t))]}", None
+
+def _esc_cobertura(ctx):
+    s, e = ctx.ventana(30)
+    return "GET", f"/api/analitica/cobertura?start={s}&end={e}&group_by=planta,turno", None
+
+def _esc_crear_vacacion(ctx):
+    # Días al azar en el año de escritura: una parte choca y ejercita el 400 por traslape
+    ini = date(ctx.anio_escritura, 1, 1) + timedelta(days=ctx.rnd.randint(0, 360))
+    fin = ini + timedelta(days=ctx.rnd.randint(0, 4))
+    return "POST", "/api/vacaciones", {"empleado_id": ctx.rnd.choice(ctx.empleados),
+                                       "fecha_inicial": ini.isoformat(), "fecha_final": fin.isoformat(),
+                                       "fuente": "bench"}
+
+def _esc_alta_atomica(ctx):
+    n = ctx.siguiente()
+    ini = date(ctx.anio_escritura, 1, 1) + timedelta(days=n % 360)
+    return "POST", "/api/alta/empleado-vacacion", {
+        "numero_emp": f"BENCH-{ctx.rnd.getrandbits(32):08x}-{n}", "nombre": "Prueba Bench, Carga",
+        "planta": "Planta 1", "fecha_inicial": ini.isoformat(), "fecha_final": ini.isoformat(),
+        "fuente": "bench"}
+
+ESCENARIOS = {
+    # nombre: (constructor, códigos esperados)
+    "calendario": (_esc_calendario, (200, 304)),
+    "calendario_planta": (_esc_calendario_planta, (200, 304)),
+    "calendario_q": (_esc_calendario_q, (200, 304)),
+    "empleados_offset_profundo": (_esc_empleados_offset, (200,)),
+    "empleados_cursor_profundo": (_esc_empleados_cursor, (200,)),
+    "vacaciones_cursor_profundo": (_esc_vacaciones_cursor, (200,)),
+    "buscar": (_esc_buscar, (200,)),
+    "cobertura": (_esc_cobertura, (200, 304)),
+    "crear_vacacion": (_esc_crear_vacacion, (200, 400)),
+    "alta_atomica": (_esc_alta_atomica, (200,)),
+}
+
+
+# ---------- Ejecución ----------
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    k = min(len(ordenadas) - 1, max(0, int(round(p / 100 * len(ordenadas))) - 1))
+    return ordenadas[k]
+
+def correr(ctx, nombre, n: int, concurrencia: int) -> dict:
+    construir, esperados = ESCENARIOS[nombre]
+    lat, errores, pendientes = [], [0], [n]
+    lock = threading.Lock()
+
+    def trabajador():
+        while True:
+            with lock:
+                if pendientes[0] <= 0:
+                    return
+                pendientes[0] -= 1
+                metodo, ruta, cuerpo = construir(ctx)   # rnd no es seguro entre hilos
+            t0 = time.perf_counter()
+            st, body = ctx.cliente.pedir(metodo, ruta, cuerpo)
+            dt = (time.perf_counter() - t0) * 1000
+            with lock:
+                lat.append(dt)
+                if st not in esperados:
+                    errores[0] += 1
+                elif st == 200 and metodo == "POST" and isinstance(body, dict):
+                    vid = body.get("id") or body.get("vacacion_id")
+                    if vid:
+                        ctx.creadas.append(vid)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as ex:
+        for f in [ex.submit(trabajador) for _ in range(concurrencia)]:
+            f.result()
+    total = time.perf_counter() - t0
+    lat.sort()
+    return {"n": len(lat), "errores": errores[0], "rps": round(len(lat) / total, 1),
+            "p50_ms": round(_percentil(lat, 50), 2), "p95_ms": round(_percentil(lat, 95), 2),
+            "p99_ms": round(_percentil(lat, 99), 2), "max_ms": round(lat[-1], 2) if lat else 0.0}
+
+def limpiar(ctx) -> int:
+    borradas = 0
+    for vid in ctx.creadas:
+        st, _ = ctx.cliente.pedir("DELETE", f"/api/vacaciones/{vid}")
+        borradas += st == 200
+    ctx.creadas.clear()
+    return borradas
+
+
+# ---------- Línea base ----------
+def comparar(actual: dict, base: dict, tolerancia: float) -> list:
+    """Lista de ``(escenario, motivo)`` que empeoraron más allá de ``tolerancia``."""
+    malos = []
+    for nombre, r in actual.items():
+        b = base.get(nombre)
+        if not b:
+            continue
+        if r["p95_ms"] > b["p95_ms"] * (1 + tolerancia) and r["p95_ms"] - b["p95_ms"] > RUIDO_MS:
+            malos.append((nombre, f"p95 {b['p95_ms']} -> {r['p95_ms']} ms"))
+        if r["rps"] < b["rps"] / (1 + tolerancia):
+            malos.append((nombre, f"rps {b['rps']} -> {r['rps']}"))
+        if r["errores"] > b.get("errores", 0):
+            malos.append((nombre, f"errores {b.get('errores', 0)} -> {r['errores']}"))
+    return malos
+
+def _tabla(res: dict, base: dict):
+    print(f"{'escenario':28} {'n':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}  vs base p95")
+    for nombre, r in res.items():
+        b = base.get(nombre)
+        delta = f"{(r['p95_ms'] / b['p95_ms'] - 1) * 100:+.0f}%" if b and b["p95_ms"] else "-"
+        print(f"{nombre:28} {r['n']:>6} {r['errores']:>4} {r['rps']:>8} {r['p50_ms']:>8} "
+              f"{r['p95_ms']:>8} {r['p99_ms']:>8}  {delta}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", help="servidor a medir (por defecto, la app en el mismo proceso)")
+    ap.add_argument("--peticiones", type=int, default=200, help="peticiones por escenario")
+    ap.add_argument("--concurrencia", type=int, default=8)
+    ap.add_argument("--escenarios", default=",".join(ESCENARIOS), help="lista separada por comas")
+    ap.add_argument("--hoy", default=date.today().isoformat(), help="fecha ancla de las ventanas")
+    ap.add_argument("--semilla", type=int, default=7)
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--guardar-baseline", action="store_true", help="guarda el resultado como línea base")
+    ap.add_argument("--tolerancia", type=float, default=0.25, help="empeoramiento permitido (0.25 = 25%%)")
+    ap.add_argument("--json", help="escribe el resultado en este archivo")
+    args = ap.parse_args(argv)
+
+    nombres = [n.strip() for n in args.escenarios.split(",") if n.strip()]
+    desconocidos = [n for n in nombres if n not in ESCENARIOS]
+    if desconocidos:
+        ap.error(f"escenarios desconocidos: {', '.join(desconocidos)}")
+
+    cliente = ClienteHTTP(args.url) if args.url else ClienteLocal()
+    ctx = Contexto(cliente, date.fromisoformat(args.hoy), random.Random(args.semilla))
+    res = {}
+    try:
+        for nombre in nombres:
+            res[nombre] = correr(ctx, nombre, args.peticiones, args.concurrencia)
+    finally:
+        limpiar(ctx)
+
+    base = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f).get("escenarios", {})
+    _tabla(res, base)
+
+    salida = {"fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "url": args.url or "local",
+              "peticiones": args.peticiones, "concurrencia": args.concurrencia, "escenarios": res}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2)
+    if args.guardar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2)
+        print(f"línea base guardada en {args.baseline}")
+        return 0
+
+    malos = comparar(res, base, args.tolerancia)
+    for nombre, motivo in malos:
+        print(f"REGRESIÓN {nombre}: {motivo}")
+    if base and not malos:
+        print("OK: sin regresiones contra la línea base")
+    return 1 if malos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Bitácora de cambios de empleados y vacaciones para sincronización por deltas.
+
+Cada escritura deja en ``bitacora_cambios`` una fila por registro tocado
+``(version, entidad, entidad_id, op, planta)``. ``version`` es la versión de datos
+que ``commit_cambios`` sube en la misma transacción: como ese UPDATE bloquea la
+fila de ``meta_datos`` hasta el commit, las versiones se hacen visibles en orden y
+un cursor ``(version, id)`` nunca se salta una escritura que confirme después.
+
+Los cambios se juntan en ``session.info`` antes de escribirse:
+
+* ORM: hook ``after_flush`` (como ``intervalos`` y ``saldos``).
+* Rutas masivas (``lotes``, ``importador``): llaman ``anotar``.
+
+Si cambia la planta o el estado activo de un empleado, también se anotan sus
+vacaciones en la planta anterior y en la nueva, para que quien sincroniza una
+sola planta se entere de que salen o entran a su vista.
+
+``compactar`` borra las entradas superadas por otra más reciente del mismo
+registro y, pasados ``CAMBIOS_RETENCION_DIAS``, las viejas; los cursores
+anteriores al horizonte (``meta_datos['bitacora_horizonte']``) reciben 410 y el
+cliente vuelve a cargar completo (``python bitacora.py --compactar``).
+"""
+import argparse
+import datetime
+import os
+import sys
+
+from sqlalchemy import delete, event, func, insert, inspect, literal, select, tuple_, update
+from sqlalchemy.orm import aliased
+
+from models import Cambio, Empleado, MetaDatos, Vacacion
+from cache_calendario import data_version
+
+CAMBIOS_LIMITE = int(os.getenv("CAMBIOS_LIMITE", "500"))
+CAMBIOS_RETENCION_DIAS = int(os.getenv("CAMBIOS_RETENCION_DIAS", "30"))
+CAMBIOS_COMPACTAR_CADA = int(os.getenv("CAMBIOS_COMPACTAR_CADA", "1000"))   # versiones entre compactaciones
+HORIZONTE_KEY = "bitacora_horizonte"
+IN_CHUNK = 500
+
+VAC_CAMPOS = ("id", "empleado", "fecha_inicial", "fecha_final", "tipo", "gozo")
+EMP_CAMPOS = ("id", "numero", "nombre", "nombre_corto", "planta", "turno", "area", "foto_url")
+
+
+class CursorExpirado(ValueError):
+    """El cursor es anterior a lo que conserva la bitácora: hay que recargar completo."""
+
+
+def _ahora():
+    return datetime.datetime.utcnow()
+
+def _chunks(seq, n=IN_CHUNK):
+    seq = list(seq)
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+# ---------- Captura ----------
+def anotar(session, entradas) -> None:
+    """Agrega ``(entidad, id, op, empleado_id, planta)`` pendientes de escribir.
+
+    ``entidad`` es ``vac``, ``emp`` o ``vacs_emp`` (todas las vacaciones del empleado
+    ``id``). La planta sale del empleado ``empleado_id`` al escribir; ``planta`` se
+    usa tal cual cuando ``empleado_id`` es ``None`` (la planta anterior de un cambio).
+    """
+    session.info.setdefault("bitacora", []).extend(entradas)
+
+def _antes(obj, campo):
+    h = inspect(obj).attrs[campo].history
+    return h.deleted[0] if h.deleted else getattr(obj, campo)
+
+def registrar_sesion(session_factory) -> None:
+    @event.listens_for(session_factory, "after_flush")
+    def _capturar(session, flush_context):
+        out = []
+        for obj in session.new:
+            if isinstance(obj, Vacacion):
+                out.append(("vac", obj.id, "i", obj.empleado_id, None))
+            elif isinstance(obj, Empleado):
+                out.append(("emp", obj.id, "i", obj.id, None))
+        for obj in session.dirty:
+            if not session.is_modified(obj):
+                continue
+            if isinstance(obj, Vacacion):
+                out.append(("vac", obj.id, "u", obj.empleado_id, None))
+                emp_antes = _antes(obj, "empleado_id")
+                if emp_antes != obj.empleado_id:
+                    out.append(("vac", obj.id, "u", emp_antes, None))
+            elif isinstance(obj, Empleado):
+                out.append(("emp", obj.id, "u", obj.id, None))
+                planta_antes = _antes(obj, "planta")
+                if planta_antes != obj.planta or _antes(obj, "activo") != obj.activo:
+                    out += [("emp", obj.id, "u", None, planta_antes), ("vacs_emp", obj.id, "u", None, planta_antes)]
+        for obj in session.deleted:
+            if isinstance(obj, Vacacion):
+                out.append(("vac", obj.id, "d", _antes(obj, "empleado_id"), None))
+            elif isinstance(obj, Empleado):
+                out.append(("emp", obj.id, "d", None, _antes(obj, "planta")))
+        if out:
+            anotar(session, out)
+
+    @event.listens_for(session_factory, "after_soft_rollback")
+    def _descartar(session, previous_transaction):
+        session.info.pop("bitacora", None)
+
+
+# ---------- Escritura ----------
+def escribir(db, version: int) -> int:
+    """Escribe lo anotado en la transacción de ``db`` con ``version``; llamar tras ``bump_version``."""
+    pendientes = db.info.pop("bitacora", None)
+    if not pendientes:
+        return 0
+    emp_ids = {e[3] for e in pendientes if e[3] is not None} | {e[1] for e in pendientes if e[0] == "vacs_emp"}
+    plantas = {}
+    for part in _chunks(emp_ids):
+        plantas.update(db.execute(select(Empleado.id, Empleado.planta).where(Empleado.id.in_(part))).tuples().all())
+
+    ahora = _ahora()
+    filas, vacs_emp = {}, set()
+    for entidad, eid, op, emp_id, planta in pendientes:
+        planta = plantas.get(emp_id) if emp_id is not None else planta
+        if entidad == "vacs_emp":
+            vacs_emp.update({(eid, planta), (eid, plantas.get(eid))})
+            continue
+        clave = (entidad, eid, planta)
+        # Dentro de la transacción gana la última operación (alta + baja = baja)
+        filas.pop(clave, None)
+        filas[clave] = op
+    if filas:
+        db.execute(insert(Cambio), [
+            {"version": version, "entidad": e, "entidad_id": i, "op": op, "planta": p, "creado_en": ahora}
+            for (e, i, p), op in filas.items()])
+    for eid, planta in vacs_emp:
+        db.execute(insert(Cambio).from_select(
+            ["version", "entidad", "entidad_id", "op", "planta", "creado_en"],
+            select(literal(version), literal("vac"), Vacacion.id, literal("u"), literal(planta, Cambio.planta.type),
+                   literal(ahora, Cambio.creado_en.type)).where(Vacacion.empleado_id == eid)))
+    return len(filas) + len(vacs_emp)
+
+def reiniciar(conn, version: int) -> None:
+    """Tras reescribir los datos por fuera de la bitácora: todos los cursores expiran."""
+    conn.execute(delete(Cambio))
+    _poner_horizonte(conn, version + 1)
+
+def _poner_horizonte(conn, valor: int) -> None:
+    res = conn.execute(update(MetaDatos).where(MetaDatos.clave == HORIZONTE_KEY).values(valor=valor))
+    if res.rowcount == 0:
+        conn.execute(insert(MetaDatos).values(clave=HORIZONTE_KEY, valor=valor))
+
+
+# ---------- Lectura ----------
+def cursor_actual(db) -> tuple:
+    ultimo = db.execute(select(Cambio.version, Cambio.id).order_by(Cambio.version.desc(), Cambio.id.desc())
+                        .limit(1)).first()
+    return tuple(ultimo) if ultimo else (data_version(db, HORIZONTE_KEY), 0)
+
+def leer(db, desde: tuple, planta: str = None, limite: int = CAMBIOS_LIMITE) -> dict:
+    """Cambios posteriores al cursor ``desde = (version, id)``, ya resueltos al estado actual.
+
+    Devuelve ``vacaciones``/``empleados`` (filas compactas a insertar o reemplazar),
+    ``borrados`` (ids a quitar), el ``cursor`` siguiente y ``mas`` si quedaron
+    entradas por leer. Lanza ``CursorExpirado`` si ``desde`` ya se compactó.
+    """
+    if desde[0] < data_version(db, HORIZONTE_KEY):
+        raise CursorExpirado("cursor expirado; recarga completa")
+    stmt = (select(Cambio.id, Cambio.version, Cambio.entidad, Cambio.entidad_id, Cambio.op)
+            .where(tuple_(Cambio.version, Cambio.id) > tuple_(*desde))
+            .order_by(Cambio.version, Cambio.id).limit(limite + 1))
+    if planta:
+        stmt = stmt.where(Cambio.planta == planta)
+    entradas = db.execute(stmt).all()
+    mas = len(entradas) > limite
+    entradas = entradas[:limite]
+    cursor = (entradas[-1][1], entradas[-1][0]) if entradas else tuple(desde)
+
+    ultimo = {}
+    for _id, _v, entidad, eid, op in entradas:
+        ultimo[(entidad, eid)] = op
+    vivos = {"vac": [], "emp": []}
+    borrados = {"vac": set(), "emp": set()}
+    for (entidad, eid), op in ultimo.items():
+        (borrados[entidad].add(eid) if op == "d" else vivos[entidad].append(eid))
+
+    # Estado actual de lo que sigue vivo; lo que ya no existe, está inactivo o salió
+    # de la planta pedida se manda como borrado
+    vacaciones = []
+    if vivos["vac"]:
+        for vid, emp_id, fi, ff, tipo, gozo, e_planta, activo in db.execute(
+                select(Vacacion.id, Vacacion.empleado_id, Vacacion.fecha_inicial, Vacacion.fecha_final,
+                       Vacacion.tipo, Vacacion.gozo, Empleado.planta, Empleado.activo)
+                .join(Empleado, Vacacion.empleado_id == Empleado.id)
+                .where(Vacacion.id.in_(vivos["vac"]))):
+            if activo and (not planta or e_planta == planta):
+                vacaciones.append((vid, emp_id, fi.isoformat(), ff.isoformat(), tipo,
+                                   float(gozo) if gozo is not None else None))
+    empleados = []
+    if vivos["emp"]:
+        for row in db.execute(
+                select(Empleado.id, Empleado.numero_emp, Empleado.nombre, Empleado.nombre_corto, Empleado.planta,
+                       Empleado.turno, Empleado.area, Empleado.foto_url, Empleado.activo)
+                .where(Empleado.id.in_(vivos["emp"]))):
+            if row[-1] and (not planta or row[4] == planta):
+                empleados.append(tuple(row[:-1]))
+    borrados["vac"].update(set(vivos["vac"]) - {v[0] for v in vacaciones})
+    borrados["emp"].update(set(vivos["emp"]) - {e[0] for e in empleados})
+
+    return {"cursor": cursor, "mas": mas, "entradas": len(entradas),
+            "vacaciones": {"campos": VAC_CAMPOS, "filas": vacaciones},
+            "empleados": {"campos": EMP_CAMPOS, "filas": empleados},
+            "borrados": {"vacaciones": sorted(borrados["vac"]), "empleados": sorted(borrados["emp"])}}
+
+
+# ---------- Compactación ----------
+def compactar(conn, retencion_dias: int = CAMBIOS_RETENCION_DIAS) -> dict:
+    """Quita entradas superadas y las de más de ``retencion_dias`` (moviendo el horizonte)."""
+    posterior = aliased(Cambio)
+    superadas = conn.execute(delete(Cambio).where(
+        select(posterior.id).where(posterior.entidad == Cambio.entidad,
+                                   posterior.entidad_id == Cambio.entidad_id,
+                                   posterior.planta.is_not_distinct_from(Cambio.planta),
+                                   posterior.id > Cambio.id).exists())).rowcount
+
+    limite = _ahora() - datetime.timedelta(days=retencion_dias)
+    # El corte es la primera versión reciente; si todo es viejo se conserva la última versión
+    corte = conn.execute(select(func.min(Cambio.version)).where(Cambio.creado_en >= limite)).scalar() \
+        or conn.execute(select(func.max(Cambio.version))).scalar()
+    viejas = 0
+    if corte is not None:
+        viejas = conn.execute(delete(Cambio).where(Cambio.version < corte)).rowcount
+        if viejas:
+            _poner_horizonte(conn, corte)
+    return {"superadas": superadas, "viejas": viejas, "horizonte": data_version(conn, HORIZONTE_KEY)}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Bitácora de cambios para /api/cambios")
+    ap.add_argument("--compactar", action="store_true", help="quita entradas superadas y viejas")
+    ap.add_argument("--retencion", type=int, default=CAMBIOS_RETENCION_DIAS, help="días a conservar")
+    args = ap.parse_args(argv)
+    if not args.compactar:
+        ap.print_help()
+        return 1
+    from models import engine, init_db
+    init_db()
+    with engine.begin() as conn:
+        print(compactar(conn, args.retencion))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
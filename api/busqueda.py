@@ -0,0 +1,113 @@
+"""Búsqueda de empleados: nombre sin acentos (subcadenas por token) y prefijo de número.
+
+``Empleado.nombre_busqueda`` guarda ``clave_busqueda(nombre)`` y se mantiene en
+cada escritura ORM (eventos de mapper) y en la importación masiva. El índice
+depende del motor:
+
+* Postgres: GIN ``pg_trgm`` sobre ``nombre_busqueda`` (sirve ``LIKE '%tok%'``) y
+  ``text_pattern_ops`` sobre ``numero_emp``/``nombre_busqueda`` (sirven ``LIKE 'q%'``).
+* SQLite: tabla FTS5 con tokenizer ``trigram`` sincronizada por triggers; los
+  prefijos son rangos sobre índices B-tree normales.
+
+Columna e índices los crean las migraciones 001/002 (``migraciones.py``).
+"""
+import logging
+
+from sqlalchemy import event, inspect, select, and_, or_, column, table
+
+from models import Empleado
+from normalizacion import clave_busqueda
+
+FTS_TABLE = "empleados_fts"
+
+log = logging.getLogger("busqueda")
+_estado = {"dialecto": None, "fts": False}
+
+
+# ---------- Mantenimiento de la clave ----------
+@event.listens_for(Empleado, "before_insert")
+@event.listens_for(Empleado, "before_update")
+def _sync_clave(mapper, conn, target):
+    target.nombre_busqueda = clave_busqueda(target.nombre)
+
+
+def detectar(engine) -> None:
+    """Registra el motor y si existe el índice FTS5 (lo crea la migración 002)."""
+    _estado["dialecto"] = engine.dialect.name
+    _estado["fts"] = engine.dialect.name == "sqlite" and inspect(engine).has_table(FTS_TABLE)
+
+
+# ---------- Filtros ----------
+def _escape_like(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _prefijo(col, q: str):
+    """``col`` empieza con ``q`` usando el índice del motor."""
+    if _estado["dialecto"] == "postgresql":
+        # LIKE 'q%' lo sirve un índice text_pattern_ops sin depender de la collation
+        return col.like(_escape_like(q) + "%", escape="\\")
+    # SQLite compara binario: el prefijo es un rango del índice B-tree
+    return and_(col >= q, col < q + "\U0010ffff")
+
+def _cond_nombre(tokens, limite: int = None):
+    # Los tokens vienen de clave_busqueda: solo [a-z0-9], no hace falta escapar
+    pats = [f"%{t}%" for t in tokens]
+    if _estado["fts"] and any(len(t) >= 3 for t in tokens):
+        col = column("nombre_busqueda")
+        sub = select(column("rowid")).select_from(table(FTS_TABLE)) \
+            .where(and_(*[col.like(p) for p in pats]))
+        if limite:
+            sub = sub.limit(limite)
+        return Empleado.id.in_(sub)
+    return and_(*[Empleado.nombre_busqueda.like(p) for p in pats])
+
+def filtro(q: str):
+    """Condición para ``q``: todos los tokens en el nombre (cualquier orden) o prefijo de número."""
+    q = (q or "").strip()
+    tokens = clave_busqueda(q).split()
+    if not tokens:
+        return _prefijo(Empleado.numero_emp, q)
+    return or_(_cond_nombre(tokens), _prefijo(Empleado.numero_emp, q))
+
+
+# ---------- Typeahead ----------
+CANDIDATOS = 300
+SUG_COLS = (Empleado.id, Empleado.numero_emp, Empleado.nombre, Empleado.nombre_corto,
+            Empleado.planta, Empleado.turno, Empleado.nombre_busqueda)
+
+def sugerencias(db, q: str, limit: int = 10, planta: str = None):
+    """Sugerencias ordenadas por relevancia, en a lo sumo tres consultas acotadas por índice.
+
+    Rango: 0 número exacto, 1 prefijo de número, 2 el nombre empieza con la consulta,
+    3 alguna palabra empieza con el primer token, 4 contiene todos los tokens.
+    Cada nivel solo se consulta si los anteriores no llenaron ``limit``.
+    """
+    q = (q or "").strip()
+    if not q:
+        return []
+    tokens = clave_busqueda(q).split()
+    base = select(*SUG_COLS).where(Empleado.activo == True)
+    if planta:
+        base = base.where(Empleado.planta == planta)
+
+    elegidos = {}
+    def agregar(rows, rank_fn):
+        for r in rows:
+            if r.id not in elegidos:
+                elegidos[r.id] = (rank_fn(r), r)
+
+    agregar(db.execute(base.where(_prefijo(Empleado.numero_emp, q))
+                       .order_by(Empleado.numero_emp).limit(limit)),
+            lambda r: 0 if r.numero_emp == q else 1)
+    if tokens and len(elegidos) < limit:
+        agregar(db.execute(base.where(_prefijo(Empleado.nombre_busqueda, " ".join(tokens)))
+                           .order_by(Empleado.nombre_busqueda).limit(limit)),
+                lambda r: 2)
+    if tokens and len(elegidos) < limit:
+        # Candidatos acotados: para términos muy comunes basta una muestra del índice
+        palabra = " " + tokens[0]
+        agregar(db.execute(base.where(_cond_nombre(tokens, CANDIDATOS)).limit(CANDIDATOS)),
+                lambda r: 3 if palabra in " " + (r.nombre_busqueda or "") else 4)
+
+    orden = sorted(elegidos.values(), key=lambda x: (x[0], x[1].nombre_busqueda or "", x[1].id))
+    return [(rank, r) for rank, r in orden[:limit]]
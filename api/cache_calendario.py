@@ -0,0 +1,111 @@
+"""Caché de ventanas de /api/calendario invalidada por una versión global de datos.
+
+Cada endpoint de escritura incrementa ``meta_datos['datos']`` dentro de su propia
+transacción; las lecturas solo reconstruyen una ventana si la versión cambió.
+Los fallos concurrentes sobre la misma ventana se agrupan: un hilo consulta y
+los demás esperan su resultado.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select, update, insert
+
+from models import MetaDatos
+
+CAL_CACHE_MAX = int(os.getenv("CAL_CACHE_MAX", "256"))
+VERSION_KEY = "datos"
+
+
+# ---------- Versión de datos ----------
+def data_version(db, clave: str = VERSION_KEY) -> int:
+    v = db.execute(select(MetaDatos.valor).where(MetaDatos.clave == clave)).scalar()
+    return int(v or 0)
+
+def bump_version(db, clave: str = VERSION_KEY) -> int:
+    """Incrementa la versión en la transacción de ``db`` (visible al hacer commit) y la devuelve."""
+    res = db.execute(update(MetaDatos).where(MetaDatos.clave == clave)
+                     .values(valor=MetaDatos.valor + 1))
+    if res.rowcount == 0:
+        db.execute(insert(MetaDatos).values(clave=clave, valor=1))
+        return 1
+    return data_version(db, clave)
+
+
+# ---------- Caché con agrupación de fallos ----------
+class _EnCurso:
+    __slots__ = ("listo", "valor", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.error = None
+
+
+class CalendarCache:
+    """LRU de ``key -> (version, valor)`` con agrupación de cargas concurrentes."""
+
+    def __init__(self, max_entries: int = CAL_CACHE_MAX):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+
+    def get_or_build(self, key, version: int, build):
+        """Devuelve ``(body, etag)``; ``build()`` produce el cuerpo en bytes."""
+        def _con_etag():
+            body = build()
+            return body, hashlib.sha1(body).hexdigest()[:24]
+        return self.get_or_build_valor(key, version, _con_etag)
+
+    def get_or_build_valor(self, key, version: int, build):
+        """Como ``get_or_build`` pero guarda lo que devuelva ``build()`` (no se debe mutar)."""
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None and hit[0] == version:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            pendiente = self._en_curso.get((key, version))
+            lider = pendiente is None
+            if lider:
+                pendiente = self._en_curso[(key, version)] = _EnCurso()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not lider:
+            pendiente.listo.wait()
+            if pendiente.error is not None:
+                raise pendiente.error
+            return pendiente.valor
+
+        try:
+            pendiente.valor = build()
+            with self._lock:
+                actual = self._data.get(key)
+                # No pisar una entrada más nueva que haya llegado mientras tanto
+                if actual is None or actual[0] <= version:
+                    self._data[key] = (version, pendiente.valor)
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.max_entries:
+                        self._data.popitem(last=False)
+            return pendiente.valor
+        except Exception as e:
+            pendiente.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_curso.pop((key, version), None)
+            pendiente.listo.set()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits,
+                    "misses": self.misses, "coalesced": self.coalesced}
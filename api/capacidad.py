@@ -0,0 +1,130 @@
+"""Reglas de capacidad: máximo de personas ausentes a la vez por planta/área/turno.
+
+Una regla aplica a los empleados cuyos campos coinciden con los que la regla
+define (los vacíos aceptan cualquiera) y, si tiene ``desde``/``hasta``, solo en
+esos días. Para validar una escritura se carga en una sola consulta la ocupación
+actual de la ventana afectada, agregada por ``(día inicial, día final, planta,
+área, turno)`` como en ``analitica.cobertura``; cada regla suma sus intervalos
+en un arreglo de diferencias (+n al inicio, -n al día siguiente del fin) y la
+suma acumulada da los ausentes por día sin consultar día por día.
+
+Solo se reportan los días en que las propuestas agregan ausencias: un día que ya
+venía excedido no bloquea escrituras que no lo tocan.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import select, and_, func
+
+from analitica import dias_desde
+from models import Empleado, ReglaCapacidad, Vacacion
+
+CAMPOS = ("planta", "area", "turno")
+
+
+class CapacidadExcedida(ValueError):
+    """La escritura dejaría algún día por encima del máximo de una regla."""
+
+    def __init__(self, violaciones):
+        r = violaciones[0]
+        dias = r["dias"]
+        super().__init__(f"Excede la capacidad de «{r['nombre']}» (máx {r['maximo']}) "
+                         f"el {dias[0]['fecha']}" + (f" y {len(dias) - 1} días más" if len(dias) > 1 else ""))
+        self.violaciones = violaciones
+
+
+def reglas_activas(db) -> list:
+    return db.execute(select(ReglaCapacidad).where(ReglaCapacidad.activa.is_(True))
+                      .order_by(ReglaCapacidad.id)).scalars().all()
+
+def nombre_regla(r) -> str:
+    if r.nombre:
+        return r.nombre
+    return " / ".join(v for v in (r.planta, r.area, r.turno) if v) or "General"
+
+def _coincide(regla, planta, area, turno) -> bool:
+    return ((regla.planta is None or regla.planta == planta)
+            and (regla.area is None or regla.area == area)
+            and (regla.turno is None or regla.turno == turno))
+
+def _vigencia(regla, fi: date, ff: date):
+    """Parte de ``[fi, ff]`` dentro de la vigencia de la regla, o ``None``."""
+    a = max(fi, regla.desde) if regla.desde else fi
+    b = min(ff, regla.hasta) if regla.hasta else ff
+    return (a, b) if a <= b else None
+
+
+def evaluar(db, propuestas, excluir=(), reglas=None) -> list:
+    """Revisa ``propuestas = [(planta, area, turno, fi, ff)]`` contra la ocupación actual.
+
+    ``excluir`` son ids de vacaciones que la escritura reemplaza o borra (no cuentan).
+    Devuelve una violación por regla excedida: ``{"regla", "nombre", "maximo", "dias":
+    [{"fecha", "ausentes"}], "propuestas": [índices que caen en esos días]}``.
+    """
+    if not propuestas:
+        return []
+    reglas = reglas_activas(db) if reglas is None else reglas
+    aplicables = []
+    for r in reglas:
+        tramos = {}
+        for i, (planta, area, turno, fi, ff) in enumerate(propuestas):
+            if _coincide(r, planta, area, turno):
+                tramo = _vigencia(r, fi, ff)
+                if tramo:
+                    tramos[i] = tramo
+        if tramos:
+            aplicables.append((r, tramos))
+    if not aplicables:
+        return []
+
+    lo = min(t[0] for _, tramos in aplicables for t in tramos.values())
+    hi = max(t[1] for _, tramos in aplicables for t in tramos.values())
+    n = (hi - lo).days + 1
+    dialecto = db.get_bind().dialect.name
+    ini = dias_desde(Vacacion.fecha_inicial, lo, dialecto)
+    fin = dias_desde(Vacacion.fecha_final, lo, dialecto)
+    stmt = (select(ini, fin, Empleado.planta, Empleado.area, Empleado.turno, func.count())
+            .join(Empleado, Vacacion.empleado_id == Empleado.id)
+            .where(and_(Vacacion.fecha_inicial <= hi, Vacacion.fecha_final >= lo, Empleado.activo == True))
+            .group_by(ini, fin, Empleado.planta, Empleado.area, Empleado.turno))
+    plantas = {r.planta for r, _ in aplicables}
+    if None not in plantas:
+        stmt = stmt.where(Empleado.planta.in_(plantas))
+    if excluir:
+        stmt = stmt.where(Vacacion.id.not_in(list(excluir)))
+    rows = db.execute(stmt).all()
+
+    a = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)).clip(0, n - 1)
+    b = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows)).clip(0, n - 1)
+    w = np.fromiter((r[5] for r in rows), dtype=np.int64, count=len(rows))
+    grupos = {}
+    for i, r in enumerate(rows):
+        grupos.setdefault(tuple(r[2:5]), []).append(i)
+
+    base = lo.toordinal()
+    out = []
+    for regla, tramos in aplicables:
+        idx = [i for clave, ids in grupos.items() if _coincide(regla, *clave) for i in ids]
+        carga = (np.bincount(a[idx], weights=w[idx], minlength=n + 1)
+                 - np.bincount(b[idx] + 1, weights=w[idx], minlength=n + 1))
+        pa = np.array([t[0].toordinal() - base for t in tramos.values()], dtype=np.int64)
+        pb = np.array([t[1].toordinal() - base for t in tramos.values()], dtype=np.int64)
+        propia = np.bincount(pa, minlength=n + 1) - np.bincount(pb + 1, minlength=n + 1)
+        propia = propia.cumsum()[:n]
+        total = carga.cumsum()[:n].astype(np.int64) + propia
+        viola = (propia > 0) & (total > regla.maximo)
+        if not viola.any():
+            continue
+        dias = np.flatnonzero(viola)
+        culpables = [i for i, p, q in zip(tramos, pa, pb) if viola[p:q + 1].any()]
+        out.append({"regla": regla.id, "nombre": nombre_regla(regla), "maximo": regla.maximo,
+                    "dias": [{"fecha": (lo + timedelta(days=int(d))).isoformat(), "ausentes": int(total[d])}
+                             for d in dias],
+                    "propuestas": culpables})
+    return out
+
+def verificar(db, propuestas, excluir=()) -> None:
+    """Como ``evaluar`` pero lanza ``CapacidadExcedida`` si hay violaciones."""
+    violaciones = evaluar(db, propuestas, excluir)
+    if violaciones:
+        raise CapacidadExcedida(violaciones)
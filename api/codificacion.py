@@ -0,0 +1,71 @@
+"""Serialización JSON rápida y compresión negociada de respuestas ya serializadas.
+
+``dumps`` usa orjson si está instalado (mismo resultado que ``json`` para los tipos
+que usa la API: dict/list/str/int/float/None, llaves enteras como texto) y si no
+cae a la biblioteca estándar.
+
+``comprimir`` elige br/gzip según ``Accept-Encoding`` y guarda el resultado por
+``(etag, codificación)``: un cuerpo cacheado se comprime una sola vez por versión,
+no en cada refresco del tablero.
+"""
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_CACHE_MAX = int(os.getenv("COMPRESS_CACHE_MAX", "256"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def negociar(accept_encoding: str):
+    """``"br"``, ``"gzip"`` o ``None`` según lo que acepta el cliente (ignora ``q=0``)."""
+    aceptadas = set()
+    for parte in (accept_encoding or "").lower().split(","):
+        nombre, _, params = parte.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        aceptadas.add(nombre.strip())
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas:
+        return "gzip"
+    return None
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def comprimir(body: bytes, etag: str, encoding: str) -> bytes:
+    clave = (etag, encoding)
+    with _lock:
+        hit = _cache.get(clave)
+        if hit is not None:
+            _cache.move_to_end(clave)
+            return hit
+    if encoding == "br":
+        out = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        out = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    with _lock:
+        _cache[clave] = out
+        while len(_cache) > COMPRESS_CACHE_MAX:
+            _cache.popitem(last=False)
+    return out
@@ -0,0 +1,71 @@
+"""Conteo de sentencias SQL por petición y presupuesto fijo para los listados.
+
+``@presupuesto_sql(n)`` cuenta las sentencias que ejecuta el handler (en su hilo)
+y, si pasa de ``n``, lo registra; con ``SQL_BUDGET_STRICT=1`` además falla con
+500, de modo que cualquier N+1 (p.ej. una carga perezosa por fila) rompe el
+endpoint en desarrollo sin importar cuántas filas devuelva.
+
+``tests/test_conteo_sql.py`` corre cada ruta presupuestada en modo estricto con N y
+10·N filas sembradas y exige el mismo número de sentencias (``python -m pytest``).
+"""
+import functools
+import logging
+import os
+import threading
+
+from sqlalchemy import event
+
+SQL_BUDGET_STRICT = os.getenv("SQL_BUDGET_STRICT", "0") == "1"
+
+log = logging.getLogger("conteo_sql")
+_local = threading.local()
+
+
+def instalar(engine) -> None:
+    """Engancha el contador al engine (una sola vez)."""
+    if getattr(engine, "_conteo_sql", False):
+        return
+    engine._conteo_sql = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        if getattr(_local, "activo", 0):
+            _local.n += 1
+
+
+class contar_sentencias:
+    """Context manager: ``with contar_sentencias() as c: ...; c.n``."""
+
+    def __enter__(self):
+        self._prev = (getattr(_local, "activo", 0), getattr(_local, "n", 0))
+        _local.activo = self._prev[0] + 1
+        _local.n = 0
+        return self
+
+    def __exit__(self, *exc):
+        self.n = _local.n
+        _local.activo, prev_n = self._prev
+        _local.n = prev_n + self.n
+        return False
+
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+def presupuesto_sql(max_sentencias: int):
+    """Decorador de ruta: el handler no debe ejecutar más de ``max_sentencias``."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with contar_sentencias() as c:
+                resp = fn(*args, **kwargs)
+            if c.n > max_sentencias:
+                msg = f"{fn.__name__} ejecutó {c.n} sentencias SQL (máx {max_sentencias})"
+                if SQL_BUDGET_STRICT:
+                    raise PresupuestoExcedido(msg)
+                log.warning(msg)
+            return resp
+        wrapper.presupuesto_sql = max_sentencias
+        return wrapper
+    return deco
@@ -0,0 +1,247 @@
+"""Días hábiles por planta/turno: semana laboral + días festivos, contados en bloque.
+
+* Semana laboral: máscara de 7 caracteres lunes→domingo (``1111100`` = L-V) por
+  ``planta/turno``, ``planta`` o ``*`` (``SEMANAS_LABORALES="*=1111100;Planta 1/T3=1111110"``).
+* Festivos: los obligatorios de la LFT (art. 74, calculados por año) más los de la
+  tabla ``dias_festivos`` (``planta`` vacía = todas las plantas).
+
+Cada combinación (máscara, planta) se precalcula por año como un arreglo de bits
+con su suma acumulada; contar los días hábiles de N periodos es una resta de dos
+índices por periodo en NumPy, sin recorrer días.
+
+Los festivos de la tabla se recargan cuando cambia ``meta_datos['festivos']``
+(se revisa a lo más cada ``FESTIVOS_TTL_S`` segundos por proceso).
+
+Uso manual: ``python dias_habiles.py --rellenar-gozo`` calcula ``gozo`` de las
+vacaciones que no lo tienen y reconstruye ``saldos``.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+FESTIVOS_OFICIALES = os.getenv("FESTIVOS_OFICIALES", "1") == "1"
+FESTIVOS_TTL_S = float(os.getenv("FESTIVOS_TTL_S", "30"))
+MASCARA_DEFECTO = "1111100"
+FESTIVOS_KEY = "festivos"
+_EPOCA = date(1970, 1, 1).toordinal()
+
+
+def _parse_semanas(s: str) -> dict:
+    out = {"*": MASCARA_DEFECTO}
+    for parte in (s or "").split(";"):
+        clave, _, mascara = parte.partition("=")
+        mascara = mascara.strip()
+        if clave.strip() and len(mascara) == 7 and set(mascara) <= {"0", "1"}:
+            out[clave.strip()] = mascara
+    return out
+
+SEMANAS_LABORALES = _parse_semanas(os.getenv("SEMANAS_LABORALES", ""))
+
+
+def _n_lunes(anio: int, mes: int, n: int) -> date:
+    d = date(anio, mes, 1)
+    return d + timedelta(days=(7 - d.weekday()) % 7 + 7 * (n - 1))
+
+def festivos_oficiales(anio: int) -> dict:
+    """Descansos obligatorios de la Ley Federal del Trabajo (art. 74)."""
+    out = {
+        date(anio, 1, 1): "Año Nuevo",
+        _n_lunes(anio, 2, 1): "Día de la Constitución",
+        _n_lunes(anio, 3, 3): "Natalicio de Benito Juárez",
+        date(anio, 5, 1): "Día del Trabajo",
+        date(anio, 9, 16): "Día de la Independencia",
+        _n_lunes(anio, 11, 3): "Día de la Revolución",
+        date(anio, 12, 25): "Navidad",
+    }
+    if anio >= 2024 and (anio - 2024) % 6 == 0:
+        out[date(anio, 10, 1)] = "Transmisión del Poder Ejecutivo Federal"
+    return out
+
+
+def _a_dias(fechas) -> np.ndarray:
+    """Fechas (``date``, ``datetime64`` o Series de pandas) -> días desde 1970 (int64)."""
+    if hasattr(fechas, "to_numpy"):
+        fechas = fechas.to_numpy()
+    arr = np.asarray(fechas)
+    if arr.dtype == object:
+        return np.fromiter((f.toordinal() - _EPOCA for f in arr), dtype=np.int64, count=len(arr))
+    return arr.astype("datetime64[D]").astype(np.int64)
+
+
+class Calendarios:
+    """``cargar_festivos()`` -> ``[(fecha, planta, nombre)]``; ``version_festivos()`` -> int."""
+
+    def __init__(self, cargar_festivos, version_festivos=None, semanas: dict = None):
+        self._cargar = cargar_festivos
+        self._version_fn = version_festivos
+        self.semanas = semanas or SEMANAS_LABORALES
+        self._lock = threading.Lock()
+        self._version = None
+        self._revisado = 0.0
+        self._tabla = {}         # planta (None = todas) -> {fecha: nombre}
+        self._bits = {}          # (máscara, planta, año) -> (bits, acumulado)
+        self._cargado = False
+
+    # ---------- Festivos ----------
+    def invalidar(self):
+        with self._lock:
+            self._revisado = 0.0
+            self._version = None
+
+    def _vigente(self):
+        ahora = time.monotonic()
+        if self._cargado and ahora - self._revisado < FESTIVOS_TTL_S:
+            return
+        version = self._version_fn() if self._version_fn else 0
+        with self._lock:
+            self._revisado = ahora
+            if self._cargado and version == self._version:
+                return
+            tabla = {}
+            for fecha, planta, nombre in self._cargar():
+                tabla.setdefault(planta or None, {})[fecha] = nombre
+            self._tabla, self._bits = tabla, {}
+            self._version, self._cargado = version, True
+
+    def mascara(self, planta=None, turno=None) -> str:
+        s = self.semanas
+        return s.get(f"{planta}/{turno}") or s.get(planta or "") or s["*"]
+
+    def festivos(self, planta, anio: int) -> dict:
+        self._vigente()
+        out = dict(festivos_oficiales(anio)) if FESTIVOS_OFICIALES else {}
+        for p in (None, planta) if planta else (None,):
+            out.update({f: n for f, n in self._tabla.get(p, {}).items() if f.year == anio})
+        return out
+
+    # ---------- Mapas de bits ----------
+    def _anio(self, mascara: str, planta, anio: int):
+        clave = (mascara, planta, anio)
+        hit = self._bits.get(clave)
+        if hit is not None:
+            return hit
+        ini = date(anio, 1, 1)
+        n = (date(anio + 1, 1, 1) - ini).days
+        semana = np.array([c == "1" for c in mascara], dtype=bool)
+        bits = semana[(np.arange(n) + ini.weekday()) % 7]
+        for f in self.festivos(planta, anio):
+            bits[(f - ini).days] = False
+        hit = self._bits[clave] = (bits, np.concatenate(([0], np.cumsum(bits, dtype=np.int32))))
+        return hit
+
+    def _acumulado(self, mascara: str, planta, a0: int, a1: int):
+        """Suma acumulada continua de ``a0``-01-01 a ``a1``-12-31; devuelve ``(día base, acumulado)``."""
+        partes, offset = [np.zeros(1, dtype=np.int64)], 0
+        for anio in range(a0, a1 + 1):
+            bits, acum = self._anio(mascara, planta, anio)
+            partes.append(acum[1:].astype(np.int64) + offset)
+            offset += int(acum[-1])
+        return date(a0, 1, 1).toordinal() - _EPOCA, np.concatenate(partes)
+
+    # ---------- Conteo ----------
+    def _contar(self, mascara: str, planta, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        a0 = date.fromordinal(int(a.min()) + _EPOCA).year
+        a1 = date.fromordinal(int(b.max()) + _EPOCA).year
+        base, acum = self._acumulado(mascara, planta, a0, a1)
+        return acum[b - base + 1] - acum[a - base]
+
+    def contar(self, planta, turno, inicios, finales) -> np.ndarray:
+        """Días hábiles de cada periodo ``[inicio, final]`` (ambos incluidos) de una planta/turno."""
+        self._vigente()
+        a, b = _a_dias(inicios), _a_dias(finales)
+        if not len(a):
+            return np.zeros(0, dtype=np.int64)
+        return self._contar(self.mascara(planta, turno), planta, a, b)
+
+    def contar_uno(self, planta, turno, fi: date, ff: date) -> int:
+        return int(self.contar(planta, turno, [fi], [ff])[0])
+
+    def contar_filas(self, plantas, turnos, inicios, finales) -> np.ndarray:
+        """Como ``contar`` pero cada periodo con su propia planta/turno (una pasada por calendario)."""
+        self._vigente()
+        a, b = _a_dias(inicios), _a_dias(finales)
+        grupos = {}
+        for i, (p, t) in enumerate(zip(plantas, turnos)):
+            grupos.setdefault((self.mascara(p, t), p), []).append(i)
+        out = np.zeros(len(a), dtype=np.int64)
+        for (mascara, planta), idx in grupos.items():
+            idx = np.asarray(idx)
+            out[idx] = self._contar(mascara, planta, a[idx], b[idx])
+        return out
+
+    def laborables(self, planta, turno, start: date, end: date) -> np.ndarray:
+        """Arreglo booleano día a día de ``start`` a ``end``."""
+        self._vigente()
+        base, acum = self._acumulado(self.mascara(planta, turno), planta, start.year, end.year)
+        i0 = start.toordinal() - _EPOCA - base
+        i1 = end.toordinal() - _EPOCA - base
+        return np.diff(acum[i0:i1 + 2]).astype(bool)
+
+
+# ---------- Integración con la BD ----------
+def cargador(engine):
+    """Funciones ``(cargar_festivos, version_festivos)`` para ``Calendarios`` sobre ``engine``."""
+    from sqlalchemy import select
+    from models import DiaFestivo
+    from cache_calendario import data_version
+
+    def cargar():
+        with engine.connect() as conn:
+            return conn.execute(select(DiaFestivo.fecha, DiaFestivo.planta, DiaFestivo.nombre)).all()
+
+    def version():
+        with engine.connect() as conn:
+            return data_version(conn, FESTIVOS_KEY)
+    return cargar, version
+
+
+def rellenar_gozo(engine, calendarios: Calendarios, bloque: int = 20000) -> int:
+    """Calcula ``gozo`` (días hábiles) de las vacaciones que no lo tienen."""
+    from sqlalchemy import bindparam, select, update
+    from models import Empleado, Vacacion
+    stmt = update(Vacacion).where(Vacacion.id == bindparam("vid")).values(gozo=bindparam("dias"))
+    n, ultimo = 0, 0
+    while True:
+        with engine.begin() as conn:
+            filas = conn.execute(
+                select(Vacacion.id, Vacacion.fecha_inicial, Vacacion.fecha_final, Empleado.planta, Empleado.turno)
+                .join(Empleado, Vacacion.empleado_id == Empleado.id)
+                .where(Vacacion.gozo.is_(None), Vacacion.id > ultimo)
+                .order_by(Vacacion.id).limit(bloque)).all()
+            if not filas:
+                return n
+            ids, fis, ffs, plantas, turnos = zip(*filas)
+            dias = calendarios.contar_filas(plantas, turnos, list(fis), list(ffs))
+            conn.execute(stmt, [{"vid": i, "dias": float(d)} for i, d in zip(ids, dias)])
+            n += len(filas)
+            ultimo = ids[-1]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Calendario de días hábiles")
+    ap.add_argument("--rellenar-gozo", action="store_true",
+                    help="calcula gozo de vacaciones sin capturar y reconstruye saldos")
+    args = ap.parse_args(argv)
+    if not args.rellenar_gozo:
+        ap.print_help()
+        return 1
+    from models import engine, init_db
+    from cache_calendario import bump_version
+    import bitacora
+    import saldos
+    init_db()
+    n = rellenar_gozo(engine, Calendarios(*cargador(engine)))
+    with engine.begin() as conn:
+        saldos.reconstruir(conn)
+        bitacora.reiniciar(conn, bump_version(conn))
+    print(f"gozo calculado en {n} vacaciones; saldos reconstruidos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Archivos de ``web/`` servidos desde memoria con huella, precomprimidos y cacheables.
+
+Al arrancar se lee cada archivo una vez y se calcula su huella (sha1 del
+contenido): ``js/calendar.js`` queda disponible también como
+``js/calendar.<huella>.js``. En ``index.html``/``admin.html`` se reescriben las
+referencias ``src``/``href`` a esas URLs con huella, que se sirven con
+``Cache-Control: immutable`` (un cambio de contenido cambia la URL). El HTML y las
+rutas sin huella van con ETag y ``no-cache``: el navegador revalida y recibe 304.
+
+Los tipos de texto se guardan además en gzip (y brotli si está instalado) para no
+comprimir por petición. ``ASSETS_RELOAD=1`` vuelve a leer ``web/`` cuando cambia
+algún archivo (desarrollo).
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from codificacion import brotli, negociar
+
+ASSETS_RELOAD = os.getenv("ASSETS_RELOAD", "0") == "1"
+ASSET_MAX_BYTES = int(os.getenv("ASSET_MAX_BYTES", str(4 * 1024 * 1024)))
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+HTML = ("index.html", "admin.html")
+EXCLUIR = ("docker",)      # no se sirven ni desde memoria ni desde disco
+COMPRIMIBLES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+_REF = re.compile(r'''\b(src|href)=(["'])([^"']+)\2''')
+
+
+class Activo:
+    __slots__ = ("ruta", "mime", "etag", "variantes")
+
+    def __init__(self, ruta: str, contenido: bytes):
+        self.ruta = ruta
+        self.mime = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+        self.etag = hashlib.sha1(contenido).hexdigest()[:16]
+        self.variantes = {None: contenido}
+        if self.mime.startswith(COMPRIMIBLES) and len(contenido) >= 512:
+            gz = gzip.compress(contenido, compresslevel=9, mtime=0)
+            if len(gz) < len(contenido):
+                self.variantes["gzip"] = gz
+            if brotli is not None:
+                br = brotli.compress(contenido, quality=11)
+                if len(br) < len(contenido):
+                    self.variantes["br"] = br
+
+    def variante(self, accept_encoding: str):
+        """``(cuerpo, codificación)`` según lo que acepta el cliente."""
+        enc = negociar(accept_encoding)
+        if enc not in self.variantes:
+            enc = None
+        return self.variantes[enc], enc
+
+
+def _con_huella(ruta: str, huella: str) -> str:
+    base, ext = os.path.splitext(ruta)
+    return f"{base}.{huella}{ext}"
+
+
+class Activos:
+    """Índice ``ruta -> Activo`` y ``ruta_con_huella -> Activo`` de un directorio."""
+
+    def __init__(self, raiz: str):
+        self.raiz = raiz
+        self._lock = threading.Lock()
+        self._firma = None
+        self.cargar()
+
+    def _recorrer(self):
+        for dirpath, dirnames, filenames in os.walk(self.raiz):
+            rel_dir = os.path.relpath(dirpath, self.raiz)
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")
+                           and not (rel_dir == "." and d in EXCLUIR)]
+            for nombre in filenames:
+                if nombre.startswith("."):
+                    continue
+                ruta = os.path.normpath(os.path.join(rel_dir, nombre)).replace(os.sep, "/")
+                yield ruta, os.path.join(dirpath, nombre)
+
+    def _firma_actual(self):
+        return tuple(sorted((r, os.stat(p).st_mtime_ns) for r, p in self._recorrer()))
+
+    def cargar(self):
+        por_ruta, por_huella, urls = {}, {}, {}
+        for ruta, path in self._recorrer():
+            if ruta in HTML or os.path.getsize(path) > ASSET_MAX_BYTES:
+                continue
+            with open(path, "rb") as f:
+                a = Activo(ruta, f.read())
+            por_ruta[ruta] = a
+            huella = _con_huella(ruta, a.etag[:10])
+            por_huella[huella] = a
+            urls[ruta] = "/" + huella
+        for ruta in HTML:
+            path = os.path.join(self.raiz, ruta)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    html = self._reescribir(f.read(), urls)
+                por_ruta[ruta] = Activo(ruta, html.encode("utf-8"))
+        with self._lock:
+            self.por_ruta, self.por_huella, self.urls = por_ruta, por_huella, urls
+            self._firma = self._firma_actual() if ASSETS_RELOAD else None
+
+    @staticmethod
+    def _reescribir(html: str, urls: dict) -> str:
+        def sustituir(m):
+            ref = m.group(3)
+            if "://" in ref or ref.startswith(("#", "data:", "//")):
+                return m.group(0)
+            ruta = ref.split("?", 1)[0].split("#", 1)[0].lstrip("/")
+            url = urls.get(os.path.normpath(ruta).replace(os.sep, "/")) if ruta else None
+            return f"{m.group(1)}={m.group(2)}{url}{m.group(2)}" if url else m.group(0)
+        return _REF.sub(sustituir, html)
+
+    def buscar(self, ruta: str):
+        """``(Activo, inmutable)`` o ``(None, False)`` si no está en memoria."""
+        if ASSETS_RELOAD and self._firma_actual() != self._firma:
+            self.cargar()
+        a = self.por_huella.get(ruta)
+        if a is not None:
+            return a, True
+        return self.por_ruta.get(ruta), False
+
+    def stats(self) -> dict:
+        return {"archivos": len(self.por_ruta),
+                "bytes": sum(len(v) for a in self.por_ruta.values() for v in a.variantes.values())}
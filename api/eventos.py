@@ -0,0 +1,236 @@
+"""Feed de cambios del calendario por Server-Sent Events, en un proceso aparte.
+
+    cd api && python eventos.py            # escucha en SSE_PORT (o PORT)
+
+Con el worker gthread de gunicorn cada conexión SSE abierta ocupa un hilo durante
+toda su vida, así que unos cuantos tableros dejan sin hilos a la API. Este
+proceso atiende todos los feeds con un solo bucle asyncio: un suscriptor inactivo
+es una corrutina esperando un ``asyncio.Event`` (unos KB de memoria, sin hilo ni
+conexión de BD), y cientos o miles de tableros no le quitan nada a la API.
+``/api/stream/calendario`` en la app solo redirige aquí (``SSE_URL``).
+
+No recibe nada de los workers: mientras haya suscriptores, cada ``SSE_POLL_S``
+lee la versión de datos en la BD (ver ``cache_calendario``) y, si subió, las
+plantas que la bitácora registra para cada versión nueva. Una versión sin
+entradas en la bitácora (festivos, importación que la reinicia...) vale como
+"todo". La versión es el ``id`` del evento, así que ``Last-Event-ID`` sirve para
+reanudar sin perder cambios.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+SSE_HOST = os.getenv("SSE_HOST", "0.0.0.0")
+SSE_PORT = int(os.getenv("SSE_PORT") or os.getenv("PORT") or "5001")
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", "20"))
+SSE_POLL_S = float(os.getenv("SSE_POLL_S", "2"))
+SSE_MAX_S = float(os.getenv("SSE_MAX_S", "300"))
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "2000"))
+SSE_RETRY_MS = 3000
+HISTORIAL = 512
+RUTA = "/api/stream/calendario"
+ENCABEZADOS_MAX = 16 * 1024
+
+
+def rango(ini, fin, planta=None) -> dict:
+    """Rango afectado por una escritura; ``None`` en ini/fin/planta significa "sin límite"."""
+    return {"ini": ini.isoformat() if ini else None,
+            "fin": fin.isoformat() if fin else None,
+            "planta": planta}
+
+def afecta(r: dict, start: str, end: str, planta) -> bool:
+    if planta and r.get("planta") and r["planta"] != planta:
+        return False
+    if r.get("ini") and r["ini"] > end:
+        return False
+    if r.get("fin") and r["fin"] < start:
+        return False
+    return True
+
+def evento(version: int, data: dict) -> str:
+    return f"id: {version}\nevent: cambio\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Broker:
+    """Historial de cambios y difusión a los suscriptores; vive en un solo bucle asyncio."""
+
+    def __init__(self):
+        self._eventos = deque(maxlen=HISTORIAL)   # (version, rangos | None)
+        self._nuevo = asyncio.Event()
+        self.version = 0
+        self.clientes = 0
+
+    def publish(self, version: int, rangos=None):
+        """Registra el cambio ``version``; ``rangos=None`` invalida cualquier ventana."""
+        if version <= self.version:
+            return
+        self.version = version
+        self._eventos.append((version, list(rangos) if rangos is not None else None))
+        self._nuevo.set()
+        self._nuevo = asyncio.Event()
+
+    def _pendientes(self, desde: int):
+        return [(v, r) for v, r in self._eventos if v > desde]
+
+    async def stream(self, start: date, end: date, planta=None, last_id: int = None):
+        """Texto SSE para la ventana ``[start, end]`` (y planta opcional)."""
+        s, e = start.isoformat(), end.isoformat()
+        self.clientes += 1
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            visto = self.version if last_id is None else last_id
+            if last_id is not None and last_id < self.version:
+                # Reconexión tras cambios que ya no podemos reconstruir con precisión
+                antiguos = self._pendientes(last_id)
+                if not antiguos or antiguos[0][0] > last_id + 1:
+                    yield evento(self.version, {"version": self.version, "rangos": None})
+                    visto = self.version
+            limite = time.monotonic() + SSE_MAX_S
+            while time.monotonic() < limite:
+                nuevos = self._pendientes(visto)
+                if not nuevos:
+                    espera = self._nuevo
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(espera.wait(),
+                                               min(SSE_HEARTBEAT_S, max(0.0, limite - time.monotonic())))
+                    nuevos = self._pendientes(visto)
+                if not nuevos:
+                    yield ": ping\n\n"
+                    continue
+                visto = nuevos[-1][0]
+                relevantes = []
+                todo = False
+                for _, rangos in nuevos:
+                    if rangos is None:
+                        todo = True
+                    else:
+                        relevantes.extend(r for r in rangos if afecta(r, s, e, planta))
+                if todo or relevantes:
+                    yield evento(visto, {"version": visto, "rangos": None if todo else relevantes})
+                else:
+                    # Solo avanza Last-Event-ID del cliente (sin disparar evento)
+                    yield f"id: {visto}\n\n"
+        finally:
+            self.clientes -= 1
+
+
+# ---------- Sondeo de la BD ----------
+def leer_cambios(engine, desde: int) -> list:
+    """``[(version, rangos | None)]`` confirmados después de ``desde`` (bloqueante)."""
+    from sqlalchemy import select
+    from models import Cambio
+    from cache_calendario import data_version
+    with engine.connect() as conn:
+        actual = data_version(conn)
+        if actual <= desde:
+            return []
+        if not desde or actual - desde > HISTORIAL:
+            return [(actual, None)]
+        plantas = {}
+        for v, p in conn.execute(select(Cambio.version, Cambio.planta)
+                                 .where(Cambio.version > desde, Cambio.version <= actual).distinct()):
+            plantas.setdefault(v, set()).add(p)
+    return [(v, [rango(None, None, p) for p in sorted(plantas[v], key=str)] if v in plantas else None)
+            for v in range(desde + 1, actual + 1)]
+
+async def sondear(broker: Broker, engine):
+    loop = asyncio.get_running_loop()
+    while True:
+        if broker.clientes or not broker.version:
+            try:
+                for v, rangos in await loop.run_in_executor(None, leer_cambios, engine, broker.version):
+                    broker.publish(v, rangos)
+            except Exception as e:
+                print(f"eventos: no se pudo leer la versión ({type(e).__name__}: {e})", file=sys.stderr)
+        await asyncio.sleep(SSE_POLL_S)
+
+
+# ---------- HTTP ----------
+def _fecha(valores):
+    s = (valores or [""])[0].strip()
+    return date.fromisoformat(s[:10]) if s else None
+
+async def _responder(writer, codigo: int, cuerpo: dict):
+    datos = json.dumps(cuerpo).encode("utf-8")
+    estado = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}[codigo]
+    writer.write(f"HTTP/1.1 {codigo} {estado}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(datos)}\r\nAccess-Control-Allow-Origin: *\r\n"
+                 f"Connection: close\r\n\r\n".encode("latin-1") + datos)
+    await writer.drain()
+
+async def atender(broker: Broker, reader, writer):
+    try:
+        try:
+            cabecera = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            lineas = cabecera.decode("latin-1").split("\r\n")
+            metodo, objetivo, _ = lineas[0].split(" ", 2)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            return
+        encabezados = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lineas[1:] if l)}
+        url = urlsplit(objetivo)
+        if metodo != "GET" or url.path not in (RUTA, "/health"):
+            return await _responder(writer, 404, {"ok": False, "error": "No encontrado"})
+        if url.path == "/health":
+            return await _responder(writer, 200, {"ok": True, "clientes": broker.clientes,
+                                                  "version": broker.version})
+
+        args = parse_qs(url.query)
+        try:
+            start = _fecha(args.get("start")) or date.today()
+            end = _fecha(args.get("end")) or (start + timedelta(days=13))
+        except ValueError:
+            return await _responder(writer, 400, {"ok": False, "error": "Parámetros de fecha inválidos"})
+        if end < start:
+            return await _responder(writer, 400, {"ok": False, "error": "end no puede ser menor que start"})
+        if broker.clientes >= SSE_MAX_CLIENTS:
+            return await _responder(writer, 503, {"ok": False, "error": "Demasiados suscriptores, reintenta más tarde"})
+        planta = (args.get("planta") or [""])[0]
+        last_id = encabezados.get("last-event-id") or (args.get("last_id") or [""])[0]
+        last_id = int(last_id) if last_id.isdigit() else None
+
+        from normalizacion import normalize_planta
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"X-Accel-Buffering: no\r\nAccess-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n")
+
+        async def enviar():
+            async with contextlib.aclosing(broker.stream(start, end, normalize_planta(planta) if planta else None,
+                                                         last_id=last_id)) as trozos:
+                async for trozo in trozos:
+                    writer.write(trozo.encode("utf-8"))
+                    await writer.drain()
+
+        # El cliente no manda nada más: si la lectura termina, cerró y se libera ya (no en el próximo ping)
+        tareas = {asyncio.ensure_future(enviar()), asyncio.ensure_future(reader.read(1))}
+        hechas, pendientes = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+        for t in pendientes:
+            t.cancel()
+        await asyncio.gather(*pendientes, return_exceptions=True)
+        for t in hechas:
+            error = t.exception()
+            if error is not None and not isinstance(error, ConnectionError):
+                raise error
+    except ConnectionError:
+        pass   # el tablero cerró la conexión
+    finally:
+        writer.close()
+
+
+async def servir(host: str = SSE_HOST, port: int = SSE_PORT):
+    from models import engine
+    broker = Broker()
+    servidor = await asyncio.start_server(lambda r, w: atender(broker, r, w), host, port, limit=ENCABEZADOS_MAX)
+    print(f"eventos: escuchando en {host}:{port}{RUTA}", file=sys.stderr)
+    async with servidor:
+        await asyncio.gather(servidor.serve_forever(), sondear(broker, engine))
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    asyncio.run(servir())
@@ -0,0 +1,156 @@
+"""Generador de datos sintéticos a escala de producción (SQLite o Postgres).
+
+Crea empleados repartidos en plantas/turnos/áreas con nombres realistas y, por
+empleado, una secuencia de vacaciones sin traslapes (la siguiente empieza después
+de que termina la anterior) con largos sesgados a periodos cortos. Inserta en
+bloques con ``INSERT`` masivo, sin pasar por objetos ORM.
+
+Uso (sobre una base de pruebas, nunca la de producción)::
+
+    DATABASE_URL=sqlite:////tmp/bench.db python generador.py --empleados 50000 --vacaciones 1000000
+
+``--reset`` borra empleados/vacaciones antes de generar.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, select, text
+
+from cache_calendario import bump_version
+from models import Empleado, Vacacion
+from normalizacion import clave_busqueda, derive_nombre_corto
+import saldos
+import bitacora
+
+BLOQUE = 20000
+
+APELLIDOS = (
+    "Hernández", "García", "Martínez", "López", "González", "Pérez", "Rodríguez", "Sánchez",
+    "Ramírez", "Cruz", "Flores", "Gómez", "Morales", "Vázquez", "Reyes", "Jiménez", "Torres",
+    "Díaz", "Gutiérrez", "Ruiz", "Mendoza", "Aguilar", "Ortiz", "Moreno", "Castillo", "Romero",
+    "Álvarez", "Méndez", "Chávez", "Rivera", "Juárez", "Ramos", "Domínguez", "Herrera", "Medina",
+    "Castro", "Vargas", "Guzmán", "Velázquez", "Muñoz", "Rojas", "Contreras", "Salazar", "Luna",
+    "Ortega", "Santiago", "Guerrero", "Estrada", "Bautista", "Cortés", "Soto", "Alvarado", "Espinoza",
+    "Valdez", "Núñez", "Ibarra", "Peña", "Acosta", "Navarro", "Sandoval", "Campos", "Cervantes",
+)
+NOMBRES = (
+    "José", "Juan", "Luis", "Carlos", "Jorge", "Miguel", "Francisco", "Alejandro", "Jesús",
+    "Roberto", "Fernando", "Ricardo", "Eduardo", "Andrés", "Raúl", "Óscar", "Sergio", "Arturo",
+    "María", "Guadalupe", "Ana", "Rosa", "Patricia", "Laura", "Leticia", "Verónica", "Sofía",
+    "Alejandra", "Gabriela", "Claudia", "Mónica", "Adriana", "Elena", "Lucía", "Daniela", "Fernanda",
+)
+PLANTAS = (("Planta 1", 0.6), ("Planta 3", 0.4))
+TURNOS = (("T1", 0.45), ("T2", 0.35), ("T3", 0.2))
+AREAS = ("Ensamble", "Soldadura", "Pintura", "Calidad", "Mantenimiento", "Almacén", "Logística",
+         "Estampado", "Maquinado", "Inyección", "Producción", "Administración")
+# Largo en días naturales: mayoría de 1-3 días, semanas completas y algún periodo largo
+LARGOS = ((1, 0.30), (2, 0.15), (3, 0.12), (5, 0.13), (7, 0.15), (10, 0.07), (14, 0.06), (21, 0.02))
+TIPOS = (("Gozo de Vacaciones", 0.9), ("Permiso", 0.07), ("Incapacidad", 0.03))
+
+
+def _elegir(rnd, opciones):
+    valores, pesos = zip(*opciones)
+    return rnd.choices(valores, pesos)[0]
+
+def _nombre(rnd) -> str:
+    ap = f"{rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+    no = rnd.choice(NOMBRES) if rnd.random() < 0.6 else f"{rnd.choice(NOMBRES)} {rnd.choice(NOMBRES)}"
+    return f"{ap}, {no}"
+
+
+def empleados(n: int, rnd, numero_base: int = 100000):
+    """Filas para ``insert(Empleado)``; ~2% inactivos."""
+    for i in range(n):
+        nombre = _nombre(rnd)
+        yield {"numero_emp": str(numero_base + i), "nombre": nombre,
+               "nombre_busqueda": clave_busqueda(nombre), "nombre_corto": derive_nombre_corto(nombre),
+               "planta": _elegir(rnd, PLANTAS), "turno": _elegir(rnd, TURNOS),
+               "area": rnd.choice(AREAS), "foto_url": None, "activo": rnd.random() >= 0.02}
+
+def vacaciones(emp_ids, por_empleado: float, desde: date, hasta: date, rnd):
+    """Filas para ``insert(Vacacion)``: por empleado, periodos sin traslape entre ``desde`` y ``hasta``."""
+    dias = (hasta - desde).days
+    for emp_id in emp_ids:
+        n = max(0, int(rnd.gauss(por_empleado, por_empleado * 0.25) + 0.5))
+        if not n:
+            continue
+        # Hueco medio para que n periodos quepan en el horizonte
+        hueco = max(1, dias // n - 6)
+        d = desde + timedelta(days=rnd.randint(0, hueco))
+        for _ in range(n):
+            largo = _elegir(rnd, LARGOS)
+            fin = d + timedelta(days=largo - 1)
+            if fin > hasta:
+                break
+            yield {"empleado_id": emp_id, "fecha_inicial": d, "fecha_final": fin,
+                   "tipo": _elegir(rnd, TIPOS), "gozo": largo, "fuente": "generador"}
+            d = fin + timedelta(days=1 + rnd.randint(max(1, hueco // 2), hueco + hueco // 2))
+
+
+def _insertar(conn, tabla, filas) -> int:
+    n, bloque = 0, []
+    for f in filas:
+        bloque.append(f)
+        if len(bloque) >= BLOQUE:
+            conn.execute(insert(tabla), bloque); n += len(bloque); bloque = []
+    if bloque:
+        conn.execute(insert(tabla), bloque); n += len(bloque)
+    return n
+
+def generar(engine, n_emp: int, n_vac: int, anios: int = 4, semilla: int = 7, reset: bool = False,
+            hoy: date = None) -> dict:
+    """Genera ``n_emp`` empleados y ~``n_vac`` vacaciones en ``anios`` años alrededor de ``hoy``.
+
+    Si ya hay empleados y no se pide ``reset``, no hace nada.
+    """
+    rnd = random.Random(semilla)
+    hoy = hoy or date.today()
+    desde = date(hoy.year - anios + 1, 1, 1)
+    hasta = date(hoy.year + 1, 12, 31)
+    with engine.begin() as conn:
+        if reset:
+            conn.execute(delete(Vacacion))
+            conn.execute(delete(Empleado))
+        elif conn.execute(select(func.count()).select_from(Empleado)).scalar():
+            return {"empleados": 0, "vacaciones": 0}
+        t0 = time.perf_counter()
+        n_e = _insertar(conn, Empleado, empleados(n_emp, rnd))
+        ids = conn.execute(select(Empleado.id).order_by(Empleado.id)).scalars().all()
+        n_v = _insertar(conn, Vacacion, vacaciones(ids, n_vac / max(n_emp, 1), desde, hasta, rnd))
+        saldos.reconstruir(conn)
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE empleados"))
+            conn.execute(text("ANALYZE vacaciones"))
+        else:
+            conn.execute(text("ANALYZE"))
+        version = bump_version(conn)   # invalida cachés de procesos que ya estén corriendo
+        bitacora.reiniciar(conn, version)
+    return {"empleados": n_e, "vacaciones": n_v, "segundos": round(time.perf_counter() - t0, 1),
+            "desde": desde.isoformat(), "hasta": hasta.isoformat()}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--empleados", type=int, default=50000)
+    ap.add_argument("--vacaciones", type=int, default=1000000, help="total aproximado")
+    ap.add_argument("--anios", type=int, default=4, help="años de historia (más el siguiente)")
+    ap.add_argument("--semilla", type=int, default=7)
+    ap.add_argument("--reset", action="store_true", help="borra empleados y vacaciones antes")
+    args = ap.parse_args(argv)
+
+    from models import engine, init_db
+    init_db()
+    res = generar(engine, args.empleados, args.vacaciones, args.anios, args.semilla, args.reset)
+    if not res["empleados"]:
+        print("La base ya tiene empleados; usa --reset para regenerar")
+        return 1
+    print(f"{res['empleados']} empleados, {res['vacaciones']} vacaciones "
+          f"({res['desde']} a {res['hasta']}) en {res['segundos']} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
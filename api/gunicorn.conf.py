@@ -0,0 +1,31 @@
+"""Configuración de gunicorn: ``cd api && gunicorn -c gunicorn.conf.py``.
+
+La app se precarga en el maestro (``preload_app``): los imports, ``init_db`` y la
+detección de capacidades de la BD corren una sola vez y los workers los heredan
+por fork, así que reiniciar un worker cuesta solo el fork. Lo que no sobrevive
+al fork se rehace en cada worker: en ``post_fork`` se descartan las conexiones
+del pool (sin cerrarlas, siguen siendo del maestro) y en ``post_worker_init``, ya
+con la app cargada (y la BD preparada), arrancan sus propios hilos.
+
+``GUNICORN_PRELOAD=0`` vuelve a cargar la app en cada worker.
+"""
+import os
+
+wsgi_app = "app:create_app(servicios=False)"
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def post_fork(server, worker):
+    from models import engine
+    engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Sin precarga la app se importa en el worker justo antes de este hook
+    import app
+    app.iniciar_servicios()
@@ -0,0 +1,426 @@
+"""Importación masiva de vacaciones desde CSV/XLSX.
+
+El archivo se lee por bloques (nunca se carga completo), las columnas se
+normalizan en bloque, los empleados se insertan/actualizan en lote por
+``numero_emp`` y los traslapes se validan con una sola consulta por bloque.
+Las filas sin ``gozo`` lo reciben en días hábiles si se pasa ``habiles``; las que
+excederían una regla de capacidad se rechazan con su error en el reporte.
+"""
+import io
+import os
+import re
+import unicodedata
+
+import pandas as pd
+from sqlalchemy import select, insert, update
+
+from models import Empleado, Vacacion
+import saldos
+import bitacora
+import capacidad
+from normalizacion import normalize_planta, canonicalize_nombre, derive_nombre_corto, clave_busqueda
+
+CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+# Límite de parámetros por sentencia IN (SQLite permite 32766; dejamos margen)
+IN_CHUNK = 5000
+
+# Alias aceptados por columna (encabezados ya normalizados con _norm_header)
+COLUMN_ALIASES = {
+    "numero_emp": ("numero_emp", "numero", "num_emp", "no_emp", "no_empleado", "numero_empleado",
+                   "num_empleado", "nomina", "no_nomina", "empleado", "id_empleado"),
+    "nombre": ("nombre", "nombre_completo", "nombre_empleado", "empleado_nombre"),
+    "apellidos": ("apellidos", "apellido"),
+    "nombres": ("nombres",),
+    "nombre_corto": ("nombre_corto",),
+    "planta": ("planta", "plant"),
+    "turno": ("turno", "shift"),
+    "area": ("area", "departamento", "depto"),
+    "foto_url": ("foto_url", "foto"),
+    "fecha_inicial": ("fecha_inicial", "fecha_inicio", "inicio", "desde", "fecha_desde", "fi"),
+    "fecha_final": ("fecha_final", "fecha_fin", "fin", "hasta", "fecha_hasta", "ff"),
+    "tipo": ("tipo", "tipo_ausencia", "concepto"),
+    "gozo": ("gozo", "dias", "dias_gozo"),
+}
+REQUIRED = ("numero_emp", "fecha_inicial", "fecha_final")
+
+
+class ImportacionError(ValueError):
+    """Error del archivo completo (formato, encabezados, tamaño)."""
+
+
+# ---------- Lectura por bloques ----------
+def _norm_header(h) -> str:
+    s = unicodedata.normalize("NFKD", str(h or "")).encode("ascii", "ignore").decode()
+    s = re.sub(r"[^a-z0-9]+", "_", s.strip().lower())
+    return s.strip("_")
+
+def _map_columns(headers):
+    """Devuelve {columna_canónica: índice} a partir de los encabezados del archivo."""
+    normed = [_norm_header(h) for h in headers]
+    out = {}
+    for canon, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normed:
+                out[canon] = normed.index(alias)
+                break
+    faltan = [c for c in REQUIRED if c not in out]
+    if faltan:
+        raise ImportacionError(f"Columnas requeridas no encontradas: {', '.join(faltan)}")
+    if "nombre" not in out and "apellidos" not in out and "nombres" not in out:
+        raise ImportacionError("Se requiere columna nombre (o apellidos+nombres)")
+    return out
+
+def _sniff_csv(stream):
+    """Detecta codificación y separador mirando solo el inicio del archivo."""
+    head = stream.read(64 * 1024)
+    stream.seek(0)
+    try:
+        # Se recortan bytes finales por si se partió un carácter multibyte
+        head[:-4].decode("utf-8")
+        enc = "utf-8-sig"
+    except UnicodeDecodeError:
+        enc = "latin-1"
+    first = head.split(b"\n", 1)[0].decode(enc, "ignore")
+    sep = max((",", ";", "\t", "|"), key=first.count)
+    return enc, sep
+
+def _iter_csv(stream):
+    enc, sep = _sniff_csv(stream)
+    cols = None
+    try:
+        reader = pd.read_csv(stream, dtype=str, keep_default_na=False, encoding=enc,
+                             sep=sep, chunksize=CHUNK_ROWS)
+        for df in reader:
+            if cols is None:
+                cols = _map_columns(df.columns)
+            yield _select_columns(df.to_numpy(dtype=object), cols)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise ImportacionError(f"CSV inválido: {str(e).strip()}")
+
+def _iter_xlsx(stream):
+    from openpyxl import load_workbook
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        cols = _map_columns(header)
+        buf = []
+        for r in rows:
+            if r is None or all(v is None or v == "" for v in r):
+                continue
+            buf.append(r)
+            if len(buf) >= CHUNK_ROWS:
+                yield _select_columns(buf, cols)
+                buf = []
+        if buf:
+            yield _select_columns(buf, cols)
+    finally:
+        wb.close()
+
+def _iter_xls(stream):
+    # Formato binario antiguo: requiere xlrd y no admite lectura incremental
+    try:
+        df = pd.read_excel(stream, dtype=object)
+    except ImportError:
+        raise ImportacionError("Formato .xls no soportado en este servidor; guarda como .xlsx o .csv")
+    cols = _map_columns(df.columns)
+    data = df.to_numpy(dtype=object)
+    for i in range(0, len(data), CHUNK_ROWS):
+        yield _select_columns(data[i:i + CHUNK_ROWS], cols)
+
+def _select_columns(rows, cols):
+    width = max(cols.values()) + 1
+    norm = [tuple(r) + (None,) * (width - len(r)) if len(r) < width else r for r in rows]
+    return pd.DataFrame({c: [r[i] for r in norm] for c, i in cols.items()})
+
+def iter_chunks(stream, ext: str):
+    """Genera DataFrames de hasta CHUNK_ROWS filas con columnas canónicas."""
+    if ext == ".csv":
+        return _iter_csv(stream)
+    if ext == ".xlsx":
+        return _iter_xlsx(stream)
+    if ext == ".xls":
+        return _iter_xls(stream)
+    raise ImportacionError(f"Extensión no soportada: {ext}")
+
+
+# ---------- Normalización vectorizada ----------
+def _text(s: pd.Series) -> pd.Series:
+    return s.map(lambda v: "" if v is None or (isinstance(v, float) and pd.isna(v)) else str(v)) \
+            .str.replace(r"\s+", " ", regex=True).str.strip()
+
+def _numero(s: pd.Series) -> pd.Series:
+    # Excel entrega números como float (119397.0)
+    return _text(s).str.replace(r"\.0$", "", regex=True)
+
+def _fechas(s: pd.Series) -> pd.Series:
+    iso = pd.to_datetime(s, errors="coerce", format="ISO8601")
+    falt = iso.isna() & s.notna()
+    if falt.any():
+        iso[falt] = pd.to_datetime(_text(s[falt]), errors="coerce", dayfirst=True)
+    return iso.dt.normalize()
+
+def _map_unique(s: pd.Series, fn) -> pd.Series:
+    """Aplica ``fn`` una vez por valor distinto (los exports repiten mucho)."""
+    uniq = pd.unique(s)
+    return s.map(dict(zip(uniq, (fn(u) for u in uniq))))
+
+def normalizar_bloque(df: pd.DataFrame) -> pd.DataFrame:
+    """Normaliza un bloque y agrega la columna ``error`` (None si la fila es válida)."""
+    out = pd.DataFrame(index=df.index)
+    out["numero_emp"] = _numero(df["numero_emp"])
+
+    if "apellidos" in df or "nombres" in df:
+        ap = _text(df["apellidos"]) if "apellidos" in df else pd.Series("", index=df.index)
+        no = _text(df["nombres"]) if "nombres" in df else pd.Series("", index=df.index)
+        pares = pd.Series(list(zip(ap, no)), index=df.index)
+        nombre = _map_unique(pares, lambda p: canonicalize_nombre(None, p[0], p[1]))
+        if "nombre" in df:
+            sin = nombre == ""
+            nombre[sin] = _map_unique(_text(df.loc[sin, "nombre"]), canonicalize_nombre)
+    else:
+        nombre = _map_unique(_text(df["nombre"]), canonicalize_nombre)
+    out["nombre"] = nombre
+    out["nombre_busqueda"] = _map_unique(nombre, clave_busqueda)
+
+    corto = _text(df["nombre_corto"]) if "nombre_corto" in df else pd.Series("", index=df.index)
+    sin = corto == ""
+    corto[sin] = _map_unique(out.loc[sin, "nombre"], derive_nombre_corto)
+    out["nombre_corto"] = corto
+
+    for col in ("planta", "turno", "area", "foto_url"):
+        out[col] = _text(df[col]).replace("", None) if col in df else None
+    if "planta" in df:
+        out["planta"] = _map_unique(out["planta"], lambda v: normalize_planta(v) if v else None)
+
+    out["fecha_inicial"] = _fechas(df["fecha_inicial"])
+    out["fecha_final"] = _fechas(df["fecha_final"])
+    out["tipo"] = _text(df["tipo"]).replace("", "Gozo de Vacaciones") if "tipo" in df else "Gozo de Vacaciones"
+    out["gozo"] = pd.to_numeric(df["gozo"], errors="coerce") if "gozo" in df else float("nan")
+
+    err = pd.Series(None, index=df.index, dtype=object)
+    err[out["fecha_final"] < out["fecha_inicial"]] = "fecha_final no puede ser menor que fecha_inicial"
+    err[out["fecha_final"].isna()] = "fecha_final inválida"
+    err[out["fecha_inicial"].isna()] = "fecha_inicial inválida"
+    err[out["nombre"] == ""] = "nombre requerido"
+    err[out["numero_emp"] == ""] = "numero_emp requerido"
+    out["error"] = err
+    return out
+
+
+# ---------- Escritura en lote ----------
+def _chunks(seq, n=IN_CHUNK):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def upsert_empleados(db, df: pd.DataFrame) -> dict:
+    """Inserta/actualiza empleados por numero_emp.
+
+    Solo se actualizan los empleados en los que algún campo cambia: re-importar el
+    mismo archivo no toca ``empleados`` (ni dispara los triggers de búsqueda).
+    Devuelve ``({numero_emp: id}, {numero_emp nuevos}, {numero_emp actualizados})``.
+    """
+    cols = ["numero_emp", "nombre", "nombre_busqueda", "nombre_corto", "planta", "turno", "area", "foto_url"]
+    ult = df.drop_duplicates("numero_emp", keep="last")
+    numeros = ult["numero_emp"].tolist()
+    ids, actual = {}, {}
+    for part in _chunks(numeros):
+        for row in db.execute(select(Empleado.id, Empleado.activo, *[getattr(Empleado, c) for c in cols])
+                              .where(Empleado.numero_emp.in_(part))).mappings():
+            ids[row["numero_emp"]] = row["id"]
+            actual[row["id"]] = row
+
+    recs = ult[cols].astype(object).where(ult[cols].notna(), None).to_dict("records")
+    nuevos = [dict(r, activo=True) for r in recs if r["numero_emp"] not in ids]
+    # Igual que el alta atómica: columnas vacías no pisan lo ya capturado
+    existentes = []
+    for r in recs:
+        if r["numero_emp"] in ids:
+            antes = actual[ids[r["numero_emp"]]]
+            upd = {k: v for k, v in r.items() if v is not None and k != "numero_emp" and v != antes[k]}
+            if not antes["activo"]:
+                upd["activo"] = True
+            if upd:
+                upd["id"] = antes["id"]
+                existentes.append(upd)
+
+    for part in _chunks(nuevos):
+        ids.update(db.execute(insert(Empleado).returning(Empleado.numero_emp, Empleado.id), part).tuples().all())
+    # El UPDATE masivo por PK agrupa por conjunto de columnas
+    grupos = {}
+    for r in existentes:
+        grupos.setdefault(tuple(sorted(r)), []).append(r)
+    for rows in grupos.values():
+        db.execute(update(Empleado), rows)
+
+    entradas = [("emp", ids[r["numero_emp"]], "i", ids[r["numero_emp"]], None) for r in nuevos]
+    for r in existentes:
+        antes = actual[r["id"]]
+        planta_antes = antes["planta"]
+        entradas.append(("emp", r["id"], "u", r["id"], None))
+        if r.get("planta", planta_antes) != planta_antes or not antes["activo"]:
+            entradas += [("emp", r["id"], "u", None, planta_antes), ("vacs_emp", r["id"], "u", None, planta_antes)]
+    bitacora.anotar(db, entradas)
+    return ids, {r["numero_emp"] for r in nuevos}, {actual[r["id"]]["numero_emp"] for r in existentes}
+
+def marcar_traslapes(db, df: pd.DataFrame) -> pd.Series:
+    """Marca filas que traslapan con vacaciones existentes o con filas previas del bloque."""
+    msg = pd.Series(None, index=df.index, dtype=object)
+    if df.empty:
+        return msg
+
+    # 1) Dentro del archivo: orden por empleado/fecha y máximo acumulado de fecha_final
+    s = df.sort_values(["empleado_id", "fecha_inicial", "fecha_final"], kind="stable")
+    prev_max = s.groupby("empleado_id")["fecha_final"].cummax().shift()
+    mismo = s["empleado_id"].eq(s["empleado_id"].shift())
+    dentro = mismo & (s["fecha_inicial"] <= prev_max)
+    msg[dentro[dentro].index] = "Traslapa con otra fila del archivo"
+
+    # 2) Contra la BD: una consulta acotada por empleados y ventana del bloque
+    emp_ids = df["empleado_id"].unique().tolist()
+    lo = df["fecha_inicial"].min().date(); hi = df["fecha_final"].max().date()
+    existentes = []
+    for part in _chunks(emp_ids):
+        existentes.extend(db.execute(
+            select(Vacacion.empleado_id, Vacacion.fecha_inicial, Vacacion.fecha_final)
+            .where(Vacacion.empleado_id.in_(part),
+                   Vacacion.fecha_inicial <= hi,
+                   Vacacion.fecha_final >= lo)
+        ).tuples().all())
+    if existentes:
+        ex = pd.DataFrame(existentes, columns=["empleado_id", "ex_ini", "ex_fin"])
+        ex["ex_ini"] = pd.to_datetime(ex["ex_ini"]); ex["ex_fin"] = pd.to_datetime(ex["ex_fin"])
+        m = df[["empleado_id", "fecha_inicial", "fecha_final"]].reset_index().merge(ex, on="empleado_id")
+        hit = m[(m["fecha_inicial"] <= m["ex_fin"]) & (m["fecha_final"] >= m["ex_ini"])]["index"].unique()
+        msg[hit] = "Rango traslapa con otra vacación del empleado"
+    return msg
+
+def _datos_empleados(db, ok: pd.DataFrame) -> dict:
+    """``{id: (planta, area, turno)}`` vigentes (ya con el upsert del bloque) de las filas ``ok``."""
+    out = {}
+    for part in _chunks(ok["empleado_id"].astype(int).unique().tolist()):
+        out.update((r[0], tuple(r[1:])) for r in db.execute(
+            select(Empleado.id, Empleado.planta, Empleado.area, Empleado.turno).where(Empleado.id.in_(part))))
+    return out
+
+def _gozo_habiles(ok: pd.DataFrame, emps: dict, habiles) -> pd.DataFrame:
+    """Completa ``gozo`` vacío con días hábiles según la planta/turno vigente de cada empleado."""
+    falta = ok["gozo"].isna()
+    if not falta.any():
+        return ok
+    sin = ok.loc[falta]
+    filas = [emps[int(e)] for e in sin["empleado_id"]]
+    dias = habiles.contar_filas([e[0] for e in filas], [e[2] for e in filas],
+                                sin["fecha_inicial"], sin["fecha_final"])
+    ok = ok.copy()
+    ok.loc[falta, "gozo"] = dias.astype(float)
+    return ok
+
+def marcar_capacidad(db, ok: pd.DataFrame, emps: dict, reglas) -> pd.Series:
+    """Filas que dejarían algún día por encima de una regla de capacidad (ver ``capacidad``)."""
+    msg = pd.Series(None, index=ok.index, dtype=object)
+    if not reglas:
+        return msg
+    propuestas = [emps[int(e)] + (fi.date(), ff.date())
+                  for e, fi, ff in zip(ok["empleado_id"], ok["fecha_inicial"], ok["fecha_final"])]
+    for v in capacidad.evaluar(db, propuestas, reglas=reglas):
+        for i in v["propuestas"]:
+            if pd.isna(msg.iat[i]):
+                msg.iat[i] = f"Excede la capacidad de «{v['nombre']}» (máx {v['maximo']})"
+    return msg
+
+def _sumar_saldos(db, ok: pd.DataFrame) -> None:
+    """Deltas de ``saldos`` del bloque, agrupados en pandas (misma regla que ``saldos.dias_de``)."""
+    naturales = (ok["fecha_final"] - ok["fecha_inicial"]).dt.days + 1
+    g = pd.DataFrame({
+        "empleado_id": ok["empleado_id"].astype(int),
+        "anio": ok["fecha_inicial"].dt.year,
+        "tipo": ok["tipo"],
+        "dias": ok["gozo"].where(ok["gozo"].notna(), naturales).astype(float),
+    }).groupby(["empleado_id", "anio", "tipo"])["dias"].agg(["sum", "size"])
+    deltas = saldos.Deltas()
+    for (emp, anio, tipo), (dias, n) in zip(g.index, g.itertuples(index=False)):
+        deltas.sumar_agrupado(emp, anio, tipo, dias, n)
+    saldos.aplicar(db.connection(), deltas)
+
+def importar_archivo(db, stream, ext: str, max_rows: int = None, fuente: str = "import",
+                     avance=None, habiles=None) -> dict:
+    """Procesa el archivo completo dentro de la transacción de ``db`` (sin commit).
+
+    Devuelve un resumen y un reporte por fila (fila = número de renglón en el archivo,
+    contando el encabezado como 1). ``avance(filas)``, si se da, se llama tras cada bloque.
+    """
+    if ext in (".xlsx", ".xls"):
+        stream = io.BytesIO(stream.read()) if not stream.seekable() else stream
+    reporte = []
+    total = insertadas = 0
+    emp_nuevos, emp_act = set(), set()    # numero_emp: un empleado repetido en varios bloques cuenta una vez
+    reglas = capacidad.reglas_activas(db)
+
+    for raw in iter_chunks(stream, ext):
+        raw.index = range(total + 2, total + 2 + len(raw))
+        total += len(raw)
+        if max_rows and total > max_rows:
+            raise ImportacionError(f"El archivo excede el máximo de {max_rows} filas")
+
+        df = normalizar_bloque(raw)
+        validas = df[df["error"].isna()]
+        ids, n_new, n_upd = upsert_empleados(db, validas) if len(validas) else ({}, set(), set())
+        emp_nuevos |= n_new; emp_act |= n_upd
+
+        validas = validas.assign(empleado_id=validas["numero_emp"].map(ids))
+        df.loc[validas.index[validas["empleado_id"].isna()], "error"] = "Empleado no resuelto"
+        validas = validas[validas["empleado_id"].notna()]
+        df.loc[validas.index, "empleado_id"] = validas["empleado_id"]
+
+        trasl = marcar_traslapes(db, validas)
+        df.loc[trasl.dropna().index, "error"] = trasl.dropna()
+        ok = validas.loc[trasl.isna()]
+
+        if len(ok):
+            emps = _datos_empleados(db, ok)
+            cap = marcar_capacidad(db, ok, emps, reglas)
+            df.loc[cap.dropna().index, "error"] = cap.dropna()
+            ok = ok.loc[cap.isna()]
+        if len(ok):
+            if habiles is not None:
+                ok = _gozo_habiles(ok, emps, habiles)
+            vacs = pd.DataFrame({
+                "empleado_id": ok["empleado_id"].astype(int),
+                "fecha_inicial": ok["fecha_inicial"].dt.date,
+                "fecha_final": ok["fecha_final"].dt.date,
+                "tipo": ok["tipo"],
+                "gozo": ok["gozo"].astype(object).where(ok["gozo"].notna(), None),
+                "fuente": fuente,
+            })
+            # flush implícito: el siguiente bloque ve estas filas al validar traslapes
+            nuevas = db.execute(insert(Vacacion).returning(Vacacion.id, Vacacion.empleado_id),
+                                vacs.to_dict("records")).all()
+            bitacora.anotar(db, [("vac", vid, "i", emp_id, None) for vid, emp_id in nuevas])
+            insertadas += len(vacs)
+            _sumar_saldos(db, ok)
+
+        for fila, num, emp_id, err in zip(df.index, df["numero_emp"],
+                                          df.get("empleado_id", pd.Series(None, index=df.index)),
+                                          df["error"]):
+            item = {"fila": int(fila), "numero_emp": num or None}
+            if isinstance(err, str):
+                item.update(estado="error", error=err)
+            else:
+                item.update(estado="ok", empleado_id=int(emp_id))
+            reporte.append(item)
+        if avance is not None:
+            avance(total)
+
+    if total == 0:
+        raise ImportacionError("El archivo no contiene filas")
+    return {
+        "filas": total,
+        "insertadas": insertadas,
+        "errores": total - insertadas,
+        "empleados_nuevos": len(emp_nuevos),
+        "empleados_actualizados": len(emp_act - emp_nuevos),
+        "reporte": reporte,
+    }
@@ -0,0 +1,205 @@
+"""Índice en memoria de intervalos de vacaciones (opcional: ``INTERVAL_INDEX=1``).
+
+Responde "¿qué vacaciones intersectan [fi, ff]?" sin ir a la BD:
+
+* por empleado: lista ordenada de ``(fi, ff, id)`` para los chequeos de traslape;
+* global: cubetas por día de inicio (ordinal) + el largo máximo visto, así una
+  ventana ``[s, e]`` solo revisa las cubetas ``s - largo_max .. e``.
+
+El índice guarda la versión de datos que refleja. Las escrituras locales se
+aplican al vuelo a partir de los objetos ORM que la sesión volcó (``after_flush``);
+si la versión de la BD no coincide (escrituras de otro worker, importaciones por
+SQL masivo) el índice se marca viejo, se reconstruye en segundo plano y mientras
+tanto los llamadores usan SQL. ``INTERVAL_INDEX_CHECK=1`` compara cada respuesta
+contra SQL y registra las diferencias.
+"""
+import bisect
+import logging
+import os
+import threading
+from datetime import date
+
+from sqlalchemy import event, select
+
+from models import Empleado, Vacacion
+
+INTERVAL_INDEX = os.getenv("INTERVAL_INDEX", "0") == "1"
+INTERVAL_INDEX_CHECK = os.getenv("INTERVAL_INDEX_CHECK", "0") == "1"
+
+log = logging.getLogger("intervalos")
+
+
+# ---------- Captura de cambios ORM por sesión ----------
+def registrar_sesion(session_factory) -> None:
+    @event.listens_for(session_factory, "after_flush")
+    def _capturar(session, flush_context):
+        cambios = session.info.setdefault("cambios_orm", [])
+        for obj in session.new | session.dirty:
+            if isinstance(obj, Vacacion):
+                cambios.append(("vac", obj.id, obj.empleado_id, obj.fecha_inicial, obj.fecha_final,
+                                obj.tipo, obj.gozo))
+            elif isinstance(obj, Empleado):
+                cambios.append(("emp", obj.id, obj.numero_emp, obj.nombre, obj.nombre_corto,
+                                obj.planta, obj.turno, obj.area, obj.foto_url, obj.activo))
+        for obj in session.deleted:
+            if isinstance(obj, Vacacion):
+                cambios.append(("vac-", obj.id))
+
+    @event.listens_for(session_factory, "after_soft_rollback")
+    def _descartar(session, previous_transaction):
+        session.info.pop("cambios_orm", None)
+
+
+class IndiceIntervalos:
+    def __init__(self, cargar_version, sesion_factory):
+        """``cargar_version(db)`` lee la versión de datos; ``sesion_factory`` abre sesiones para reconstruir."""
+        self._cargar_version = cargar_version
+        self._sesiones = sesion_factory
+        self._lock = threading.RLock()
+        self._reconstruyendo = False
+        self.version = None          # None = sin cargar / viejo
+        self._vac = {}               # id -> (emp_id, fi_ord, ff_ord, tipo, gozo)
+        self._por_emp = {}           # emp_id -> [(fi_ord, ff_ord, id)] ordenada
+        self._cubetas = {}           # fi_ord -> set(ids)
+        self._largo_max = 0
+        self._emp = {}               # emp_id -> (numero, nombre, corto, planta, turno, area, foto, activo)
+
+    # ---------- Mutación ----------
+    def _poner_vac(self, vid, emp_id, fi, ff, tipo, gozo):
+        self._quitar_vac(vid)
+        a, b = fi.toordinal(), ff.toordinal()
+        self._vac[vid] = (emp_id, a, b, tipo, float(gozo) if gozo is not None else None)
+        bisect.insort(self._por_emp.setdefault(emp_id, []), (a, b, vid))
+        self._cubetas.setdefault(a, set()).add(vid)
+        self._largo_max = max(self._largo_max, b - a)
+
+    def _quitar_vac(self, vid):
+        old = self._vac.pop(vid, None)
+        if old is None:
+            return
+        emp_id, a, b = old[0], old[1], old[2]
+        lst = self._por_emp.get(emp_id, [])
+        i = bisect.bisect_left(lst, (a, b, vid))
+        if i < len(lst) and lst[i] == (a, b, vid):
+            del lst[i]
+        cub = self._cubetas.get(a)
+        if cub is not None:
+            cub.discard(vid)
+            if not cub:
+                del self._cubetas[a]
+
+    def aplicar(self, version: int, cambios) -> None:
+        """Aplica los cambios ORM de la escritura que produjo ``version``.
+
+        ``cambios=None`` (escritura no rastreable, p.ej. importación) o un salto de
+        versión dejan el índice viejo hasta la siguiente reconstrucción.
+        """
+        with self._lock:
+            if self.version is None:
+                return
+            if cambios is None or self.version != version - 1:
+                self.version = None
+                return
+            for c in cambios:
+                if c[0] == "vac":
+                    self._poner_vac(*c[1:])
+                elif c[0] == "vac-":
+                    self._quitar_vac(c[1])
+                elif c[0] == "emp":
+                    self._emp[c[1]] = tuple(c[2:])
+            self.version = version
+
+    # ---------- Carga ----------
+    def reconstruir(self) -> None:
+        db = self._sesiones()
+        try:
+            version = self._cargar_version(db)
+            nuevo = IndiceIntervalos(self._cargar_version, self._sesiones)
+            for row in db.execute(select(Empleado.id, Empleado.numero_emp, Empleado.nombre,
+                                         Empleado.nombre_corto, Empleado.planta, Empleado.turno,
+                                         Empleado.area, Empleado.foto_url, Empleado.activo)):
+                nuevo._emp[row[0]] = tuple(row[1:])
+            res = db.execute(select(Vacacion.id, Vacacion.empleado_id, Vacacion.fecha_inicial,
+                                    Vacacion.fecha_final, Vacacion.tipo, Vacacion.gozo)
+                             .execution_options(yield_per=20000))
+            for vid, emp_id, fi, ff, tipo, gozo in res:
+                nuevo._poner_vac(vid, emp_id, fi, ff, tipo, gozo)
+        finally:
+            db.close()
+        with self._lock:
+            self._vac, self._por_emp, self._cubetas = nuevo._vac, nuevo._por_emp, nuevo._cubetas
+            self._largo_max, self._emp = nuevo._largo_max, nuevo._emp
+            self.version = version
+        log.info("índice de intervalos cargado: %d vacaciones (v%d)", len(self._vac), version)
+
+    def _reconstruir_fondo(self):
+        try:
+            self.reconstruir()
+        except Exception:
+            log.exception("falló la reconstrucción del índice de intervalos")
+        finally:
+            with self._lock:
+                self._reconstruyendo = False
+
+    def calentar(self) -> None:
+        """Lanza una reconstrucción en segundo plano (si no hay una en curso)."""
+        with self._lock:
+            if not self._reconstruyendo:
+                self._reconstruyendo = True
+                threading.Thread(target=self._reconstruir_fondo, name="intervalos", daemon=True).start()
+
+    def vigente(self, version: int) -> bool:
+        """True si el índice refleja ``version``; si no, lo reconstruye en segundo plano."""
+        with self._lock:
+            if self.version is not None and self.version == version:
+                return True
+        self.calentar()
+        return False
+
+    # ---------- Consultas ----------
+    def traslapa(self, emp_id: int, fi: date, ff: date, ignore_id: int = None) -> bool:
+        a, b = fi.toordinal(), ff.toordinal()
+        with self._lock:
+            lst = self._por_emp.get(emp_id, ())
+            # Solo pueden traslapar los que empiezan en o antes de ff
+            hasta = bisect.bisect_right(lst, (b, float("inf"), float("inf")))
+            for i in range(hasta - 1, -1, -1):
+                ia, ib, vid = lst[i]
+                if ib >= a and vid != ignore_id:
+                    return True
+                if ia < a - self._largo_max:
+                    break
+        return False
+
+    def ventana(self, start: date, end: date, planta: str = None):
+        """Vacaciones de empleados activos que intersectan ``[start, end]``, ordenadas por (fi, id).
+
+        Cada fila tiene la forma de ``VAC_EMP_COLS`` en app.py (``fuente`` va en None).
+        """
+        s, e = start.toordinal(), end.toordinal()
+        out = []
+        with self._lock:
+            for d in range(s - self._largo_max, e + 1):
+                for vid in self._cubetas.get(d, ()):
+                    emp_id, a, b, tipo, gozo = self._vac[vid]
+                    if b < s:
+                        continue
+                    emp = self._emp.get(emp_id)
+                    if emp is None or not emp[7] or (planta and emp[3] != planta):
+                        continue
+                    out.append((vid, date.fromordinal(a), date.fromordinal(b), tipo, gozo, None,
+                                emp_id) + emp[:7])
+        out.sort(key=lambda r: (r[1], r[0]))
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"version": self.version, "vacaciones": len(self._vac),
+                    "empleados": len(self._emp), "largo_max": self._largo_max}
+
+
+def comparar(nombre: str, del_indice, de_sql) -> None:
+    """Modo verificación: registra si el índice y SQL difieren."""
+    if del_indice != de_sql:
+        log.error("índice de intervalos inconsistente en %s: índice=%r sql=%r",
+                  nombre, del_indice, de_sql)
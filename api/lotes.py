@@ -0,0 +1,287 @@
+"""Lote de operaciones sobre vacaciones: todo o nada, validado en bloque.
+
+Cada operación es ``{"op": "create"|"update"|"delete", ...}`` con los mismos
+campos que los endpoints individuales (``id`` para update/delete). La validación
+hace tres consultas sin importar el tamaño del lote (vacaciones referidas,
+empleados, vacaciones vecinas) y busca traslapes contra la BD y entre las propias
+operaciones con un barrido por empleado; luego revisa las reglas de capacidad
+con el lote completo (una consulta más). Si todo es válido se aplica con
+sentencias masivas (INSERT/UPDATE por PK/DELETE) en la transacción de ``db``.
+
+Con ``habiles`` (``dias_habiles.Calendarios``), las operaciones sin ``gozo`` (o
+con ``gozo: null``, o un update que cambia fechas/empleado sin mandarlo) lo
+reciben calculado en días hábiles, en una pasada por calendario.
+"""
+import os
+from datetime import date
+
+from sqlalchemy import select, insert, update, delete
+
+from models import Empleado, Vacacion
+from eventos import rango
+import saldos
+import bitacora
+import capacidad
+
+BATCH_MAX = int(os.getenv("BATCH_MAX", "1000"))
+BATCH_MAX_ASYNC = int(os.getenv("BATCH_MAX_ASYNC", "20000"))   # lotes como trabajo en segundo plano
+IN_CHUNK = 500
+OPS = ("create", "update", "delete")
+CAMPOS = ("empleado_id", "fecha_inicial", "fecha_final", "tipo", "gozo", "fuente")
+
+
+class LoteInvalido(ValueError):
+    """El lote completo no se puede aplicar; ``resultados`` trae el detalle por operación."""
+
+    def __init__(self, msg, resultados=None):
+        super().__init__(msg)
+        self.resultados = resultados or []
+
+
+def _chunks(seq, n=IN_CHUNK):
+    seq = list(seq)
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def _fecha(v):
+    if not v:
+        return None
+    try:
+        return date.fromisoformat(str(v).strip()[:10])
+    except ValueError:
+        return None
+
+
+def _normalizar(i, op):
+    """Valida la forma de una operación; devuelve ``(dict, error)``."""
+    if not isinstance(op, dict):
+        return None, "Operación inválida"
+    tipo_op = str(op.get("op") or "").lower()
+    if tipo_op not in OPS:
+        return None, f"op debe ser {', '.join(OPS)}"
+    out = {"op": tipo_op, "indice": i}
+    if tipo_op in ("update", "delete"):
+        try:
+            out["id"] = int(op["id"])
+        except (KeyError, TypeError, ValueError):
+            return None, "id requerido"
+    if tipo_op == "delete":
+        return out, None
+    for k in ("fecha_inicial", "fecha_final"):
+        if op.get(k):
+            f = _fecha(op[k])
+            if f is None:
+                return None, f"{k} inválida"
+            out[k] = f
+    if op.get("empleado_id"):
+        try:
+            out["empleado_id"] = int(op["empleado_id"])
+        except (TypeError, ValueError):
+            return None, "empleado_id inválido"
+    if tipo_op == "create":
+        falt = [k for k in ("empleado_id", "fecha_inicial", "fecha_final") if k not in out]
+        if falt:
+            return None, f"Campos requeridos: {', '.join(falt)}"
+        out["tipo"] = op.get("tipo") or "Gozo de Vacaciones"
+        out["gozo"] = op.get("gozo")
+        out["fuente"] = op.get("fuente") or "manual"
+    else:
+        if op.get("tipo"):
+            out["tipo"] = op["tipo"]
+        for k in ("gozo", "fuente"):
+            if k in op:
+                out[k] = op[k]
+    return out, None
+
+
+def _gozo_automatico(o) -> bool:
+    if o["op"] == "create" or "gozo" in o:
+        return o["final"]["gozo"] in (None, "")
+    return any(o["final"][k] != o["antes"][k] for k in ("empleado_id", "fecha_inicial", "fecha_final"))
+
+
+def procesar_lote(db, operaciones, dry_run: bool = False, maximo: int = BATCH_MAX, habiles=None) -> dict:
+    """Valida y (si no es ``dry_run``) aplica el lote en la transacción de ``db`` (sin commit).
+
+    Devuelve ``{"resultados", "rangos", "cambios"}``: resultado por operación, rangos
+    afectados (para ``commit_cambios``) y cambios en el formato de ``intervalos``.
+    Lanza ``LoteInvalido`` si alguna operación falla; en ese caso no se escribe nada.
+    """
+    if not isinstance(operaciones, list) or not operaciones:
+        raise LoteInvalido("operaciones debe ser una lista no vacía")
+    if len(operaciones) > maximo:
+        raise LoteInvalido(f"El lote excede el máximo de {maximo} operaciones")
+
+    ops, errores = [], {}
+    for i, op in enumerate(operaciones):
+        norm, err = _normalizar(i, op)
+        if err:
+            errores[i] = err
+        else:
+            ops.append(norm)
+
+    # 1) Vacaciones referidas por update/delete
+    ids = [o["id"] for o in ops if "id" in o]
+    actuales = {}
+    for part in _chunks(set(ids)):
+        for row in db.execute(select(Vacacion.id, Vacacion.empleado_id, Vacacion.fecha_inicial,
+                                     Vacacion.fecha_final, Vacacion.tipo, Vacacion.gozo,
+                                     Vacacion.fuente).where(Vacacion.id.in_(part))):
+            actuales[row[0]] = dict(zip(CAMPOS, row[1:]))
+    vistos = set()
+    for o in ops:
+        if "id" not in o:
+            continue
+        if o["id"] in vistos:
+            errores[o["indice"]] = "Vacación repetida en el lote"
+        elif o["id"] not in actuales:
+            errores[o["indice"]] = "Vacación no encontrada"
+        vistos.add(o["id"])
+    ops = [o for o in ops if o["indice"] not in errores]
+
+    # Estado final de cada create/update
+    for o in ops:
+        if o["op"] == "update":
+            o["antes"] = actuales[o["id"]]
+            o["final"] = dict(o["antes"], **{k: o[k] for k in CAMPOS if k in o})
+        elif o["op"] == "create":
+            o["final"] = {k: o[k] for k in CAMPOS}
+        else:
+            o["antes"] = actuales[o["id"]]
+        fin = o.get("final")
+        if fin and fin["fecha_final"] < fin["fecha_inicial"]:
+            errores[o["indice"]] = "fecha_final no puede ser menor que fecha_inicial"
+
+    # 2) Empleados (destino activo, planta para los rangos, planta/turno/área para gozo y capacidad)
+    emp_ids = {o[k]["empleado_id"] for o in ops for k in ("antes", "final") if k in o}
+    empleados = {}
+    for part in _chunks(emp_ids):
+        empleados.update((r[0], tuple(r[1:])) for r in db.execute(
+            select(Empleado.id, Empleado.planta, Empleado.activo, Empleado.turno, Empleado.area)
+            .where(Empleado.id.in_(part))))
+    for o in ops:
+        fin = o.get("final")
+        if fin and o["indice"] not in errores:
+            emp = empleados.get(fin["empleado_id"])
+            if not emp or not emp[1]:
+                errores[o["indice"]] = "Empleado no encontrado o inactivo"
+
+    # 3) Traslapes: intervalos propuestos vs. vecinos en BD que el lote no toca
+    propuestas = [o for o in ops if "final" in o and o["indice"] not in errores]
+    tocadas = {o["id"] for o in ops if "id" in o}
+    por_emp = {}
+    for o in propuestas:
+        f = o["final"]
+        por_emp.setdefault(f["empleado_id"], []).append((f["fecha_inicial"], f["fecha_final"], o["indice"]))
+    if por_emp:
+        lo = min(iv[0] for ivs in por_emp.values() for iv in ivs)
+        hi = max(iv[1] for ivs in por_emp.values() for iv in ivs)
+        for part in _chunks(por_emp):
+            for vid, emp_id, fi, ff in db.execute(
+                    select(Vacacion.id, Vacacion.empleado_id, Vacacion.fecha_inicial, Vacacion.fecha_final)
+                    .where(Vacacion.empleado_id.in_(part),
+                           Vacacion.fecha_inicial <= hi,
+                           Vacacion.fecha_final >= lo)):
+                if vid not in tocadas:
+                    por_emp[emp_id].append((fi, ff, None))
+        for ivs in por_emp.values():
+            ivs.sort(key=lambda iv: (iv[0], iv[1]))
+            # Barrido: compara cada intervalo con el que llega más lejos hasta ahora
+            tope = None
+            for iv in ivs:
+                if tope is not None and iv[0] <= tope[1]:
+                    for a, b in ((iv, tope), (tope, iv)):
+                        if a[2] is not None and a[2] not in errores:
+                            errores[a[2]] = ("Rango traslapa con otra vacación del empleado" if b[2] is None
+                                             else f"Traslapa con la operación {b[2]} del lote")
+                if tope is None or iv[1] > tope[1]:
+                    tope = iv
+
+    # 4) Capacidad: el lote completo contra la ocupación sin las vacaciones que toca
+    propuestas = [o for o in propuestas if o["indice"] not in errores]
+    if propuestas:
+        emps = [empleados[o["final"]["empleado_id"]] for o in propuestas]
+        for v in capacidad.evaluar(db, [(e[0], e[3], e[2], o["final"]["fecha_inicial"], o["final"]["fecha_final"])
+                                        for e, o in zip(emps, propuestas)], excluir=tocadas):
+            for i in v["propuestas"]:
+                errores.setdefault(propuestas[i]["indice"],
+                                   f"Excede la capacidad de «{v['nombre']}» (máx {v['maximo']})")
+
+    resultados = []
+    for i in range(len(operaciones)):
+        resultados.append({"indice": i, "ok": i not in errores, **({"error": errores[i]} if i in errores else {})})
+    if errores:
+        raise LoteInvalido(f"{len(errores)} operaciones con errores; no se aplicó ninguna", resultados)
+
+    if habiles is not None:
+        auto = [o for o in ops if "final" in o and _gozo_automatico(o)]
+        if auto:
+            emps = [empleados[o["final"]["empleado_id"]] for o in auto]
+            dias = habiles.contar_filas([e[0] for e in emps], [e[2] for e in emps],
+                                        [o["final"]["fecha_inicial"] for o in auto],
+                                        [o["final"]["fecha_final"] for o in auto])
+            for o, n in zip(auto, dias):
+                o["final"]["gozo"] = float(n)
+                if o["op"] == "update":
+                    o["gozo"] = float(n)
+                resultados[o["indice"]]["gozo"] = float(n)
+
+    rangos = []
+    for o in ops:
+        for k in ("antes", "final"):
+            if k in o:
+                f = o[k]
+                rangos.append(rango(f["fecha_inicial"], f["fecha_final"], empleados[f["empleado_id"]][0]))
+    if dry_run:
+        return {"resultados": resultados, "rangos": rangos, "cambios": []}
+
+    # Aplicación masiva
+    cambios = []
+    creates = [o for o in ops if o["op"] == "create"]
+    for part in _chunks(creates):
+        # Sin traslapes, (empleado, fecha_inicial) identifica cada fila insertada
+        nuevos = dict(((e, fi), vid) for vid, e, fi in db.execute(
+            insert(Vacacion).returning(Vacacion.id, Vacacion.empleado_id, Vacacion.fecha_inicial),
+            [o["final"] for o in part]))
+        for o in part:
+            o["id"] = nuevos[(o["final"]["empleado_id"], o["final"]["fecha_inicial"])]
+    # El UPDATE masivo por PK agrupa por conjunto de columnas
+    grupos = {}
+    for o in ops:
+        if o["op"] == "update":
+            upd = {k: o[k] for k in CAMPOS if k in o}
+            if upd:
+                grupos.setdefault(tuple(sorted(upd)), []).append(dict(upd, id=o["id"]))
+    for rows in grupos.values():
+        db.execute(update(Vacacion), rows)
+    borrar = [o["id"] for o in ops if o["op"] == "delete"]
+    for part in _chunks(borrar):
+        db.execute(delete(Vacacion).where(Vacacion.id.in_(part)), execution_options={"synchronize_session": False})
+
+    deltas = saldos.Deltas()
+    for o in ops:
+        if "antes" in o:
+            deltas.sumar(*(o["antes"][c] for c in saldos.CAMPOS_VAC), signo=-1)
+        if "final" in o:
+            deltas.sumar(*(o["final"][c] for c in saldos.CAMPOS_VAC))
+    saldos.aplicar(db.connection(), deltas)
+
+    entradas = []
+    for o in ops:
+        if o["op"] == "delete":
+            entradas.append(("vac", o["id"], "d", o["antes"]["empleado_id"], None))
+            continue
+        entradas.append(("vac", o["id"], "i" if o["op"] == "create" else "u", o["final"]["empleado_id"], None))
+        if o["op"] == "update" and o["antes"]["empleado_id"] != o["final"]["empleado_id"]:
+            entradas.append(("vac", o["id"], "u", o["antes"]["empleado_id"], None))
+    bitacora.anotar(db, entradas)
+
+    for o in ops:
+        resultados[o["indice"]]["id"] = o["id"]
+        if o["op"] == "delete":
+            cambios.append(("vac-", o["id"]))
+        else:
+            f = o["final"]
+            cambios.append(("vac", o["id"], f["empleado_id"], f["fecha_inicial"], f["fecha_final"],
+                            f["tipo"], f["gozo"]))
+    return {"resultados": resultados, "rangos": rangos, "cambios": cambios}
@@ -0,0 +1,213 @@
+"""Métricas por ruta y por sentencia SQL en formato de texto de Prometheus.
+
+* Por request (hooks de Flask): conteo por ruta/método/código, histograma de
+  latencia, bytes de respuesta, y sentencias SQL y tiempo en BD del request.
+* Por sentencia (eventos del engine): histograma de duración y bitácora de
+  consultas lentas (``SLOW_SQL_MS``) con la sentencia y sus parámetros.
+* Valores instantáneos (pool, cachés, suscriptores SSE) vía ``registrar_gauge``.
+
+El tiempo SQL es el de ``cursor.execute``: en Postgres (psycopg2 trae el resultado
+completo al ejecutar) incluye la consulta entera; en SQLite buena parte del trabajo
+ocurre al recorrer filas y queda en el tiempo de la app.
+
+Los valores son por proceso: con varios workers de gunicorn, Prometheus ve una
+serie por worker (la etiqueta ``pid`` las distingue).
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+SLOW_SQL_MS = float(os.getenv("SLOW_SQL_MS", "200"))
+
+BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BUCKETS_SQL = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+log_lento = logging.getLogger("sql_lento")
+_local = threading.local()
+
+
+# ---------- Registro ----------
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _etiquetas(nombres, valores) -> str:
+    pares = [f'{k}="{_esc(v)}"' for k, v in zip(nombres, valores)]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._v = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores, n=1):
+        with self._lock:
+            self._v[valores] = self._v.get(valores, 0) + n
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        with self._lock:
+            items = list(self._v.items())
+        for vals, v in items:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, vals)} {v}"
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_S):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._v = {}   # valores -> [conteos por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, x, *valores):
+        with self._lock:
+            fila = self._v.get(valores)
+            if fila is None:
+                fila = self._v[valores] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if x <= b:
+                    fila[i] += 1
+                    break
+            fila[-2] += x
+            fila[-1] += 1
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._v.items()]
+        for vals, fila in items:
+            acum = 0
+            for b, n in zip(self.buckets, fila):
+                acum += n
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas + ('le',), vals + (b,))} {acum}"
+            yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas + ('le',), vals + ('+Inf',))} {fila[-1]}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, vals)} {round(fila[-2], 6)}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, vals)} {fila[-1]}"
+
+
+peticiones = Contador("http_requests_total", "Peticiones por ruta, método y código",
+                      ("ruta", "metodo", "codigo"))
+latencia = Histograma("http_request_duration_seconds", "Latencia hasta los encabezados de respuesta",
+                      ("ruta", "metodo"))
+bytes_resp = Histograma("http_response_bytes", "Tamaño del cuerpo de respuesta (si se conoce)",
+                        ("ruta",), BUCKETS_BYTES)
+sql_por_peticion = Histograma("http_request_sql_statements", "Sentencias SQL por petición",
+                              ("ruta",), BUCKETS_SQL)
+sql_tiempo_peticion = Histograma("http_request_sql_seconds", "Tiempo en BD por petición", ("ruta",))
+sql_duracion = Histograma("sql_statement_duration_seconds", "Duración de cada sentencia SQL", ("tipo",))
+sql_lentas = Contador("sql_slow_statements_total", "Sentencias por encima de SLOW_SQL_MS", ("tipo",))
+en_curso = [0]
+_en_curso_lock = threading.Lock()
+
+METRICAS = [peticiones, latencia, bytes_resp, sql_por_peticion, sql_tiempo_peticion, sql_duracion, sql_lentas]
+_gauges = []
+
+
+def registrar_gauge(nombre: str, ayuda: str, fn) -> None:
+    """``fn()`` devuelve un número o ``{clave: valor}`` (una serie por clave)."""
+    _gauges.append((nombre, ayuda, fn))
+
+
+def exponer() -> str:
+    lineas = []
+    for m in METRICAS:
+        lineas.extend(m.exponer())
+    lineas += ["# HELP http_requests_in_flight Peticiones en curso",
+               "# TYPE http_requests_in_flight gauge", f"http_requests_in_flight {en_curso[0]}"]
+    for nombre, ayuda, fn in _gauges:
+        try:
+            v = fn()
+        except Exception:
+            continue
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge"]
+        if isinstance(v, dict):
+            lineas += [f"{nombre}{_etiquetas(('clave',), (k,))} {x}" for k, x in v.items()]
+        else:
+            lineas.append(f"{nombre} {v}")
+    lineas += ["# HELP proceso_info Proceso que expone estas series", "# TYPE proceso_info gauge",
+               f'proceso_info{{pid="{os.getpid()}"}} 1']   # tras el fork: el del worker
+    return "\n".join(lineas) + "\n"
+
+
+# ---------- SQL ----------
+def _tipo(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+
+def instalar_sql(engine) -> None:
+    """Mide cada sentencia del engine y la acumula en el request del hilo actual."""
+    if getattr(engine, "_metricas_sql", False):
+        return
+    engine._metricas_sql = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_t_sql", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        pila = conn.info.get("_t_sql")
+        if not pila:
+            return
+        dt = time.perf_counter() - pila.pop()
+        tipo = _tipo(statement)
+        sql_duracion.observar(dt, tipo)
+        acc = getattr(_local, "acc", None)
+        if acc is not None:
+            acc[0] += 1
+            acc[1] += dt
+        if dt * 1000 >= SLOW_SQL_MS:
+            sql_lentas.inc(tipo)
+            params = repr(parameters)
+            log_lento.warning("SQL lenta (%.1f ms%s): %s | params=%s", dt * 1000,
+                              ", executemany" if executemany else "", " ".join(statement.split())[:2000],
+                              params[:1000] + ("…" if len(params) > 1000 else ""))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        # Una sentencia que falla no llega a after_cursor_execute
+        if ctx.connection is not None and ctx.connection.info.get("_t_sql"):
+            ctx.connection.info["_t_sql"].pop()
+
+
+# ---------- Flask ----------
+def _ruta() -> str:
+    rule = request.url_rule
+    return rule.rule if rule is not None else "<sin_ruta>"
+
+def instalar_flask(app) -> None:
+    @app.before_request
+    def _inicio():
+        g._t0 = time.perf_counter()
+        _local.acc = [0, 0.0]
+        with _en_curso_lock:
+            en_curso[0] += 1
+
+    @app.after_request
+    def _fin(resp):
+        t0 = g.pop("_t0", None)
+        if t0 is None:
+            return resp
+        ruta, dt = _ruta(), time.perf_counter() - t0
+        acc = getattr(_local, "acc", None) or [0, 0.0]
+        peticiones.inc(ruta, request.method, resp.status_code)
+        latencia.observar(dt, ruta, request.method)
+        if resp.content_length is not None:
+            bytes_resp.observar(resp.content_length, ruta)
+        sql_por_peticion.observar(acc[0], ruta)
+        sql_tiempo_peticion.observar(acc[1], ruta)
+        resp.headers["Server-Timing"] = f"app;dur={dt * 1000:.1f}, db;dur={acc[1] * 1000:.1f}"
+        return resp
+
+    @app.teardown_request
+    def _salida(exc):
+        _local.acc = None
+        with _en_curso_lock:
+            en_curso[0] -= 1
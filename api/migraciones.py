@@ -0,0 +1,163 @@
+"""Migraciones versionadas y no destructivas.
+
+``create_all`` crea las tablas que falten; aquí van los cambios sobre tablas ya
+existentes (columnas, índices, objetos propios del motor). Cada migración corre
+una sola vez, en su propia transacción, y queda anotada en ``schema_migraciones``.
+Todas usan ``IF NOT EXISTS`` para convivir con bases creadas desde los modelos.
+
+Uso manual: ``python migraciones.py`` aplica lo pendiente y lista el estado.
+"""
+import datetime
+import logging
+import sqlite3
+
+from sqlalchemy import (
+    Table, Column, Integer, String, DateTime, MetaData, inspect, select, insert, text,
+)
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from normalizacion import clave_busqueda
+import saldos
+
+log = logging.getLogger("migraciones")
+
+_meta = MetaData()
+schema_migraciones = Table(
+    "schema_migraciones", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("nombre", String(64), nullable=False),
+    Column("aplicada_en", DateTime, nullable=False),
+)
+
+
+# ---------- Migraciones ----------
+def _m001_nombre_busqueda(conn, dialecto):
+    cols = {c["name"] for c in inspect(conn).get_columns("empleados")}
+    if "nombre_busqueda" not in cols:
+        conn.execute(text("ALTER TABLE empleados ADD COLUMN nombre_busqueda TEXT"))
+    while True:
+        rows = conn.execute(text("SELECT id, nombre FROM empleados "
+                                 "WHERE nombre_busqueda IS NULL LIMIT 2000")).all()
+        if not rows:
+            return
+        conn.execute(text("UPDATE empleados SET nombre_busqueda = :k WHERE id = :id"),
+                     [{"id": i, "k": clave_busqueda(n)} for i, n in rows])
+
+def _m002_indices_busqueda(conn, dialecto):
+    if dialecto == "postgresql":
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_empleados_numero_prefijo "
+                          "ON empleados (numero_emp text_pattern_ops)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_empleados_busqueda_prefijo "
+                          "ON empleados (nombre_busqueda text_pattern_ops)"))
+        # pg_trgm puede requerir permisos; sin él la búsqueda funciona sin índice trigram
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_empleados_busqueda_trgm "
+                                  "ON empleados USING gin (nombre_busqueda gin_trgm_ops)"))
+        except Exception as e:
+            log.warning("pg_trgm no disponible: %s", e)
+        return
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_empleados_nombre_busqueda "
+                      "ON empleados (nombre_busqueda)"))
+    if not fts_trigram_disponible():
+        # SQLite sin FTS5/trigram (< 3.34): búsqueda con LIKE sobre la clave
+        log.warning("FTS5 trigram no disponible; búsqueda sin índice de subcadenas")
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS empleados_fts USING fts5(nombre_busqueda, "
+        "content='empleados', content_rowid='id', tokenize='trigram')"))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS empleados_fts_ai AFTER INSERT ON empleados BEGIN
+          INSERT INTO empleados_fts(rowid, nombre_busqueda) VALUES (new.id, new.nombre_busqueda);
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS empleados_fts_ad AFTER DELETE ON empleados BEGIN
+          INSERT INTO empleados_fts(empleados_fts, rowid, nombre_busqueda)
+          VALUES ('delete', old.id, old.nombre_busqueda);
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS empleados_fts_au AFTER UPDATE OF nombre_busqueda ON empleados BEGIN
+          INSERT INTO empleados_fts(empleados_fts, rowid, nombre_busqueda)
+          VALUES ('delete', old.id, old.nombre_busqueda);
+          INSERT INTO empleados_fts(rowid, nombre_busqueda) VALUES (new.id, new.nombre_busqueda);
+        END"""))
+    conn.execute(text("INSERT INTO empleados_fts(empleados_fts) VALUES ('rebuild')"))
+
+def fts_trigram_disponible() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        return True
+    except sqlite3.Error:
+        return False
+
+def _m003_indices_consultas(conn, dialecto):
+    # _hay_traslape e importación: empleado primero, luego el rango
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_vacaciones_emp_rango "
+                      "ON vacaciones (empleado_id, fecha_inicial, fecha_final)"))
+    # Ventanas del calendario: fecha_final >= start es lo selectivo (casi todo es pasado)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_vacaciones_fin_ini "
+                      "ON vacaciones (fecha_final, fecha_inicial)"))
+    # Orden keyset del listado de vacaciones
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_vacaciones_ini_id "
+                      "ON vacaciones (fecha_inicial, id)"))
+    # Filtros activo/planta del calendario y listados (id sirve el orden keyset)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_empleados_planta_activo "
+                      "ON empleados (planta, activo, id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_empleados_activo_id "
+                      "ON empleados (activo, id)"))
+    if dialecto == "postgresql":
+        conn.execute(text("ANALYZE empleados"))
+        conn.execute(text("ANALYZE vacaciones"))
+    else:
+        conn.execute(text("ANALYZE"))
+
+def _m004_saldos(conn, dialecto):
+    # La tabla la crea create_all; aquí se llena por primera vez
+    saldos.reconstruir(conn)
+
+
+MIGRACIONES = [
+    (1, "nombre_busqueda", _m001_nombre_busqueda),
+    (2, "indices_busqueda", _m002_indices_busqueda),
+    (3, "indices_consultas", _m003_indices_consultas),
+    (4, "saldos", _m004_saldos),
+]
+
+
+# ---------- Aplicación ----------
+def aplicadas(engine) -> dict:
+    with engine.connect() as conn:
+        return dict(conn.execute(select(schema_migraciones.c.version,
+                                        schema_migraciones.c.nombre)).tuples().all())
+
+def migrar(engine) -> list:
+    """Aplica las migraciones pendientes en orden; devuelve las versiones aplicadas."""
+    _meta.create_all(engine)
+    hechas = aplicadas(engine)
+    nuevas = []
+    for version, nombre, fn in MIGRACIONES:
+        if version in hechas:
+            continue
+        try:
+            with engine.begin() as conn:
+                fn(conn, engine.dialect.name)
+                conn.execute(insert(schema_migraciones).values(
+                    version=version, nombre=nombre, aplicada_en=datetime.datetime.utcnow()))
+        except (IntegrityError, OperationalError):
+            # Otro proceso (p.ej. un worker sin preload_app) la aplicó al mismo tiempo
+            if version in aplicadas(engine):
+                continue
+            raise
+        log.info("migración %03d_%s aplicada", version, nombre)
+        nuevas.append(version)
+    return nuevas
+
+
+if __name__ == "__main__":
+    from models import engine, init_db
+    init_db()
+    hechas = aplicadas(engine)
+    for version, nombre, _ in MIGRACIONES:
+        print(f"{version:03d}_{nombre}: {'aplicada' if version in hechas else 'PENDIENTE'}")
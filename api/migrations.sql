@@ -1,13 +1,13 @@
--- Borrar (cuidado: destruye datos)
-DROP TABLE IF EXISTS vacaciones CASCADE;
-DROP TABLE IF EXISTS empleados CASCADE;
+-- Esquema de referencia para Postgres (no destructivo: se puede re-ejecutar).
+-- La app aplica lo mismo al arrancar: create_all + migraciones.py (schema_migraciones).
+-- Generado desde models.py / migraciones.py; al agregar un modelo o una migración, actualizar aquí.
 
--- Crear
-CREATE TABLE empleados (
+CREATE TABLE IF NOT EXISTS empleados (
   id SERIAL PRIMARY KEY,
   numero_emp VARCHAR(32) UNIQUE NOT NULL,
   nombre TEXT NOT NULL,
   nombre_corto TEXT,
+  nombre_busqueda TEXT,
   area TEXT,
   turno VARCHAR(16),
   planta VARCHAR(16),
@@ -15,7 +15,7 @@ CREATE TABLE empleados (
   activo BOOLEAN DEFAULT TRUE
 );
 
-CREATE TABLE vacaciones (
+CREATE TABLE IF NOT EXISTS vacaciones (
   id SERIAL PRIMARY KEY,
   empleado_id INT NOT NULL REFERENCES empleados(id) ON DELETE CASCADE,
   fecha_inicial DATE NOT NULL,
@@ -25,5 +25,97 @@ CREATE TABLE vacaciones (
   fuente VARCHAR(16) DEFAULT 'manual'
 );
 
-CREATE INDEX idx_vacaciones_rango ON vacaciones(fecha_inicial, fecha_final);
-CREATE INDEX idx_empleados_numero ON empleados(numero_emp);
+CREATE TABLE IF NOT EXISTS meta_datos (
+  clave VARCHAR(32) PRIMARY KEY,
+  valor BIGINT NOT NULL DEFAULT 0
+);
+
+-- Días usados por empleado/año/tipo (saldos.py)
+CREATE TABLE IF NOT EXISTS saldos (
+  anio INT NOT NULL,
+  empleado_id INT NOT NULL REFERENCES empleados(id) ON DELETE CASCADE,
+  tipo VARCHAR(64) NOT NULL,
+  dias NUMERIC(8,1) NOT NULL DEFAULT 0,
+  periodos INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (anio, empleado_id, tipo)
+);
+CREATE INDEX IF NOT EXISTS idx_saldos_emp_anio ON saldos(empleado_id, anio);
+
+-- Festivos adicionales a los de ley; planta NULL = todas (dias_habiles.py)
+CREATE TABLE IF NOT EXISTS dias_festivos (
+  id SERIAL PRIMARY KEY,
+  fecha DATE NOT NULL,
+  planta VARCHAR(16),
+  nombre TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_festivos_fecha_planta ON dias_festivos(fecha, planta);
+
+-- Máximo de ausentes simultáneos por planta/área/turno (capacidad.py)
+CREATE TABLE IF NOT EXISTS reglas_capacidad (
+  id SERIAL PRIMARY KEY,
+  nombre TEXT,
+  planta VARCHAR(16),
+  area VARCHAR(64),
+  turno VARCHAR(16),
+  maximo INT NOT NULL,
+  desde DATE,
+  hasta DATE,
+  activa BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+-- Bitácora para /api/cambios (bitacora.py)
+CREATE TABLE IF NOT EXISTS bitacora_cambios (
+  id SERIAL PRIMARY KEY,
+  version BIGINT NOT NULL,
+  entidad VARCHAR(8) NOT NULL,
+  entidad_id INT NOT NULL,
+  op VARCHAR(1) NOT NULL,
+  planta VARCHAR(16),
+  creado_en TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bitacora_version ON bitacora_cambios(version, id);
+CREATE INDEX IF NOT EXISTS idx_bitacora_entidad ON bitacora_cambios(entidad, entidad_id, id);
+
+-- Trabajos en segundo plano (trabajos.py)
+CREATE TABLE IF NOT EXISTS trabajos (
+  id VARCHAR(32) PRIMARY KEY,
+  tipo VARCHAR(32) NOT NULL,
+  estado VARCHAR(16) NOT NULL,
+  parametros TEXT,
+  entrada BYTEA,
+  procesados INT NOT NULL DEFAULT 0,
+  total INT,
+  resultado TEXT,
+  error TEXT,
+  cancelar BOOLEAN NOT NULL DEFAULT FALSE,
+  intentos INT NOT NULL DEFAULT 0,
+  propietario VARCHAR(96),
+  creado_en TIMESTAMP NOT NULL,
+  iniciado_en TIMESTAMP,
+  terminado_en TIMESTAMP,
+  latido TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado_tipo ON trabajos(estado, tipo, creado_en);
+
+-- Registro de migraciones aplicadas (migraciones.py)
+CREATE TABLE IF NOT EXISTS schema_migraciones (
+  version INT PRIMARY KEY,
+  nombre VARCHAR(64) NOT NULL,
+  aplicada_en TIMESTAMP NOT NULL
+);
+
+-- 001/002: búsqueda (ver busqueda.py): subcadenas sin acentos y prefijos
+ALTER TABLE empleados ADD COLUMN IF NOT EXISTS nombre_busqueda TEXT;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_empleados_busqueda_trgm ON empleados USING gin (nombre_busqueda gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_empleados_numero_prefijo ON empleados(numero_emp text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_empleados_busqueda_prefijo ON empleados(nombre_busqueda text_pattern_ops);
+
+-- 003: índices por forma de consulta
+CREATE INDEX IF NOT EXISTS idx_vacaciones_emp_rango ON vacaciones(empleado_id, fecha_inicial, fecha_final);
+CREATE INDEX IF NOT EXISTS idx_vacaciones_fin_ini ON vacaciones(fecha_final, fecha_inicial);
+CREATE INDEX IF NOT EXISTS idx_vacaciones_ini_id ON vacaciones(fecha_inicial, id);
+CREATE INDEX IF NOT EXISTS idx_empleados_planta_activo ON empleados(planta, activo, id);
+CREATE INDEX IF NOT EXISTS idx_empleados_activo_id ON empleados(activo, id);
+
+-- 004: saldos se llena desde vacaciones (no es SQL puro): python saldos.py --reconstruir
@@ -1,9 +1,13 @@
 from sqlalchemy import (
-    Column, Integer, String, Date, Numeric, Boolean, ForeignKey, Text,
-    create_engine
+    Column, Integer, BigInteger, String, Date, DateTime, Numeric, Boolean, ForeignKey, Text, Index,
+    LargeBinary, create_engine, event
 )
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.orm import declarative_base, deferred, relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
+import threading
+import time
 
 # ---------- Configuración de conexión ----------
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///vacaciones.db")
@@ -12,8 +16,79 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///vacaciones.db")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg2://", 1)
 
-engine = create_engine(DATABASE_URL, future=True)
+# El pool es por proceso: se reparte DB_MAX_CONNECTIONS entre los workers de gunicorn
+# y no tiene sentido que supere los hilos del worker.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "8"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or
+                   max(2, min(GUNICORN_THREADS, DB_MAX_CONNECTIONS // max(WEB_CONCURRENCY, 1))))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))   # Postgres de Render corta conexiones ociosas
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuánto esperan los hilos por una conexión."""
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._m_lock = threading.Lock()
+        self.esperas = self.timeouts = 0
+        self.espera_total = self.espera_max = 0.0
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            with self._m_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            with self._m_lock:
+                self.esperas += 1
+                self.espera_total += dt
+                self.espera_max = max(self.espera_max, dt)
+
+
+def _engine_kwargs(url: str) -> dict:
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") == "sqlite:"):
+        return {}   # SQLite en memoria: el pool por hilo de SQLAlchemy
+    kw = {"poolclass": PoolMedido, "pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW,
+          "pool_timeout": DB_POOL_TIMEOUT}
+    if not url.startswith("sqlite"):
+        kw.update(pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+    return kw
+
+engine = create_engine(DATABASE_URL, future=True, **_engine_kwargs(DATABASE_URL))
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL: lectores y el escritor no se bloquean entre sí (varios hilos en local)
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
+
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, future=True)
+
+def pool_stats() -> dict:
+    """Estado del pool de este proceso (para dimensionarlo bajo carga)."""
+    pool = engine.pool
+    out = {"clase": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        out.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                   overflow=max(pool.overflow(), 0), max_overflow=DB_MAX_OVERFLOW, timeout_s=DB_POOL_TIMEOUT)
+    if isinstance(pool, PoolMedido):
+        with pool._m_lock:
+            out.update(esperas=pool.esperas, timeouts=pool.timeouts,
+                       espera_media_ms=round(1000 * pool.espera_total / pool.esperas, 3) if pool.esperas else 0.0,
+                       espera_max_ms=round(1000 * pool.espera_max, 3))
+    return out
 Base = declarative_base()
 
 # ---------- Modelos ----------
@@ -23,12 +98,19 @@ class Empleado(Base):
     numero_emp = Column(String(32), unique=True, nullable=False)
     nombre = Column(Text, nullable=False)
     nombre_corto = Column(Text)
+    nombre_busqueda = Column(Text)     # clave_busqueda(nombre); la mantiene busqueda.py
     area = Column(String(64))
     turno = Column(String(16))         # T1/T2/T3 (si aplica)
     planta = Column(String(16))        # "Planta 1" / "Planta 3"
     foto_url = Column(Text)
     activo = Column(Boolean, default=True)
 
+    # Índices por forma de consulta (ver migraciones.py para bases existentes)
+    __table_args__ = (
+        Index("idx_empleados_planta_activo", "planta", "activo", "id"),
+        Index("idx_empleados_activo_id", "activo", "id"),
+    )
+
     def __repr__(self):
         return f"<Empleado id={self.id} num={self.numero_emp} nombre={self.nombre}>"
 
@@ -44,10 +126,102 @@ class Vacacion(Base):
 
     empleado = relationship("Empleado")
 
+    __table_args__ = (
+        Index("idx_vacaciones_emp_rango", "empleado_id", "fecha_inicial", "fecha_final"),
+        Index("idx_vacaciones_fin_ini", "fecha_final", "fecha_inicial"),
+        Index("idx_vacaciones_ini_id", "fecha_inicial", "id"),
+    )
+
     def __repr__(self):
         return f"<Vacacion id={self.id} emp={self.empleado_id} {self.fecha_inicial}→{self.fecha_final}>"
 
+class Saldo(Base):
+    """Días usados por empleado, año y tipo; lo mantiene saldos.py en la misma transacción."""
+    __tablename__ = "saldos"
+    anio = Column(Integer, primary_key=True)
+    empleado_id = Column(Integer, ForeignKey("empleados.id", ondelete="CASCADE"), primary_key=True)
+    tipo = Column(String(64), primary_key=True)
+    dias = Column(Numeric(8, 1), nullable=False, default=0)
+    periodos = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("idx_saldos_emp_anio", "empleado_id", "anio"),
+    )
+
+class DiaFestivo(Base):
+    """Día no laborable adicional a los de ley; ``planta`` vacía = todas las plantas (dias_habiles.py)."""
+    __tablename__ = "dias_festivos"
+    id = Column(Integer, primary_key=True)
+    fecha = Column(Date, nullable=False)
+    planta = Column(String(16))
+    nombre = Column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("idx_festivos_fecha_planta", "fecha", "planta", unique=True),
+    )
+
+class ReglaCapacidad(Base):
+    """Máximo de ausentes simultáneos por planta/área/turno (campo vacío = cualquiera); ver capacidad.py."""
+    __tablename__ = "reglas_capacidad"
+    id = Column(Integer, primary_key=True)
+    nombre = Column(Text)
+    planta = Column(String(16))
+    area = Column(String(64))
+    turno = Column(String(16))
+    maximo = Column(Integer, nullable=False)
+    desde = Column(Date)                                    # vigencia opcional
+    hasta = Column(Date)
+    activa = Column(Boolean, nullable=False, default=True)
+
+class Cambio(Base):
+    """Bitácora de altas/cambios/bajas de empleados y vacaciones para ``/api/cambios`` (bitacora.py)."""
+    __tablename__ = "bitacora_cambios"
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)           # versión de datos del commit que lo escribió
+    entidad = Column(String(8), nullable=False)            # vac / emp
+    entidad_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)                 # i / u / d
+    planta = Column(String(16))
+    creado_en = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("idx_bitacora_version", "version", "id"),
+        Index("idx_bitacora_entidad", "entidad", "entidad_id", "id"),
+    )
+
+class MetaDatos(Base):
+    """Contadores globales (p.ej. la versión de datos que invalida la caché del calendario)."""
+    __tablename__ = "meta_datos"
+    clave = Column(String(32), primary_key=True)
+    valor = Column(BigInteger, nullable=False, default=0)
+
+class Trabajo(Base):
+    """Trabajo en segundo plano (importaciones, lotes); ver trabajos.py."""
+    __tablename__ = "trabajos"
+    id = Column(String(32), primary_key=True)              # uuid4 hex
+    tipo = Column(String(32), nullable=False)
+    estado = Column(String(16), nullable=False)            # pendiente/corriendo/terminado/error/cancelado
+    parametros = Column(Text)                              # JSON
+    entrada = deferred(Column(LargeBinary))                # archivo subido; se borra al terminar
+    procesados = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    resultado = Column(Text)                               # JSON
+    error = Column(Text)
+    cancelar = Column(Boolean, nullable=False, default=False)
+    intentos = Column(Integer, nullable=False, default=0)
+    propietario = Column(String(96))                       # host:pid del proceso que lo corre
+    creado_en = Column(DateTime, nullable=False)
+    iniciado_en = Column(DateTime)
+    terminado_en = Column(DateTime)
+    latido = Column(DateTime)
+
+    __table_args__ = (
+        Index("idx_trabajos_estado_tipo", "estado", "tipo", "creado_en"),
+    )
+
 # ---------- Inicialización ----------
 def init_db():
-    """Crea las tablas en la base de datos si no existen."""
+    """Crea las tablas que no existan y aplica las migraciones pendientes."""
+    from migraciones import migrar
     Base.metadata.create_all(engine)
+    migrar(engine)
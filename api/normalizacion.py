@@ -0,0 +1,66 @@
+"""Normalización de nombres y plantas (compartida por la API y la importación)."""
+import re
+import unicodedata
+
+# --------- Plantas ---------
+def normalize_planta(val: str) -> str:
+    if not val: return "Planta 1"
+    s = str(val).strip().lower()
+    for tok in ["planta", "plant", "pl", "p", "#", " "]:
+        s = s.replace(tok, "")
+    s = s.strip().strip(".")
+    if s in ("1","01","uno"): return "Planta 1"
+    if s in ("3","03","tres"): return "Planta 3"
+    return "Planta 1"
+
+# --------- Nombres canónicos ---------
+def _clean_spaces(s: str) -> str:
+    return re.sub(r"\s+", " ", (s or "").strip())
+
+def canonicalize_nombre(raw: str, apellidos: str = None, nombres: str = None) -> str:
+    if apellidos is not None or nombres is not None:
+        ap = _clean_spaces(apellidos or "")
+        no = _clean_spaces(nombres or "")
+        if ap and no: return f"{ap}, {no}"
+        return _clean_spaces(no or ap)
+
+    raw = _clean_spaces(raw or "")
+    if not raw:
+        return ""
+    if "," in raw:
+        parts = [p.strip() for p in raw.split(",", 1)]
+        ap = _clean_spaces(parts[0])
+        no = _clean_spaces(parts[1] if len(parts) > 1 else "")
+        if ap and no: return f"{ap}, {no}"
+        return _clean_spaces(no or ap)
+
+    toks = raw.split(" ")
+    if len(toks) >= 3:
+        ap = " ".join(toks[-2:])
+        no = " ".join(toks[:-2])
+        return f"{_clean_spaces(ap)}, {_clean_spaces(no)}"
+    if len(toks) == 2:
+        no = toks[0]; ap = toks[1]
+        return f"{_clean_spaces(ap)}, {_clean_spaces(no)}"
+    return raw
+
+def derive_nombre_corto(nombre_canonico: str) -> str:
+    s = _clean_spaces(nombre_canonico)
+    if not s:
+        return ""
+    if "," in s:
+        ap, no = [p.strip() for p in s.split(",", 1)]
+        primer_ap = ap.split(" ")[0] if ap else ""
+        primer_no = no.split(" ")[0] if no else ""
+        out = f"{primer_no} {primer_ap}".strip()
+        return _clean_spaces(out)
+    toks = s.split(" ")
+    if len(toks) >= 2:
+        return _clean_spaces(f"{toks[0]} {toks[1]}")
+    return s
+
+# --------- Clave de búsqueda ---------
+def clave_busqueda(s: str) -> str:
+    """Minúsculas, sin acentos ni puntuación: "Vázquez, José" -> "vazquez jose"."""
+    s = unicodedata.normalize("NFKD", str(s or "")).encode("ascii", "ignore").decode()
+    return _clean_spaces(re.sub(r"[^a-z0-9]+", " ", s.lower()))
@@ -0,0 +1,72 @@
+"""Paginación por cursor (keyset) y totales cacheados por versión de datos.
+
+El cursor es opaco para el cliente: base64url del JSON con la clave de orden
+de la última fila entregada, p.ej. ``[id]`` o ``["2026-01-05", id]``. La página
+siguiente filtra ``clave < cursor`` sobre el mismo índice de orden, así que su
+costo no crece con la profundidad como ``OFFSET``.
+"""
+import base64
+import datetime
+import json
+import threading
+from collections import OrderedDict
+
+TOTALES_MAX = 512
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def encode_cursor(*clave) -> str:
+    raw = json.dumps(list(clave), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def entero(v) -> int:
+    if isinstance(v, bool) or not isinstance(v, int):
+        raise TypeError("se esperaba un entero")
+    return v
+
+def fecha_iso(v) -> datetime.date:
+    if not isinstance(v, str):
+        raise TypeError("se esperaba una fecha ISO")
+    return datetime.date.fromisoformat(v)
+
+def decode_cursor(s: str, *tipos) -> list:
+    """Decodifica un cursor cuyos componentes se convierten con ``tipos``
+    (``entero``, ``fecha_iso``); lanza ``CursorInvalido`` si la forma o algún tipo no cuadra.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+        clave = json.loads(raw)
+    except (ValueError, TypeError):
+        raise CursorInvalido("cursor inválido")
+    if not isinstance(clave, list) or len(clave) != len(tipos):
+        raise CursorInvalido("cursor inválido")
+    try:
+        return [conv(v) for conv, v in zip(tipos, clave)]
+    except (ValueError, TypeError):
+        raise CursorInvalido("cursor inválido")
+
+
+class TotalesCache:
+    """``COUNT(*)`` por filtros, válido mientras no cambie la versión de datos."""
+
+    def __init__(self, max_entries: int = TOTALES_MAX):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_count(self, key, version: int, contar) -> int:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None and hit[0] == version:
+                self._data.move_to_end(key)
+                return hit[1]
+        total = contar()
+        with self._lock:
+            self._data[key] = (version, total)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return total
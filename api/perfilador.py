@@ -0,0 +1,74 @@
+"""Perfilador por muestreo de un solo request (``?__profile=1`` + ``X-Admin-Token``).
+
+Un hilo auxiliar toma la pila del hilo que atiende el request cada
+``PROFILE_INTERVAL_MS`` con ``sys._current_frames()``; al terminar se devuelven
+las pilas colapsadas (formato de flamegraph: ``a;b;c n``) y las funciones con más
+muestras propias y acumuladas. No instrumenta nada fuera del request perfilado.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_MAX_S = float(os.getenv("PROFILE_MAX_S", "30"))
+_RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+
+def _marco(frame) -> str:
+    code = frame.f_code
+    archivo = code.co_filename
+    if archivo.startswith(_RAIZ):
+        archivo = os.path.relpath(archivo, _RAIZ)
+    else:
+        archivo = os.path.basename(archivo)
+    return f"{archivo}:{code.co_name}"
+
+
+class Muestreador:
+    def __init__(self, hilo_id: int, intervalo_ms: float = PROFILE_INTERVAL_MS):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo_ms / 1000
+        self.pilas = Counter()
+        self.muestras = 0
+        self._alto = threading.Event()
+        self._hilo = threading.Thread(target=self._correr, name="perfilador", daemon=True)
+        self._t0 = None
+
+    def iniciar(self):
+        self._t0 = time.perf_counter()
+        self._hilo.start()
+        return self
+
+    def _correr(self):
+        limite = self._t0 + PROFILE_MAX_S
+        while not self._alto.wait(self.intervalo) and time.perf_counter() < limite:
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is None:
+                continue
+            pila = []
+            while frame is not None:
+                pila.append(_marco(frame))
+                frame = frame.f_back
+            self.pilas[";".join(reversed(pila))] += 1
+            self.muestras += 1
+
+    def detener(self, top: int = 25) -> dict:
+        self._alto.set()
+        self._hilo.join()
+        duracion = time.perf_counter() - self._t0
+        propias, acumuladas = Counter(), Counter()
+        for pila, n in self.pilas.items():
+            marcos = pila.split(";")
+            propias[marcos[-1]] += n
+            for m in set(marcos):
+                acumuladas[m] += n
+        return {
+            "duracion_ms": round(duracion * 1000, 1),
+            "intervalo_ms": self.intervalo * 1000,
+            "muestras": self.muestras,
+            "propias": [{"funcion": f, "muestras": n} for f, n in propias.most_common(top)],
+            "acumuladas": [{"funcion": f, "muestras": n} for f, n in acumuladas.most_common(top)],
+            "colapsadas": [f"{p} {n}" for p, n in self.pilas.most_common()],
+        }
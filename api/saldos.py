@@ -0,0 +1,176 @@
+"""Saldo materializado de días usados por empleado, año y tipo (tabla ``saldos``).
+
+Cada vacación suma ``dias_de(...)`` (``gozo`` o, si no se capturó, los días
+naturales del periodo) al año en que inicia. La tabla se mantiene por deltas en la
+misma transacción que la escritura:
+
+* ORM (altas/ediciones/bajas individuales y alta atómica): hook ``after_flush``
+  que compara valores antes/después con el historial de atributos.
+* Rutas masivas (``lotes``, ``importador``): llaman ``aplicar`` con sus deltas.
+
+``reconstruir`` la recalcula desde cero con un solo ``INSERT ... SELECT`` agrupado
+(``python saldos.py --reconstruir``). Los reportes leen ``saldos`` por su llave
+(año, empleado), sin agregar sobre ``vacaciones``.
+"""
+import argparse
+import sys
+from collections import defaultdict
+
+from sqlalchemy import Integer, cast, delete, event, func, insert, inspect, select, and_, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Empleado, Saldo, Vacacion
+
+CAMPOS_VAC = ("empleado_id", "fecha_inicial", "fecha_final", "tipo", "gozo")
+
+
+# ---------- Regla de conteo ----------
+def dias_de(fi, ff, gozo) -> float:
+    if gozo is not None and gozo != "":
+        return float(gozo)
+    return float((ff - fi).days + 1)
+
+def _dias_sql(dialecto: str):
+    if dialecto == "sqlite":
+        naturales = cast(func.julianday(Vacacion.fecha_final) - func.julianday(Vacacion.fecha_inicial), Integer) + 1
+    else:
+        naturales = Vacacion.fecha_final - Vacacion.fecha_inicial + 1
+    return func.coalesce(Vacacion.gozo, naturales)
+
+
+# ---------- Deltas ----------
+class Deltas:
+    """Acumula ``(empleado, año, tipo) -> [días, periodos]`` antes de escribir."""
+
+    def __init__(self):
+        self.por_llave = defaultdict(lambda: [0.0, 0])
+
+    def sumar(self, empleado_id, fi, ff, tipo, gozo, signo: int = 1):
+        d = self.por_llave[(int(empleado_id), fi.year, tipo)]
+        d[0] += signo * dias_de(fi, ff, gozo)
+        d[1] += signo
+
+    def sumar_agrupado(self, empleado_id, anio, tipo, dias: float, periodos: int):
+        """Para rutas que ya agruparon (p.ej. el importador con pandas)."""
+        d = self.por_llave[(int(empleado_id), int(anio), tipo)]
+        d[0] += float(dias)
+        d[1] += int(periodos)
+
+    def __bool__(self):
+        return any(d[0] or d[1] for d in self.por_llave.values())
+
+
+def aplicar(conn, deltas: Deltas) -> None:
+    """Suma los deltas en ``saldos`` (upsert) y borra las llaves que quedan sin periodos.
+
+    ``conn`` es una ``Connection`` (con una sesión: ``db.connection()``).
+    """
+    filas = [{"anio": a, "empleado_id": e, "tipo": t, "dias": round(d, 1), "periodos": n}
+             for (e, a, t), (d, n) in deltas.por_llave.items() if d or n]
+    if not filas:
+        return
+    ins = (postgresql if conn.dialect.name == "postgresql" else sqlite).insert(Saldo)
+    conn.execute(ins.on_conflict_do_update(
+        index_elements=[Saldo.anio, Saldo.empleado_id, Saldo.tipo],
+        set_={"dias": Saldo.dias + ins.excluded.dias, "periodos": Saldo.periodos + ins.excluded.periodos}),
+        filas)
+    negativas = [(f["anio"], f["empleado_id"], f["tipo"]) for f in filas if f["periodos"] < 0]
+    for i in range(0, len(negativas), 500):
+        conn.execute(delete(Saldo).where(
+            tuple_(Saldo.anio, Saldo.empleado_id, Saldo.tipo).in_(negativas[i:i + 500]),
+            Saldo.periodos <= 0))
+
+
+# ---------- Hook ORM ----------
+def _antes(obj, campo):
+    h = inspect(obj).attrs[campo].history
+    return h.deleted[0] if h.deleted else getattr(obj, campo)
+
+def registrar_sesion(session_factory) -> None:
+    @event.listens_for(session_factory, "after_flush")
+    def _mantener(session, flush_context):
+        deltas = Deltas()
+        for obj in session.new:
+            if isinstance(obj, Vacacion):
+                deltas.sumar(*(getattr(obj, c) for c in CAMPOS_VAC))
+        for obj in session.deleted:
+            if isinstance(obj, Vacacion):
+                deltas.sumar(*(_antes(obj, c) for c in CAMPOS_VAC), signo=-1)
+        for obj in session.dirty:
+            if isinstance(obj, Vacacion) and session.is_modified(obj):
+                antes = tuple(_antes(obj, c) for c in CAMPOS_VAC)
+                despues = tuple(getattr(obj, c) for c in CAMPOS_VAC)
+                if antes != despues:
+                    deltas.sumar(*antes, signo=-1)
+                    deltas.sumar(*despues)
+        if deltas:
+            aplicar(session.connection(), deltas)
+
+
+# ---------- Reconstrucción ----------
+def reconstruir(conn) -> int:
+    """Recalcula ``saldos`` completo con una sola consulta agrupada; devuelve las filas."""
+    anio = cast(func.extract("year", Vacacion.fecha_inicial), Integer)
+    agrupado = (select(anio, Vacacion.empleado_id, Vacacion.tipo,
+                       func.sum(_dias_sql(conn.dialect.name)), func.count())
+                .group_by(anio, Vacacion.empleado_id, Vacacion.tipo))
+    conn.execute(delete(Saldo))
+    conn.execute(insert(Saldo).from_select(["anio", "empleado_id", "tipo", "dias", "periodos"], agrupado))
+    return conn.execute(select(func.count()).select_from(Saldo)).scalar()
+
+
+# ---------- Lecturas ----------
+def saldo_empleado(db, empleado_id: int, anio: int = None) -> list:
+    stmt = (select(Saldo.anio, Saldo.tipo, Saldo.dias, Saldo.periodos)
+            .where(Saldo.empleado_id == empleado_id).order_by(Saldo.anio.desc(), Saldo.tipo))
+    if anio is not None:
+        stmt = stmt.where(Saldo.anio == anio)
+    anios = {}
+    for a, tipo, dias, periodos in db.execute(stmt):
+        item = anios.setdefault(a, {"anio": a, "total": 0.0, "tipos": {}})
+        item["tipos"][tipo] = {"dias": float(dias), "periodos": periodos}
+        item["total"] += float(dias)
+    return list(anios.values())
+
+def reporte_planta(db, anio: int, planta: str = None, tipo: str = None) -> list:
+    """Empleados activos (de ``planta`` si se da) con sus días del año por tipo; incluye ceros."""
+    cond = [Saldo.empleado_id == Empleado.id, Saldo.anio == anio]
+    if tipo:
+        cond.append(Saldo.tipo == tipo)
+    stmt = (select(Empleado.id, Empleado.numero_emp, Empleado.nombre, Empleado.planta, Empleado.turno,
+                   Saldo.tipo, Saldo.dias)
+            .outerjoin(Saldo, and_(*cond))
+            .where(Empleado.activo.is_(True)).order_by(Empleado.id))
+    if planta:
+        stmt = stmt.where(Empleado.planta == planta)
+    items, actual = [], None
+    for eid, numero, nombre, e_planta, turno, t, dias in db.execute(stmt):
+        if actual is None or actual["empleado_id"] != eid:
+            actual = {"empleado_id": eid, "numero_emp": numero, "nombre": nombre, "planta": e_planta,
+                      "turno": turno, "total": 0.0, "tipos": {}}
+            items.append(actual)
+        if t is not None:
+            actual["tipos"][t] = float(dias)
+            actual["total"] += float(dias)
+    return items
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Saldos de días usados por empleado/año/tipo")
+    ap.add_argument("--reconstruir", action="store_true", help="recalcula la tabla completa")
+    args = ap.parse_args(argv)
+    if not args.reconstruir:
+        ap.print_help()
+        return 1
+    from models import engine, init_db
+    from cache_calendario import bump_version
+    init_db()
+    with engine.begin() as conn:
+        n = reconstruir(conn)
+        bump_version(conn)
+    print(f"saldos reconstruidos: {n} filas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Tablero de varias semanas con las vacaciones ya repartidas por día.
+
+Una sola consulta cubre todas las semanas; cada vacación se coloca en los días
+que toca dentro de la ventana, en el orden del tablero (nombre corto sin acentos,
+luego id). El resultado agrupado se cachea por versión de datos y de ahí salen
+tanto la respuesta completa como las páginas por día.
+
+La paginación replica la rotación del tablero: en la página ``k`` cada día muestra
+``page_size`` elementos a partir de ``(k * page_size) % total``, dando la vuelta al
+final; los días que caben en una página se muestran completos siempre.
+"""
+import os
+from datetime import date, timedelta
+
+from normalizacion import clave_busqueda, derive_nombre_corto
+
+TABLERO_MAX_SEMANAS = int(os.getenv("TABLERO_MAX_SEMANAS", "8"))
+TABLERO_PAGE_SIZE = int(os.getenv("TABLERO_PAGE_SIZE", "3"))
+
+CAMPOS = ("id", "empleado", "tipo", "gozo")
+CAMPOS_EMPLEADO = ("numero", "nombre", "nombre_corto", "planta", "turno", "area", "foto_url")
+
+
+def lunes(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def agrupar(rows, start: date, n_dias: int) -> dict:
+    """Filas con la forma de ``VAC_EMP_COLS`` -> ``{"empleados", "tipos", "dias"}``.
+
+    ``dias[i]`` es la lista de ``(id, empleado_id, tipo, gozo)`` del día ``start + i``
+    (``tipo`` es índice en ``tipos``).
+    """
+    empleados, orden, tipos, items = {}, {}, {}, []
+    base = start.toordinal()
+    for (vid, fi, ff, tipo, gozo, _fuente,
+         eid, numero, nombre, corto, e_planta, turno, area, foto) in rows:
+        if eid not in empleados:
+            corto = corto or derive_nombre_corto(nombre)
+            empleados[eid] = (numero, nombre, corto, e_planta, turno, area, foto or "/avatar.png")
+            orden[eid] = clave_busqueda(corto or nombre or "")
+        items.append((orden[eid], vid, eid, max(fi.toordinal() - base, 0),
+                      min(ff.toordinal() - base, n_dias - 1), tipos.setdefault(tipo, len(tipos)),
+                      float(gozo) if gozo is not None else None))
+    items.sort()
+    dias = [[] for _ in range(n_dias)]
+    for _, vid, eid, ini, fin, t, gozo in items:
+        item = (vid, eid, t, gozo)
+        for i in range(ini, fin + 1):
+            dias[i].append(item)
+    return {"empleados": empleados, "tipos": list(tipos), "dias": dias}
+
+
+def _rebanada(items, pagina: int, page_size: int):
+    n = len(items)
+    if n <= page_size:
+        return 0, items
+    off = (pagina * page_size) % n
+    fin = off + page_size
+    return off, items[off:fin] + items[:max(0, fin - n)]
+
+
+def cuerpo(agrupado: dict, start: date, semanas: int, pagina=None, page_size: int = TABLERO_PAGE_SIZE) -> dict:
+    """Respuesta de ``/api/tablero``; con ``pagina`` solo va la rebanada de cada día
+    y los empleados que aparecen en ella."""
+    dias, usados = [], set()
+    for i, items in enumerate(agrupado["dias"]):
+        dia = {"fecha": (start + timedelta(days=i)).isoformat(), "total": len(items),
+               "paginas": -(-len(items) // page_size)}
+        if pagina is not None:
+            dia["offset"], items = _rebanada(items, pagina, page_size)
+        dia["items"] = items
+        usados.update(it[1] for it in items)
+        dias.append(dia)
+    empleados = agrupado["empleados"]
+    if pagina is not None:
+        empleados = {eid: empleados[eid] for eid in usados}
+    return {"ok": True, "start": start.isoformat(),
+            "end": (start + timedelta(days=len(dias) - 1)).isoformat(), "semanas": semanas,
+            "pagina": pagina, "page_size": page_size, "campos": CAMPOS,
+            "campos_empleado": CAMPOS_EMPLEADO, "tipos": agrupado["tipos"],
+            "empleados": empleados, "dias": dias}
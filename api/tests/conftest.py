@@ -0,0 +1,32 @@
+"""Entorno de pruebas: BD SQLite temporal y presupuesto SQL estricto.
+
+Casi todos los módulos leen su configuración al importarse, así que el entorno se
+fija aquí, antes de que cualquier prueba importe ``app``.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TMP = tempfile.mkdtemp(prefix="vacaciones-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'pruebas.db')}"
+os.environ["SQL_BUDGET_STRICT"] = "1"
+os.environ["AVATAR_DIR"] = os.path.join(_TMP, "avatares")
+sys.path.insert(0, API)
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    import app
+    flask_app = app.create_app(servicios=False)
+    flask_app.config["TESTING"] = True
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def tmp_db_url(tmp_path):
+    """URL de una BD SQLite vacía, para scripts que corren en su propio proceso."""
+    return f"sqlite:///{tmp_path / 'bd.db'}"
@@ -0,0 +1,89 @@
+"""Las rutas con ``@presupuesto_sql`` ejecutan las mismas sentencias con N y 10·N filas.
+
+Con ``SQL_BUDGET_STRICT=1`` (ver ``conftest``) pasar del presupuesto ya es un 500;
+además aquí se exige que el conteo no dependa de cuántas filas devuelve la ruta,
+que es lo que delata un N+1 aunque quepa en el presupuesto con pocos datos.
+"""
+from datetime import date, timedelta
+
+from conteo_sql import contar_sentencias
+
+N = 15
+INICIO = date(2026, 3, 2)
+FIN = INICIO + timedelta(days=27)
+PLANTA = "Planta 1"
+
+
+def _ops(emp_ids, desde, inicio=INICIO):
+    """Una vacación de 3 días por empleado, escalonadas a partir de ``inicio``."""
+    ops = []
+    for k, eid in enumerate(emp_ids):
+        fi = inicio + timedelta(days=(desde + k) % 25)
+        ops.append({"op": "create", "empleado_id": eid, "fecha_inicial": fi.isoformat(),
+                    "fecha_final": (fi + timedelta(days=2)).isoformat()})
+    return ops
+
+def _sembrar_empleados(cliente, desde, hasta):
+    ids = []
+    for i in range(desde, hasta):
+        r = cliente.post("/api/empleados", json={"numero_emp": f"T{i:05d}", "nombre": f"PRUEBA{i}, EMPLEADO",
+                                                  "planta": PLANTA, "turno": str(1 + i % 3), "area": "Ensamble"})
+        assert r.status_code == 200, r.get_json()
+        ids.append(r.get_json()["id"])
+    return ids
+
+
+def _peticiones(ids, cursor_cambios):
+    """Petición representativa por endpoint presupuestado: ``(método, url, json)``.
+
+    El lote (en seco, fuera de la ventana) lleva una operación por empleado.
+    """
+    emp_id = ids[0]
+    rango = f"start={INICIO}&end={FIN}"
+    return {
+        "api.calendario": ("GET", f"/api/calendario?{rango}", None),
+        "api.tablero_semanas": ("GET", f"/api/tablero?start={INICIO}&weeks=4", None),
+        "api.analitica_cobertura": ("GET", f"/api/analitica/cobertura?{rango}&group_by=planta,turno", None),
+        "api.empleados_list": ("GET", "/api/empleados?size=100", None),
+        # Segunda palabra del nombre: pasa por los tres niveles de la búsqueda con N y con 10·N
+        "api.empleados_buscar": ("GET", "/api/empleados/buscar?q=empleado&limit=50", None),
+        "api.vacaciones_list": ("GET", f"/api/vacaciones?{rango}&size=100", None),
+        "api.vacaciones_batch": ("POST", "/api/vacaciones/batch?dry_run=1",
+                                 {"operaciones": _ops(ids, 0, FIN + timedelta(days=30))}),
+        "api.saldos_empleado": ("GET", f"/api/saldos/empleado/{emp_id}?anio={INICIO.year}", None),
+        "api.saldos_planta": ("GET", f"/api/saldos?anio={INICIO.year}&planta={PLANTA}", None),
+        "api.capacidad_simular": ("POST", "/api/capacidad/simular",
+                                  {"rangos": [{"empleado_id": emp_id, "fecha_inicial": str(INICIO),
+                                               "fecha_final": str(FIN)}]}),
+        "api.cambios_desde": ("GET", f"/api/cambios?since={cursor_cambios}", None),
+        "api.dias_habiles_rango": ("GET", f"/api/dias-habiles?{rango}&planta={PLANTA}&detalle=1", None),
+    }
+
+def _medir(cliente, peticiones) -> dict:
+    out = {}
+    for endpoint, (metodo, url, cuerpo) in peticiones.items():
+        with contar_sentencias() as c:
+            r = cliente.open(url, method=metodo, json=cuerpo)
+        assert r.status_code == 200, (endpoint, r.status_code, r.get_data(as_text=True)[:300])
+        out[endpoint] = c.n
+    return out
+
+
+def test_sentencias_constantes_con_n_y_10n(cliente):
+    vistas = cliente.application.view_functions
+    presupuestadas = {e for e, fn in vistas.items() if hasattr(fn, "presupuesto_sql")}
+
+    r = cliente.get("/api/cambios")
+    cursor_cambios = r.get_json()["cursor"]
+
+    ids = _sembrar_empleados(cliente, 0, N)
+    assert cliente.post("/api/vacaciones/batch", json={"operaciones": _ops(ids, 0)}).status_code == 200
+    peticiones = _peticiones(ids, cursor_cambios)
+    assert presupuestadas == set(peticiones), "agrega aquí una petición para cada ruta con @presupuesto_sql"
+    con_n = _medir(cliente, peticiones)
+
+    ids += _sembrar_empleados(cliente, N, 10 * N)
+    assert cliente.post("/api/vacaciones/batch", json={"operaciones": _ops(ids[N:], N)}).status_code == 200
+    con_10n = _medir(cliente, _peticiones(ids, cursor_cambios))
+
+    assert con_10n == con_n
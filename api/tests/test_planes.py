@@ -0,0 +1,25 @@
+"""Regresión de planes: ``verificar_planes.py`` sobre una base sembrada, sin recorridos completos."""
+import os
+import subprocess
+import sys
+
+from conftest import API
+
+
+def test_endpoints_sin_recorridos(tmp_db_url):
+    env = dict(os.environ, DATABASE_URL=tmp_db_url, SQL_BUDGET_STRICT="0")
+    p = subprocess.run([sys.executable, "verificar_planes.py", "--seed", "2000"],
+                       cwd=API, env=env, capture_output=True, text=True, timeout=600)
+    assert p.returncode == 0, p.stdout[-4000:] + p.stderr[-2000:]
+
+
+def test_recorrido_de_indice_completo_falla(cliente):
+    from models import engine
+    import verificar_planes
+    malos = verificar_planes.recorridos(
+        engine, "SELECT version, id FROM bitacora_cambios ORDER BY version, id", ())
+    assert malos and "USING COVERING INDEX" in malos[0]
+    # El mismo índice con la forma permitida (última entrada) sí pasa
+    assert not verificar_planes.recorridos(
+        engine, "SELECT bitacora_cambios.version, bitacora_cambios.id FROM bitacora_cambios "
+                "ORDER BY bitacora_cambios.version DESC, bitacora_cambios.id DESC LIMIT 1", ())
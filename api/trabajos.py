@@ -0,0 +1,347 @@
+"""Trabajos en segundo plano persistidos en la BD (importaciones, lotes grandes).
+
+Un endpoint crea la fila en ``trabajos`` (estado ``pendiente``, con la entrada:
+archivo o parámetros) y responde de inmediato con su id. En cada proceso un hilo
+despachador toma pendientes con un ``UPDATE ... WHERE estado = 'pendiente'``
+condicionado a que no se exceda el límite de su tipo (contando los ``corriendo``
+de todos los procesos) y los corre en un pool acotado de hilos
+(``JOBS_WORKERS`` por proceso).
+
+Cada tipo se registra con ``ejecutor.registrar(tipo, fn, limite)``; ``fn(db, avance)``
+hace su trabajo en la sesión ``db`` (incluido el commit) y devuelve el resultado.
+``avance(procesados, total)`` publica el progreso y lanza ``TrabajoCancelado`` si
+se pidió cancelar; la transacción del trabajo se descarta entera.
+
+Si el proceso muere con un trabajo a medias, su transacción nunca llega a commit:
+otro proceso (o el mismo al reiniciar) lo ve sin latido y lo vuelve a poner en
+cola hasta ``JOBS_MAX_INTENTOS`` veces. En SQLite la transacción del trabajo
+bloquea las demás escrituras, así que el progreso y el latido solo se guardan en
+memoria mientras corre (``GET /api/jobs/<id>`` los ve en el proceso dueño).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased
+
+from codificacion import dumps
+from models import Trabajo
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_POLL_S = float(os.getenv("JOBS_POLL_S", "2"))
+JOBS_STALE_S = float(os.getenv("JOBS_STALE_S", "120"))
+JOBS_MAX_INTENTOS = int(os.getenv("JOBS_MAX_INTENTOS", "2"))
+JOBS_PROGRESS_S = float(os.getenv("JOBS_PROGRESS_S", "1"))
+JOBS_RETENCION_DIAS = int(os.getenv("JOBS_RETENCION_DIAS", "14"))
+
+PENDIENTE, CORRIENDO, TERMINADO, ERROR, CANCELADO = (
+    "pendiente", "corriendo", "terminado", "error", "cancelado")
+FINALES = (TERMINADO, ERROR, CANCELADO)
+
+log = logging.getLogger("trabajos")
+
+
+class TrabajoCancelado(Exception):
+    pass
+
+
+class TrabajoFallido(Exception):
+    """Error esperado del trabajo; ``resultado`` (opcional) se guarda junto al mensaje."""
+
+    def __init__(self, msg, resultado=None):
+        super().__init__(msg)
+        self.resultado = resultado
+
+
+class CancelacionOcupada(Exception):
+    """SQLite: el trabajo corre en otro proceso y tiene el candado de escritura; reintentar."""
+
+
+def _ahora():
+    return datetime.utcnow()
+
+def _limites_env() -> dict:
+    """``JOBS_LIMITES=importar=1,lote=2`` sobrescribe el límite registrado por tipo."""
+    out = {}
+    for parte in os.getenv("JOBS_LIMITES", "").split(","):
+        tipo, _, n = parte.partition("=")
+        if tipo.strip() and n.strip().isdigit():
+            out[tipo.strip()] = int(n)
+    return out
+
+
+class Avance:
+    """Progreso de un trabajo en curso; se pasa a la función del tipo."""
+
+    def __init__(self, ejecutor, trabajo_id: str, parametros: dict):
+        self._ejecutor = ejecutor
+        self.trabajo_id = trabajo_id
+        self.parametros = parametros
+        self.procesados = 0
+        self.total = None
+        self.cancelado = False
+        self._ultimo = _ahora()
+
+    def entrada(self) -> bytes:
+        with self._ejecutor.engine.connect() as conn:
+            return conn.execute(select(Trabajo.entrada).where(Trabajo.id == self.trabajo_id)).scalar()
+
+    def __call__(self, procesados: int, total: int = None):
+        self.procesados = procesados
+        if total is not None:
+            self.total = total
+        ahora = _ahora()
+        if self._ejecutor.persistir_progreso and ahora - self._ultimo >= timedelta(seconds=JOBS_PROGRESS_S):
+            self._ultimo = ahora
+            with self._ejecutor.engine.begin() as conn:
+                conn.execute(update(Trabajo).where(Trabajo.id == self.trabajo_id)
+                             .values(procesados=self.procesados, total=self.total, latido=ahora))
+                if conn.execute(select(Trabajo.cancelar).where(Trabajo.id == self.trabajo_id)).scalar():
+                    self.cancelado = True
+        if self.cancelado:
+            raise TrabajoCancelado()
+
+
+class Ejecutor:
+    def __init__(self, SessionLocal, engine, workers: int = JOBS_WORKERS):
+        self.SessionLocal = SessionLocal
+        self.engine = engine
+        self.workers = workers
+        # En SQLite la transacción del trabajo tiene el candado de escritura
+        self.persistir_progreso = engine.dialect.name != "sqlite"
+        self.propietario = self._propietario()
+        self._tipos = {}
+        self._vivos = {}          # id -> Avance de los trabajos que corre este proceso
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._pool = None
+        self._hilo = None
+        self.completados = self.fallidos = self.cancelados = 0
+
+    def registrar(self, tipo: str, fn, limite: int = 1):
+        self._tipos[tipo] = (fn, _limites_env().get(tipo, limite))
+
+    # ---------- API para los endpoints ----------
+    def enviar(self, tipo: str, parametros: dict = None, entrada: bytes = None) -> str:
+        if tipo not in self._tipos:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        tid = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            conn.execute(Trabajo.__table__.insert().values(
+                id=tid, tipo=tipo, estado=PENDIENTE, parametros=dumps(parametros or {}).decode("utf-8"),
+                entrada=entrada, procesados=0, cancelar=False, intentos=0, creado_en=_ahora()))
+        self._despertar.set()
+        return tid
+
+    def estado(self, tid: str, con_resultado: bool = True):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(*self._columnas(con_resultado)).where(Trabajo.id == tid)).mappings().first()
+        return self._a_dict(row, con_resultado) if row else None
+
+    def listar(self, tipo: str = None, estado: str = None, limite: int = 50) -> list:
+        stmt = select(*self._columnas(False)).order_by(Trabajo.creado_en.desc()).limit(limite)
+        if tipo:
+            stmt = stmt.where(Trabajo.tipo == tipo)
+        if estado:
+            stmt = stmt.where(Trabajo.estado == estado)
+        with self.engine.connect() as conn:
+            return [self._a_dict(r, False) for r in conn.execute(stmt).mappings()]
+
+    def cancelar(self, tid: str):
+        """Pendiente -> cancelado de inmediato; corriendo -> se detiene en el siguiente avance."""
+        with self._lock:
+            vivo = self._vivos.get(tid)
+        if vivo is not None:
+            vivo.cancelado = True
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(update(Trabajo).where(Trabajo.id == tid, Trabajo.estado == PENDIENTE)
+                             .values(estado=CANCELADO, cancelar=True, terminado_en=_ahora(), entrada=None))
+                conn.execute(update(Trabajo).where(Trabajo.id == tid, Trabajo.estado == CORRIENDO)
+                             .values(cancelar=True))
+        except OperationalError:
+            # SQLite: la escritura espera al trabajo en curso; si corre aquí, el aviso en
+            # memoria basta; si corre en otro worker, no hay cómo avisarle hasta que suelte la BD
+            if vivo is None:
+                raise CancelacionOcupada(tid)
+            log.warning("cancelación de %s solo en memoria", tid)
+        return self.estado(tid, con_resultado=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            corriendo = len(self._vivos)
+        return {"corriendo": corriendo, "completados": self.completados,
+                "fallidos": self.fallidos, "cancelados": self.cancelados}
+
+    @staticmethod
+    def _columnas(con_resultado: bool):
+        cols = [Trabajo.id, Trabajo.tipo, Trabajo.estado, Trabajo.procesados, Trabajo.total,
+                Trabajo.error, Trabajo.cancelar, Trabajo.intentos, Trabajo.creado_en,
+                Trabajo.iniciado_en, Trabajo.terminado_en]
+        return cols + [Trabajo.resultado] if con_resultado else cols
+
+    def _a_dict(self, row, con_resultado: bool) -> dict:
+        out = {k: row[k] for k in ("id", "tipo", "estado", "procesados", "total", "error", "intentos")}
+        out["cancelar"] = bool(row["cancelar"])
+        for k in ("creado_en", "iniciado_en", "terminado_en"):
+            out[k] = row[k].isoformat() + "Z" if row[k] else None
+        with self._lock:
+            vivo = self._vivos.get(row["id"])
+        if vivo is not None:
+            out["procesados"], out["total"] = vivo.procesados, vivo.total
+            out["cancelar"] = out["cancelar"] or vivo.cancelado
+        if con_resultado:
+            out["resultado"] = json.loads(row["resultado"]) if row["resultado"] else None
+        return out
+
+    # ---------- Despacho ----------
+    @staticmethod
+    def _propietario() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"[:96]
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        # Si se construyó en el maestro de gunicorn (preload), el pid es el del worker
+        self.propietario = self._propietario()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="trabajo")
+        self._hilo = threading.Thread(target=self._bucle, name="trabajos", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self):
+        ciclos = 0
+        while True:
+            try:
+                self._recuperar_huerfanos()
+                self._tomar_pendientes()
+                if ciclos % 1800 == 0:
+                    self._purgar()
+            except OperationalError as e:
+                # SQLite ocupado por la transacción de un trabajo: se reintenta en el siguiente ciclo
+                log.debug("despachador de trabajos: %s", e)
+            except Exception:
+                log.exception("despachador de trabajos")
+            ciclos += 1
+            self._despertar.wait(JOBS_POLL_S)
+            self._despertar.clear()
+
+    def _tomar_pendientes(self):
+        for tipo, (_fn, limite) in self._tipos.items():
+            while True:
+                with self._lock:
+                    if len(self._vivos) >= self.workers:
+                        return
+                tid = self._reclamar(tipo, limite)
+                if tid is None:
+                    break
+                with self.engine.connect() as conn:
+                    params = conn.execute(select(Trabajo.parametros).where(Trabajo.id == tid)).scalar()
+                avance = Avance(self, tid, json.loads(params or "{}"))
+                with self._lock:
+                    self._vivos[tid] = avance
+                self._pool.submit(self._correr, tipo, avance)
+
+    def _reclamar(self, tipo: str, limite: int):
+        """Marca como ``corriendo`` el pendiente más antiguo del tipo si hay cupo; devuelve su id."""
+        otro = aliased(Trabajo)
+        corriendo = (select(func.count()).select_from(otro)
+                     .where(otro.tipo == tipo, otro.estado == CORRIENDO).scalar_subquery())
+        with self.engine.begin() as conn:
+            tid = conn.execute(select(Trabajo.id).where(Trabajo.tipo == tipo, Trabajo.estado == PENDIENTE)
+                               .order_by(Trabajo.creado_en).limit(1)).scalar()
+            if tid is None:
+                return None
+            ahora = _ahora()
+            res = conn.execute(update(Trabajo)
+                               .where(Trabajo.id == tid, Trabajo.estado == PENDIENTE, corriendo < limite)
+                               .values(estado=CORRIENDO, propietario=self.propietario, iniciado_en=ahora,
+                                       latido=ahora, intentos=Trabajo.intentos + 1)
+                               .execution_options(synchronize_session=False))
+            return tid if res.rowcount == 1 else None
+
+    def _correr(self, tipo: str, avance: Avance):
+        fn = self._tipos[tipo][0]
+        tid = avance.trabajo_id
+        db = self.SessionLocal()
+        try:
+            resultado = fn(db, avance)
+            self._terminar(tid, TERMINADO, procesados=avance.procesados, total=avance.total,
+                           resultado=dumps(resultado).decode("utf-8") if resultado is not None else None)
+            self._contar("completados")
+        except TrabajoCancelado:
+            db.rollback()
+            self._terminar(tid, CANCELADO, procesados=avance.procesados, total=avance.total, cancelar=True)
+            self._contar("cancelados")
+        except TrabajoFallido as e:
+            db.rollback()
+            self._terminar(tid, ERROR, error=str(e),
+                           resultado=dumps(e.resultado).decode("utf-8") if e.resultado is not None else None)
+            self._contar("fallidos")
+        except Exception as e:
+            db.rollback()
+            log.exception("trabajo %s (%s) falló", tid, tipo)
+            self._terminar(tid, ERROR, error=f"Error interno: {e.__class__.__name__}")
+            self._contar("fallidos")
+        finally:
+            db.close()
+            with self._lock:
+                self._vivos.pop(tid, None)
+            self._despertar.set()
+
+    def _contar(self, nombre: str):
+        with self._lock:
+            setattr(self, nombre, getattr(self, nombre) + 1)
+
+    def _terminar(self, tid: str, estado: str, **valores):
+        with self.engine.begin() as conn:
+            conn.execute(update(Trabajo).where(Trabajo.id == tid)
+                         .values(estado=estado, terminado_en=_ahora(), latido=None, entrada=None, **valores))
+
+    def _recuperar_huerfanos(self):
+        """Corriendo sin latido reciente y cuyo proceso ya no existe: reintento o error."""
+        limite = _ahora() - timedelta(seconds=JOBS_STALE_S)
+        host = socket.gethostname()
+        with self._lock:
+            propios = set(self._vivos)
+        if self.persistir_progreso and propios:
+            with self.engine.begin() as conn:
+                conn.execute(update(Trabajo).where(Trabajo.id.in_(propios)).values(latido=_ahora()))
+        with self.engine.connect() as conn:
+            filas = conn.execute(select(Trabajo.id, Trabajo.propietario, Trabajo.intentos, Trabajo.latido)
+                                 .where(Trabajo.estado == CORRIENDO)).all()
+        for tid, dueno, intentos, latido in filas:
+            if tid in propios or not self._huerfano(dueno, latido, limite, host):
+                continue
+            valores = ({"estado": PENDIENTE, "propietario": None} if intentos < JOBS_MAX_INTENTOS else
+                       {"estado": ERROR, "error": "Interrumpido (el proceso terminó)", "terminado_en": _ahora()})
+            with self.engine.begin() as conn:
+                conn.execute(update(Trabajo).where(Trabajo.id == tid, Trabajo.estado == CORRIENDO,
+                                                   Trabajo.propietario == dueno).values(**valores))
+            log.warning("trabajo %s huérfano de %s -> %s", tid, dueno, valores["estado"])
+
+    def _huerfano(self, dueno: str, latido, limite, host: str) -> bool:
+        d_host, _, d_pid = (dueno or "").rpartition(":")
+        if d_host == host and d_pid.isdigit():
+            # Mismo host: se sabe con certeza si el proceso vive
+            if int(d_pid) == os.getpid():
+                return True
+            try:
+                os.kill(int(d_pid), 0)
+                return False
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                return False
+        return latido is None or latido < limite
+
+    def _purgar(self):
+        antes = _ahora() - timedelta(days=JOBS_RETENCION_DIAS)
+        with self.engine.begin() as conn:
+            conn.execute(delete(Trabajo).where(Trabajo.estado.in_(FINALES), Trabajo.terminado_en < antes))
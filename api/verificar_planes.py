@@ -0,0 +1,143 @@
+"""Regresión de planes: falla si alguna consulta de los endpoints recorre una tabla completa.
+
+Ejecuta los endpoints de lectura con el cliente de pruebas de Flask, captura las
+sentencias SELECT que emiten y corre EXPLAIN sobre cada una:
+
+* SQLite: ``EXPLAIN QUERY PLAN``; falla con cualquier ``SCAN <tabla>`` sobre las
+  tablas grandes, también ``SCAN ... USING [COVERING] INDEX`` (recorre el índice
+  completo), salvo los casos justificados en ``PERMITIDOS``.
+* Postgres: ``EXPLAIN (FORMAT JSON)``; falla con ``Seq Scan`` sobre tablas grandes.
+
+Uso (sobre una base de pruebas, nunca la de producción)::
+
+    DATABASE_URL=sqlite:////tmp/planes.db python verificar_planes.py --seed 20000
+
+``tests/test_planes.py`` lo corre así sobre una base temporal sembrada.
+
+``--seed N`` inserta N empleados y ~10N vacaciones (``generador.py``) si la base está vacía.
+Sale con código 1 si encuentra algún recorrido secuencial.
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+TABLAS = ("empleados", "vacaciones", "saldos", "bitacora_cambios")
+
+# (detalle del plan, fragmento del SQL) -> por qué ese recorrido está acotado
+PERMITIDOS = {
+    ("SCAN bitacora_cambios USING COVERING INDEX idx_bitacora_version",
+     "ORDER BY bitacora_cambios.version DESC, bitacora_cambios.id DESC LIMIT"):
+        "cursor_actual: lee solo la última entrada del índice",
+}
+
+
+def sembrar(engine, n_emp: int, hoy: date) -> None:
+    from generador import generar
+    generar(engine, n_emp, n_emp * 10, hoy=hoy)
+
+
+def capturar(app, engine, urls):
+    """Devuelve ``[(url, sql, params)]`` de los SELECT emitidos por cada URL."""
+    capturadas = []
+    actual = {"url": None}
+
+    def _on(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            capturadas.append((actual["url"], statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _on)
+    try:
+        client = app.test_client()
+        for url in urls:
+            actual["url"] = url
+            r = client.get(url)
+            if r.status_code >= 400:
+                raise SystemExit(f"{url} respondió {r.status_code}: {r.get_data(as_text=True)[:200]}")
+    finally:
+        event.remove(engine, "before_cursor_execute", _on)
+    return capturadas
+
+
+def _permitido(detalle: str, sql: str) -> bool:
+    plano = " ".join(sql.split())
+    return any(detalle == d and fragmento in plano for d, fragmento in PERMITIDOS)
+
+def recorridos(engine, sql, params):
+    """Lista de descripciones de recorridos secuenciales en el plan de ``sql``."""
+    malos = []
+    with engine.connect() as conn:
+        raw = conn.connection.driver_connection
+        cur = raw.cursor()
+        if engine.dialect.name == "sqlite":
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+            for row in cur.fetchall():
+                det = row[-1]
+                if det.startswith("SCAN ") and det.split()[1] in TABLAS and not _permitido(det, sql):
+                    malos.append(det)
+        else:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            def walk(nodo):
+                if nodo.get("Node Type") == "Seq Scan" and nodo.get("Relation Name") in TABLAS:
+                    malos.append(f"Seq Scan on {nodo['Relation Name']}")
+                for hijo in nodo.get("Plans", ()):
+                    walk(hijo)
+            walk(plan[0]["Plan"])
+        cur.close()
+    return malos
+
+
+def urls_endpoints(hoy: date, cursor: str = None):
+    """``cursor`` (de ``/api/cambios``) agrega la consulta de deltas."""
+    s, e = hoy.isoformat(), (hoy + timedelta(days=13)).isoformat()
+    urls = [
+        f"/api/calendario?start={s}&end={e}",
+        f"/api/calendario?start={s}&end={e}&planta=Planta 3",
+        f"/api/calendario?start={s}&end={e}&q=maria",
+        "/api/empleados",
+        "/api/empleados?planta=Planta 1",
+        "/api/empleados?q=garcia lopez",
+        "/api/empleados/buscar?q=hernandez",
+        "/api/empleados/buscar?q=1001",
+        f"/api/vacaciones?start={s}&end={e}",
+        f"/api/vacaciones?start={s}&end={e}&planta=Planta 1&size=100",
+        f"/api/tablero?anchor={s}",
+        f"/api/tablero?anchor={s}&planta=Planta 1&q=maria",
+        f"/api/saldos?anio={hoy.year}&planta=Planta 1",
+        f"/api/saldos/empleado/1?anio={hoy.year}",
+        "/api/cambios",
+        "/api/cambios?planta=Planta 1",
+    ]
+    if cursor:
+        urls += [f"/api/cambios?since={cursor}", f"/api/cambios?since={cursor}&planta=Planta 3"]
+    return urls
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--seed", type=int, default=0, help="empleados a generar si la base está vacía")
+    ap.add_argument("--hoy", default="2022-06-01", help="fecha ancla de las ventanas consultadas")
+    args = ap.parse_args(argv)
+
+    from models import engine
+    import app as app_mod
+    flask_app = app_mod.create_app(servicios=False)   # crea el esquema antes de sembrar
+    hoy = date.fromisoformat(args.hoy)
+    if args.seed:
+        sembrar(engine, args.seed, hoy)
+
+    cursor = flask_app.test_client().get("/api/cambios").get_json()["cursor"]
+    fallas = 0
+    for url, sql, params in capturar(flask_app, engine, urls_endpoints(hoy, cursor)):
+        malos = recorridos(engine, sql, params)
+        if malos:
+            fallas += 1
+            print(f"FALLA {url}\n  {' '.join(sql.split())[:200]}\n  -> {'; '.join(malos)}")
+    print("OK: ningún recorrido secuencial" if not fallas else f"{fallas} consultas con recorrido secuencial")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -62,6 +62,29 @@ tabVac.onclick = (ev)=>{
   saveVacState();
 };
 
+// ----- Filas de las tablas (con textContent: los datos son capturados)
+function fila(id, valores, claseBoton){
+  const tr = document.createElement("tr");
+  tr.dataset.id = id;
+  for (const v of valores) {
+    const td = document.createElement("td");
+    td.textContent = v ?? "";
+    tr.appendChild(td);
+  }
+  const btn = document.createElement("button");
+  btn.type = "button"; btn.className = claseBoton; btn.dataset.id = id; btn.textContent = "Editar";
+  tr.appendChild(document.createElement("td")).appendChild(btn);
+  return tr;
+}
+function filaEmpleado(e){
+  return fila(e.id, [e.numero_emp, e.nombre, e.planta, e.turno], "emp_edit");
+}
+function filaVacacion(v){
+  const tr = fila(v.id, [v.id, v.numero_emp, v.nombre, v.fecha_inicial, v.fecha_final, v.tipo, v.gozo], "vac_edit");
+  tr.dataset.emp = v.empleado_id;
+  return tr;
+}
+
 // ----- Empleados: listado/búsqueda/paginación
 const emp_q = document.getElementById("emp_q");
 const emp_planta = document.getElementById("emp_planta");
@@ -73,6 +96,8 @@ const emp_page = document.getElementById("emp_page");
 const emp_tbody = document.getElementById("emp_tbody");
 
 let empPage = 1, empSize = 20, empTotal = 0;
+// Cursores keyset: empCursors[n-1] abre la página n ("" = primera)
+let empCursors = [""], empHasNext = false;
 
 function saveEmpState(){
   try{
@@ -80,7 +105,6 @@ function saveEmpState(){
       q: emp_q.value || "",
       planta: emp_planta.value || "",
       turno: emp_turno.value || "",
-      page: empPage,
       size: empSize
     }));
   }catch{}
@@ -93,7 +117,6 @@ function loadEmpState(){
     if (st.q != null) emp_q.value = st.q;
     if (st.planta != null) emp_planta.value = st.planta;
     if (st.turno != null) emp_turno.value = st.turno;
-    if (st.page) empPage = Math.max(1, parseInt(st.page,10)||1);
     if (st.size) empSize = Math.max(1, Math.min(100, parseInt(st.size,10)||20));
   }catch{}
 }
@@ -104,22 +127,17 @@ async function loadEmpleados() {
     q: emp_q.value || "",
     planta: emp_planta.value || "",
     turno: emp_turno.value || "",
-    page: empPage, size: empSize
+    cursor: empCursors[empPage-1] ?? "", size: empSize
   });
   try {
     const data = await fetchJSON(`${window.API_BASE}/api/empleados?` + qs.toString());
     empTotal = data.total || 0;
     const maxp = Math.max(1, Math.ceil(empTotal/empSize));
-    if (empPage > maxp) { empPage = maxp; saveEmpState(); return loadEmpleados(); }
-
-    emp_page.textContent = `Página ${data.page} / ${maxp}`;
-    emp_tbody.innerHTML = "";
-    (data.items || []).forEach(e => {
-      const tr = document.createElement("tr");
-      tr.innerHTML = `<td>${e.numero_emp}</td><td>${e.nombre}</td><td>${e.planta||""}</td><td>${e.turno||""}</td>
-        <td><button data-id="${e.id}" class="emp_edit" type="button">Editar</button></td>`;
-      emp_tbody.appendChild(tr);
-    });
+    empHasNext = !!data.next_cursor;
+    if (empHasNext) empCursors[empPage] = data.next_cursor;
+
+    emp_page.textContent = `Página ${empPage} / ${maxp}`;
+    emp_tbody.replaceChildren(...(data.items || []).map(filaEmpleado));
     setMsg("");
     saveEmpState();
   } catch (err) {
@@ -127,9 +145,9 @@ async function loadEmpleados() {
     console.error(err);
   }
 }
-emp_buscar.onclick = (ev)=>{ ev.preventDefault(); empPage = 1; saveEmpState(); loadEmpleados(); };
+emp_buscar.onclick = (ev)=>{ ev.preventDefault(); empPage = 1; empCursors = [""]; saveEmpState(); loadEmpleados(); };
 emp_prev.onclick = (ev)=>{ ev.preventDefault(); if(empPage>1){ empPage--; saveEmpState(); loadEmpleados(); } };
-emp_next.onclick = (ev)=>{ ev.preventDefault(); const maxp = Math.max(1, Math.ceil(empTotal/empSize)); if(empPage<maxp){ empPage++; saveEmpState(); loadEmpleados(); } };
+emp_next.onclick = (ev)=>{ ev.preventDefault(); if(empHasNext){ empPage++; saveEmpState(); loadEmpleados(); } };
 emp_q.addEventListener("input", ()=>{ saveEmpState(); });
 emp_planta.addEventListener("change", ()=>{ saveEmpState(); });
 emp_turno.addEventListener("change", ()=>{ saveEmpState(); });
@@ -164,7 +182,22 @@ document.getElementById("e_emp_save").onclick = async (ev)=>{
       method:"PUT", headers:{'Content-Type':'application/json'}, body:JSON.stringify(payload)
     });
     setMsg("Empleado guardado.");
-    await loadEmpleados();
+    await sincronizar();
+  }catch(err){ setMsg("Error: " + err.message); }
+};
+document.getElementById("e_emp_foto_subir").onclick = async (ev)=>{
+  ev.preventDefault();
+  try{
+    const id = document.getElementById("e_emp_id").value;
+    if(!id) throw new Error("Selecciona un empleado de la lista.");
+    const file = document.getElementById("e_emp_foto_file").files[0];
+    if(!file) throw new Error("Elige una imagen.");
+    const fd = new FormData();
+    fd.append("file", file);
+    const data = await fetchJSON(`${window.API_BASE}/api/empleados/${id}/avatar`, { method:"POST", body:fd });
+    document.getElementById("e_emp_foto").value = data.foto_url;
+    setMsg("Foto actualizada.");
+    await sincronizar();
   }catch(err){ setMsg("Error: " + err.message); }
 };
 document.getElementById("e_emp_delete").onclick = async (ev)=>{
@@ -175,7 +208,7 @@ document.getElementById("e_emp_delete").onclick = async (ev)=>{
     if(!confirm("¿Borrar (inactivar) empleado?")) return;
     await fetchJSON(`${window.API_BASE}/api/empleados/${id}`, { method:"DELETE" });
     setMsg("Empleado borrado (inactivado).");
-    await loadEmpleados();
+    await sincronizar();
   }catch(err){ setMsg("Error: " + err.message); }
 };
 
@@ -191,6 +224,8 @@ const vac_page = document.getElementById("vac_page");
 const vac_tbody = document.getElementById("vac_tbody");
 
 let vacPage = 1, vacSize = 20, vacTotal = 0;
+// Cursores keyset: vacCursors[n-1] abre la página n ("" = primera)
+let vacCursors = [""], vacHasNext = false;
 
 function saveVacState(){
   try{
@@ -199,7 +234,6 @@ function saveVacState(){
       planta: vac_planta.value || "",
       start: vac_start.value || "",
       end: vac_end.value || "",
-      page: vacPage,
       size: vacSize
     }));
   }catch{}
@@ -213,7 +247,6 @@ function loadVacState(){
     if (st.planta != null) vac_planta.value = st.planta;
     if (st.start) vac_start.value = st.start;
     if (st.end) vac_end.value = st.end;
-    if (st.page) vacPage = Math.max(1, parseInt(st.page,10)||1);
     if (st.size) vacSize = Math.max(1, Math.min(100, parseInt(st.size,10)||20));
   }catch{}
 }
@@ -246,6 +279,7 @@ document.getElementById("vac_today").onclick = (ev)=>{
   const r = weekRangeJS(new Date());
   vac_start.value = r.start;
   vac_end.value = r.end;
+  vacPage = 1; vacCursors = [""];
   saveVacState();
   loadVacaciones();
 };
@@ -259,31 +293,24 @@ async function loadVacaciones(){
     planta: vac_planta.value || "",
     start: vac_start.value,
     end: vac_end.value,
-    page: vacPage, size: vacSize
+    cursor: vacCursors[vacPage-1] ?? "", size: vacSize
   });
   try{
     const data = await fetchJSON(`${window.API_BASE}/api/vacaciones?` + qs.toString());
     vacTotal = data.total || 0;
     const maxp = Math.max(1, Math.ceil(vacTotal/vacSize));
-    if (vacPage > maxp) { vacPage = maxp; saveVacState(); return loadVacaciones(); }
-
-    vac_page.textContent = `Página ${data.page} / ${maxp}`;
-    vac_tbody.innerHTML = "";
-    (data.items || []).forEach(v => {
-      const tr = document.createElement("tr");
-      tr.innerHTML = `<td>${v.id}</td><td>${v.numero_emp}</td><td>${v.nombre}</td>
-        <td>${v.fecha_inicial}</td><td>${v.fecha_final}</td>
-        <td>${v.tipo||""}</td><td>${v.gozo??""}</td>
-        <td><button data-id="${v.id}" class="vac_edit" type="button">Editar</button></td>`;
-      vac_tbody.appendChild(tr);
-    });
+    vacHasNext = !!data.next_cursor;
+    if (vacHasNext) vacCursors[vacPage] = data.next_cursor;
+
+    vac_page.textContent = `Página ${vacPage} / ${maxp}`;
+    vac_tbody.replaceChildren(...(data.items || []).map(filaVacacion));
     setMsg("");
     saveVacState();
   }catch(err){ setMsg("Error: " + err.message); console.error(err); }
 }
-vac_buscar.onclick = (ev)=>{ ev.preventDefault(); vacPage=1; saveVacState(); loadVacaciones(); };
+vac_buscar.onclick = (ev)=>{ ev.preventDefault(); vacPage=1; vacCursors = [""]; saveVacState(); loadVacaciones(); };
 vac_prev.onclick = (ev)=>{ ev.preventDefault(); if(vacPage>1){ vacPage--; saveVacState(); loadVacaciones(); } };
-vac_next.onclick = (ev)=>{ ev.preventDefault(); const maxp = Math.max(1, Math.ceil(vacTotal/vacSize)); if(vacPage<maxp){ vacPage++; saveVacState(); loadVacaciones(); } };
+vac_next.onclick = (ev)=>{ ev.preventDefault(); if(vacHasNext){ vacPage++; saveVacState(); loadVacaciones(); } };
 [vac_q, vac_planta, vac_start, vac_end].forEach(el=>{
   el.addEventListener("input", saveVacState);
   el.addEventListener("change", saveVacState);
@@ -318,7 +345,7 @@ document.getElementById("e_vac_save").onclick = async (ev)=>{
       method:"PUT", headers:{'Content-Type':'application/json'}, body:JSON.stringify(payload)
     });
     setMsg("Vacación guardada.");
-    await loadVacaciones();
+    await sincronizar();
   }catch(err){ setMsg("Error: " + err.message); }
 };
 document.getElementById("e_vac_delete").onclick = async (ev)=>{
@@ -329,10 +356,99 @@ document.getElementById("e_vac_delete").onclick = async (ev)=>{
     if(!confirm("¿Borrar vacación definitivamente?")) return;
     await fetchJSON(`${window.API_BASE}/api/vacaciones/${id}`, { method:"DELETE" });
     setMsg("Vacación borrada.");
-    await loadVacaciones();
+    await sincronizar();
   }catch(err){ setMsg("Error: " + err.message); }
 };
 
+// ----- Sincronización por deltas (/api/cambios)
+// Tras guardar o borrar se piden solo los cambios desde el último cursor (propios
+// y de otros usuarios) y se parchan las filas visibles en su lugar. Las filas
+// nuevas no se insertan (su página depende del orden); si el cursor expiró, hay
+// más cambios de los que caben en una respuesta o una vacación cambió de
+// empleado, se recarga el listado.
+let cambiosCursor = null;
+
+async function cursorCambios(){
+  try { cambiosCursor = (await fetchJSON(`${window.API_BASE}/api/cambios`)).cursor; }
+  catch { cambiosCursor = null; }
+}
+
+async function recargarTodo(){
+  await cursorCambios();   // antes de listar: lo que cambie mientras tanto llega en el próximo delta
+  await Promise.all([loadEmpleados(), loadVacaciones()]);
+}
+
+async function sincronizar(){
+  if (!cambiosCursor) return recargarTodo();
+  let d;
+  try {
+    d = expandirCambios(await fetchJSON(`${window.API_BASE}/api/cambios?since=${encodeURIComponent(cambiosCursor)}`));
+  } catch {
+    return recargarTodo();   // 410: cursor compactado
+  }
+  if (d.mas) return recargarTodo();
+  cambiosCursor = d.cursor;
+  const emps = new Map(d.empleados.map(e => [String(e.id), e]));
+  aplicarEmpleados(emps, new Set(d.borrados.empleados.map(String)));
+  if (!aplicarVacaciones(new Map(d.vacaciones.map(v => [String(v.id), v])), emps,
+                         new Set(d.borrados.vacaciones.map(String)))) {
+    await loadVacaciones();
+  }
+}
+
+function aplicarEmpleados(emps, borrados){
+  let quitadas = 0;
+  for (const tr of [...emp_tbody.rows]) {
+    const e = emps.get(tr.dataset.id);
+    const fuera = borrados.has(tr.dataset.id) || (e && (
+      (emp_planta.value && e.planta !== emp_planta.value) || (emp_turno.value && e.turno !== emp_turno.value)));
+    if (fuera) { tr.remove(); quitadas++; }
+    else if (e) tr.replaceWith(filaEmpleado({ ...e, numero_emp: e.numero }));
+  }
+  if (quitadas) {
+    empTotal = Math.max(0, empTotal - quitadas);
+    emp_page.textContent = `Página ${empPage} / ${Math.max(1, Math.ceil(empTotal/empSize))}`;
+  }
+}
+
+// false = hace falta recargar (no hay datos para armar alguna fila)
+function aplicarVacaciones(vacs, emps, borradas){
+  let quitadas = 0;
+  for (const tr of [...vac_tbody.rows]) {
+    const v = vacs.get(tr.dataset.id);
+    const empId = v ? String(v.empleado) : tr.dataset.emp;
+    const e = emps.get(empId);
+    if (v && empId !== tr.dataset.emp && !e) return false;
+    const fuera = borradas.has(tr.dataset.id)
+      || (v && (v.fecha_inicial > vac_end.value || v.fecha_final < vac_start.value))
+      || (e && vac_planta.value && e.planta !== vac_planta.value);
+    if (fuera) { tr.remove(); quitadas++; continue; }
+    if (!v && !e) continue;
+    const td = tr.cells;
+    tr.replaceWith(filaVacacion({
+      id: tr.dataset.id, empleado_id: empId,
+      numero_emp: e ? e.numero : td[1].textContent, nombre: e ? e.nombre : td[2].textContent,
+      fecha_inicial: v ? v.fecha_inicial : td[3].textContent, fecha_final: v ? v.fecha_final : td[4].textContent,
+      tipo: v ? v.tipo : td[5].textContent, gozo: v ? v.gozo : td[6].textContent,
+    }));
+  }
+  if (quitadas) {
+    vacTotal = Math.max(0, vacTotal - quitadas);
+    vac_page.textContent = `Página ${vacPage} / ${Math.max(1, Math.ceil(vacTotal/vacSize))}`;
+  }
+  return true;
+}
+
+// ----- Trabajos en segundo plano: consulta /api/jobs/<id> hasta que termina
+async function esperarTrabajo(id, onAvance, intervaloMs = 1000) {
+  for (;;) {
+    const { job } = await fetchJSON(`${window.API_BASE}/api/jobs/${id}?_ts=${Date.now()}`);
+    if (["terminado", "error", "cancelado"].includes(job.estado)) return job;
+    onAvance?.(job);
+    await new Promise(res => setTimeout(res, intervaloMs));
+  }
+}
+
 // ----- Importar
 const formImp = document.getElementById("form-import");
 const logImp = document.getElementById("import-log");
@@ -343,9 +459,17 @@ formImp.addEventListener("submit", async (e)=>{
     const file = document.getElementById("file").files[0];
     if(!file) throw new Error("Selecciona un archivo");
     const fd = new FormData(); fd.append("file", file);
-    const data = await fetchJSON(`${window.API_BASE}/api/importar/excel`, { method: "POST", body: fd }, 120000);
-    logImp.textContent = JSON.stringify(data, null, 2);
-    await Promise.all([loadEmpleados(), loadVacaciones()]);
+    // Se encola como trabajo: la subida regresa de inmediato y el avance se consulta aparte
+    const { job } = await fetchJSON(`${window.API_BASE}/api/importar/excel?async=1`, { method: "POST", body: fd }, 120000);
+    const fin = await esperarTrabajo(job.id, (j)=>{
+      logImp.textContent = `Importando... ${j.procesados} filas (${j.estado})`;
+    });
+    if (fin.estado !== "terminado") {
+      logImp.textContent = `Error: ${fin.error || fin.estado}`;
+      return;
+    }
+    logImp.textContent = JSON.stringify(fin.resultado, null, 2);
+    await recargarTodo();
   }catch(err){ logImp.textContent = `Error: ${err.message}`; }
 });
 
@@ -414,5 +538,4 @@ if (!vac_start.value || !vac_end.value) {
   if(!vac_end.value) vac_end.value = z;
   saveVacState();
 }
-loadEmpleados();
-loadVacaciones();
+recargarTodo();
@@ -17,12 +17,55 @@ async function fetchNoCache(url) {
   return r.json();
 }
 
+// Helper fetch que revalida con ETag (el servidor responde 304 si no hubo cambios)
+async function fetchRevalidate(url) {
+  const r = await fetch(url, { method: "GET", cache: "no-cache" });
+  if (!r.ok) throw new Error(`HTTP ${r.status}`);
+  return r.json();
+}
+
+// Respuesta de /api/tablero -> { fecha: [items {id, tipo, gozo, empleado}] } en el orden del servidor
+function expandirTablero(data) {
+  const ce = data.campos_empleado;
+  const empleados = {};
+  for (const [id, vals] of Object.entries(data.empleados)) {
+    const e = { id: Number(id) };
+    ce.forEach((k, i) => { e[k] = vals[i]; });
+    empleados[id] = e;
+  }
+  const dias = {};
+  for (const d of data.dias) {
+    dias[d.fecha] = d.items.map(([id, emp, tipo, gozo]) => ({
+      id, tipo: data.tipos[tipo], gozo, empleado: empleados[emp],
+    }));
+  }
+  return dias;
+}
+
+// Respuesta de /api/cambios -> filas como objetos (la usa admin.js para parchar sus tablas)
+function expandirCambios(data) {
+  const filas = ({ campos, filas }) => filas.map(vals => {
+    const o = {};
+    campos.forEach((k, i) => { o[k] = vals[i]; });
+    return o;
+  });
+  return {
+    cursor: data.cursor, mas: !!data.mas,
+    vacaciones: filas(data.vacaciones), empleados: filas(data.empleados),
+    borrados: data.borrados,
+  };
+}
+
 const API = {
-  async calendario(start, end, params = {}) {
-    // cache-buster
-    const qs = new URLSearchParams({ start, end, ...params, _ts: Date.now() });
-    const url = `${API_BASE}/api/calendario?` + qs.toString();
-    return fetchNoCache(url);
+  async tablero(anchor, weeks, params = {}) {
+    // Una sola petición para todas las semanas, ya repartida por día (revalida con ETag)
+    const qs = new URLSearchParams({ anchor, weeks, ...params });
+    return expandirTablero(await fetchRevalidate(`${API_BASE}/api/tablero?` + qs.toString()));
+  },
+  streamCalendario(start, end, params = {}) {
+    // Feed SSE de cambios; EventSource reconecta solo y envía Last-Event-ID
+    const qs = new URLSearchParams({ start, end, ...params });
+    return new EventSource(`${API_BASE}/api/stream/calendario?` + qs.toString());
   },
   async importar(file) {
     const fd = new FormData();
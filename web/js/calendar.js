@@ -17,7 +17,8 @@ const STATE_KEY = "vacaciones.ui";
 const PAGE_SIZE = 3;
 const ROTATE_MS = 15000; // 15s
 const FADE_MS = 450;
-const HARD_REFRESH_MS = 10 * 60 * 1000; // 10 min (red de seguridad)
+const HARD_REFRESH_MS = 60 * 60 * 1000; // 60 min (red de seguridad; los cambios llegan por SSE)
+const FEED_RETRY_MS = 5 * 60 * 1000;     // feed rechazado (lleno o sin configurar): reintento
 
 // Estado
 let anchor = new Date();
@@ -27,6 +28,9 @@ let offsets1 = {};
 let offsets2 = {};
 let rotateTimer = null;
 let hardRefreshTimer = null;
+let feed = null;       // EventSource de /api/stream/calendario
+let feedDesde = 0;
+let dirty = true;      // hay cambios pendientes de descargar
 
 // --------- Utils ----------
 function anchorLabel(d){ const {start,end}=weekRange(d); return `${fmtISO(start)} → ${fmtISO(end)}`; }
@@ -75,17 +79,33 @@ setInterval(()=>{
   if (Date.now() - lastMoveTs > 6000){ document.body.classList.add("inactive"); }
 }, 1000);
 
-// --------- Construcción de mapas ----------
-function buildMap(data, startDate) {
-  const map = {};
-  for (let i = 0; i < 7; i++) map[fmtISO(addDays(startDate, i))] = [];
-  for (const it of data.items) {
-    const ini = new Date(it.rango.ini), fin = new Date(it.rango.fin);
-    for (let d = new Date(ini); d <= fin; d = addDays(d, 1)) {
-      const key = fmtISO(d); if (map[key]) map[key].push(it);
-    }
+// ---- Avatar: miniatura con huella (1x/2x, caché inmutable) o iniciales
+// Se arma con el DOM (no con innerHTML): foto_url y el nombre son datos capturados
+const AVATAR_PX = 40;
+function avatarEl(emp){
+  const url = emp?.foto_url;
+  if (!url || url === "/avatar.png"){
+    const div = document.createElement("div");
+    div.className = "av av-ini";
+    div.textContent = (emp?.nombre_corto || emp?.nombre || "?").split(/\s+/).slice(0,2).map(p=>p[0]||"").join("").toUpperCase();
+    return div;
   }
-  return map;
+  const img = document.createElement("img");
+  img.className = "av";
+  img.width = img.height = AVATAR_PX;
+  img.alt = "";
+  img.decoding = "async";
+  const m = url.match(/^(\/api\/avatares\/[0-9a-f]+-)(\d+)(\.\w+)$/);
+  if (m) img.srcset = `${url} 1x, ${m[1]}${m[2]*2}${m[3]} 2x`;
+  img.src = url;
+  return img;
+}
+
+function nodo(tag, clase, texto) {
+  const el = document.createElement(tag);
+  el.className = clase;
+  if (texto != null) el.textContent = texto;
+  return el;
 }
 
 // ---- Pintado sin animación
@@ -105,16 +125,14 @@ function paintGrid(container, startDate, itemsMap, offsetsMap) {
       const doubled = all.concat(all);
       const slice = doubled.slice(off, off + Math.min(PAGE_SIZE, all.length));
       slice.forEach(it=>{
-        const el = document.createElement("div");
-        el.className = "item";
-        const nombre = it.empleado?.nombre_corto || it.empleado?.nombre || "—";
-        const numero = it.empleado?.numero ? ` #${it.empleado.numero}` : "";
-        const tagTurno = it.empleado?.turno ? `<span class="tag">${it.empleado.turno}</span>`:"";
-        const half = it.gozo && (it.gozo%1)!==0 ? `<span class="badge">½</span>`:"";
-        el.innerHTML = `<div class="txt">
-            <div class="nm">${nombre}</div>
-            <small class="meta">${numero}</small>
-          </div>${tagTurno}${half}`;
+        // Todo con textContent: nombre, número y turno son datos capturados
+        const el = nodo("div", "item");
+        const txt = nodo("div", "txt");
+        txt.append(nodo("div", "nm", it.empleado?.nombre_corto || it.empleado?.nombre || "—"),
+                   nodo("small", "meta", it.empleado?.numero ? ` #${it.empleado.numero}` : ""));
+        el.append(avatarEl(it.empleado), txt);
+        if (it.empleado?.turno) el.append(nodo("span", "tag", it.empleado.turno));
+        if (it.gozo && (it.gozo%1)!==0) el.append(nodo("span", "badge", "½"));
         col.appendChild(el);
       });
 
@@ -154,19 +172,18 @@ function advanceOffsets(itemsMap, offsetsMap) {
   });
 }
 
-// --- Descarga datos SIN pintar (cache-busted) ---
+// --- Descarga datos SIN pintar (revalidados por ETag) ---
 async function fetchDataOnly() {
   const w1 = weekRange(anchor);
   const w2 = nextWeekRange(anchor);
-  const params = { planta: f_planta.value };
-
-  const [d1, d2] = await Promise.all([
-    API.calendario(fmtISO(w1.start), fmtISO(w1.end), params),
-    API.calendario(fmtISO(w2.start), fmtISO(w2.end), params)
-  ]);
+  const dias = await API.tablero(fmtISO(w1.start), 2, { planta: f_planta.value });
 
-  itemsByDay1 = buildMap(d1, w1.start);
-  itemsByDay2 = buildMap(d2, w2.start);
+  itemsByDay1 = {}; itemsByDay2 = {};
+  for (let i = 0; i < 7; i++) {
+    const k1 = fmtISO(addDays(w1.start, i)), k2 = fmtISO(addDays(w2.start, i));
+    itemsByDay1[k1] = dias[k1] || [];
+    itemsByDay2[k2] = dias[k2] || [];
+  }
 }
 
 // Pide data y dibuja (primer render y al navegar/filtros)
@@ -185,9 +202,27 @@ async function fetchAndRender() {
   paintGrid(grid2, w2.start, itemsByDay2, offsets2);
 }
 
+// Feed de cambios: sin SSE (o mientras reconecta) se vuelve a descargar en cada rotación
+function startFeed() {
+  if (!window.EventSource) return;
+  if (feed) feed.close();
+  const w1 = weekRange(anchor);
+  const w2 = nextWeekRange(anchor);
+  feed = API.streamCalendario(fmtISO(w1.start), fmtISO(w2.end), { planta: f_planta.value });
+  feedDesde = Date.now();
+  feed.addEventListener("cambio", () => { dirty = true; });
+  feed.onerror = () => { dirty = true; };
+}
+
+function needsFetch() {
+  return dirty || !feed || feed.readyState !== EventSource.OPEN;
+}
+
 // Render principal
 async function render(){
+  dirty = false;
   await fetchAndRender();
+  startFeed();
   saveState();
 }
 
@@ -198,8 +233,13 @@ function startRotation() {
     const w1 = weekRange(anchor);
     const w2 = nextWeekRange(anchor);
 
-    // 1) trae datos frescos (sin caché)
-    await fetchDataOnly();
+    // 1) trae datos frescos solo si el feed avisó de cambios (304 si no cambiaron)
+    if (needsFetch()) {
+      dirty = false;
+      await fetchDataOnly();
+    }
+    // EventSource no reintenta tras un 503 (queda CLOSED)
+    if (feed && feed.readyState === EventSource.CLOSED && Date.now() - feedDesde > FEED_RETRY_MS) startFeed();
 
     // 2) avanza paginación por día
     advanceOffsets(itemsByDay1, offsets1);